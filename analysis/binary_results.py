@@ -0,0 +1,81 @@
+import os
+import numpy as np
+
+# Layout of the binary result files written by first_blood with "save,binary"
+# in main.csv (see file_io.cpp::save_columns_bin):
+#   64 byte header: magic, version, itemsize, nrows, ncols, name size, data offset
+#   ncols x 32 byte zero padded column names
+#   ncols column blocks of nrows little-endian float64 (or float32) values
+MAGIC = b"FBRESULT"
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("version", "<u4"),
+    ("itemsize", "<u4"),
+    ("nrows", "<u8"),
+    ("ncols", "<u4"),
+    ("name_size", "<u4"),
+    ("data_offset", "<u8"),
+    ("reserved", "V24"),
+])
+
+
+def read_header(path):
+    """Read the header and the column names of a binary result file."""
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_DTYPE.itemsize)
+        if len(raw) < HEADER_DTYPE.itemsize:
+            raise ValueError(f"Truncated header in {path}")
+        h = np.frombuffer(raw, dtype=HEADER_DTYPE)[0]
+        if h["magic"] != MAGIC:
+            raise ValueError(f"Not a first_blood binary result file: {path}")
+        ncols = int(h["ncols"])
+        name_size = int(h["name_size"])
+        names = [
+            n.rstrip(b"\0").decode("ascii")
+            for n in np.frombuffer(f.read(ncols * name_size), dtype=f"S{name_size}")
+        ]
+
+    return {
+        "version": int(h["version"]),
+        "dtype": np.dtype("<f8") if int(h["itemsize"]) == 8 else np.dtype("<f4"),
+        "nrows": int(h["nrows"]),
+        "ncols": ncols,
+        "names": names,
+        "data_offset": int(h["data_offset"]),
+    }
+
+
+def load_binary(path):
+    """
+    Map a binary result file without parsing it.
+
+    Returns (names, data) where data is a read-only np.memmap of shape
+    (ncols, nrows); data[k] is the contiguous block of column names[k].
+    """
+    h = read_header(path)
+    if h["nrows"] == 0:
+        return h["names"], np.zeros((h["ncols"], 0), dtype=h["dtype"])
+
+    data = np.memmap(
+        path,
+        dtype=h["dtype"],
+        mode="r",
+        offset=h["data_offset"],
+        shape=(h["ncols"], h["nrows"]),
+    )
+    return h["names"], data
+
+
+def read_binary(path):
+    """Return {column name: 1-D memmap} of a binary result file."""
+    names, data = load_binary(path)
+    return {name: data[k] for k, name in enumerate(names)}
+
+
+def result_file(folder, element):
+    """Path of an element's result file, preferring <element>.bin over <element>.txt."""
+    for ext in (".bin", ".txt"):
+        path = os.path.join(folder, element + ext)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(os.path.join(folder, element + ".{bin,txt}"))
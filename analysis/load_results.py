@@ -1,77 +1,258 @@
 import os
-import glob
+import json
+from collections import OrderedDict
+
 import yaml
+import numpy as np
 import pandas as pd
 
+from binary_results import load_binary
+from text_results import read_txt, count_columns
+
+# Column layout of the first_blood result files (solver_moc_io.cpp, solver_lumped_io.cpp)
+EDGE_COLUMNS = [
+    "time",
+    "pressure_start", "pressure_end",
+    "velocity_start", "velocity_end",
+    "volume_flow_rate_start", "volume_flow_rate_end",
+    "mass_flow_rate_start", "mass_flow_rate_end",
+    "area_start", "area_end",
+    "wave_speed_start", "wave_speed_end",
+]
+NODE_COLUMNS = ["time", "pressure", "volume_flow_rate"]
+# lumped nodes save pressure, lumped edges volume flow rate, both as the second column
+LUMPED_COLUMNS = ["time", "value"]
+LUMPED_ALIASES = {"pressure": "value", "volume_flow_rate": "value"}
+
+DEFAULT_TIME_PERIOD = 60. / 75.6  # first_blood::time_period
+MANIFEST_FILE = "manifest.json"  # written by first_blood::save_manifest
+
+
+def read_manifest(case_path):
+    """Contents of results/<case>/manifest.json, or None for runs saved without one."""
+    path = os.path.join(case_path, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def columns_for(ncols):
+    """Column names of a text result file with ncols columns; a guess for runs saved without manifest."""
+    if ncols == len(EDGE_COLUMNS):
+        return EDGE_COLUMNS
+    if ncols == len(NODE_COLUMNS):
+        return NODE_COLUMNS
+    if ncols == len(LUMPED_COLUMNS):
+        return LUMPED_COLUMNS
+    return [f"col{k}" for k in range(ncols)]
+
+
+class _ElementFile:
+    """One result file; binary columns are memory-mapped, text columns are parsed on request by read()."""
+
+    def __init__(self, path, names=None):
+        self.path = path
+        self.is_binary = path.endswith(".bin")
+        if self.is_binary:
+            self.names, self._data = load_binary(path)
+        else:
+            self.names = names if names is not None else columns_for(count_columns(path))
+            self._data = None
+
+    def index(self, variable):
+        if variable not in self.names and len(self.names) == len(LUMPED_COLUMNS):
+            # lumped files: "value" and the saved variable name both mean the second column
+            if variable == "value" or variable in LUMPED_ALIASES:
+                return 1
+        if variable not in self.names:
+            raise KeyError(f"{variable} not in {os.path.basename(self.path)}, available: {self.names}")
+        return self.names.index(variable)
+
+    def read(self, ks):
+        """Columns ks of a text file in one pass, one contiguous row per column."""
+        return np.ascontiguousarray(read_txt(self.path, usecols=ks, ncols=len(self.names)).T)
+
+
+class ResultsDataset:
+    """
+    Lazy view of one first_blood case, results/<case>/<model>/<ID>.txt (or .bin).
+
+    Indexed by (model, element, variable), e.g. ds["arterial", "A1", "pressure_start"].
+    Nothing is read at construction; only the requested columns of a text
+    file are decoded, each once, and kept in a bounded LRU cache of
+    cache_size columns. Binary files are memory-mapped. When the run
+    wrote a manifest.json, models, elements, files and columns are taken from
+    it instead of listing the folders.
+    """
+
+    def __init__(self, case_path, cache_size=256, time_period=None):
+        self.case_path = case_path
+        self.cache_size = cache_size
+        self.manifest = read_manifest(case_path)
+        if time_period is None:
+            time_period = self.manifest["time_period"] if self.manifest else DEFAULT_TIME_PERIOD
+        self.time_period = time_period
+        self._files = {}
+        self._cache = OrderedDict()
+
+    # ---------------------------------------------------------------- discovery
+    def models(self):
+        if self.manifest:
+            return sorted(self.manifest["models"])
+        return sorted(e.name for e in os.scandir(self.case_path) if e.is_dir())
+
+    def elements(self, model):
+        if self.manifest:
+            return sorted(self.manifest["models"][model]["elements"])
+        folder = os.path.join(self.case_path, model)
+        names = set()
+        for e in os.scandir(folder):
+            root, ext = os.path.splitext(e.name)
+            if ext in (".txt", ".bin"):
+                names.add(root)
+        return sorted(names)
+
+    def variables(self, model, element):
+        return list(self._file(model, element).names)
+
+    def _file(self, model, element):
+        key = (model, element)
+        if key not in self._files and self.manifest:
+            entry = self.manifest["models"].get(model, {}).get("elements", {}).get(element)
+            if entry is not None:
+                columns = sorted(entry["columns"], key=entry["columns"].get)
+                self._files[key] = _ElementFile(os.path.join(self.case_path, entry["file"]), columns)
+            elif self.manifest.get("output"):
+                # a selected run: column counts do not tell the variables of an unlisted file
+                raise KeyError(f"{model}/{element} not saved by the output selection {self.manifest['output']}")
+        if key not in self._files:
+            folder = os.path.join(self.case_path, model)
+            for ext in (".bin", ".txt"):
+                path = os.path.join(folder, element + ext)
+                if os.path.exists(path):
+                    self._files[key] = _ElementFile(path)
+                    break
+            else:
+                raise KeyError(f"No result file for {model}/{element} in {self.case_path}")
+        return self._files[key]
+
+    # ---------------------------------------------------------------- access
+    def _data(self, model, element, f, ks):
+        """
+        {k: column k} of a file: the memmaps of a binary file; for a text file
+        the cached columns, the others decoded together in one pass and cached
+        under (model, element, variable).
+        """
+        if f.is_binary:
+            return {k: f._data[k] for k in ks}
+        out = {}
+        for k in ks:
+            key = (model, element, f.names[k])
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                out[k] = self._cache[key]
+        missing = sorted(set(ks) - set(out))
+        if missing:
+            for k, x in zip(missing, f.read(missing)):
+                out[k] = x
+                self._cache[model, element, f.names[k]] = x
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return out
+
+    def column(self, model, element, variable):
+        """Full column as an array; memory-mapped for binary files."""
+        return self.columns(model, element, [variable])[variable]
+
+    def columns(self, model, element, variables=None):
+        """{variable: array} of the chosen variables (all by default), decoded in one pass."""
+        f = self._file(model, element)
+        variables = variables or list(f.names)
+        if not f.is_binary and len(f.names) == 0:
+            return {v: np.zeros(0) for v in variables}
+        ks = [f.index(v) for v in variables]
+        data = self._data(model, element, f, ks)
+        return {v: data[k] for v, k in zip(variables, ks)}
+
+    def __getitem__(self, key):
+        model, element, variable = key
+        return self.column(model, element, variable)
+
+    def time(self, model, element):
+        return self.column(model, element, "time")
+
+    def window(self, model, element, t_start=None, t_end=None):
+        """Index slice of the samples with t_start <= t < t_end."""
+        t = self.time(model, element)
+        i0 = 0 if t_start is None else int(np.searchsorted(t, t_start, side="left"))
+        i1 = len(t) if t_end is None else int(np.searchsorted(t, t_end, side="left"))
+        return slice(i0, i1)
+
+    def get(self, model, element, variable, t_start=None, t_end=None, last_periods=None, period=None):
+        """
+        (t, x) of one variable, optionally cut to [t_start, t_end) or to the
+        last N cardiac periods; only the selected part is copied out.
+        """
+        cols = self.columns(model, element, ["time", variable])
+        t, x = cols["time"], cols[variable]
+        if last_periods is not None and len(t) > 0:
+            T = self.time_period if period is None else period
+            t_start = t[-1] - last_periods * T
+        s = self.window(model, element, t_start, t_end)
+        return np.asarray(t[s]), np.asarray(x[s])
+
+    def frame(self, model, element, variables=None, **kwargs):
+        """DataFrame of the chosen variables (all by default), indexed by time."""
+        variables = variables or [v for v in self.variables(model, element) if v != "time"]
+        self.columns(model, element, ["time"] + list(variables))  # decoded together, then from the cache
+        t = None
+        out = {}
+        for v in variables:
+            t, out[v] = self.get(model, element, v, **kwargs)
+        return pd.DataFrame(out, index=pd.Index(t, name="time"))
+
+    def clear_cache(self):
+        self._cache.clear()
+
+
 class SimulationResults:
     def __init__(self, results_path, probe_map=None):
         self.results_path = results_path
         self.probe_map = probe_map or {}
-        self.data = self._load_all()
-
-    def _load_all(self):
-        """Load each p-folder and read the .txt file inside."""
-        data_dict = {}
-
-        # Find folders starting with 'p'
-        folders = sorted(
-            f for f in glob.glob(os.path.join(self.results_path, "p*"))
-            if os.path.isdir(f)
-        )
-        print("Detected probe folders:", folders)
-
-        for folder in folders:
-            probe = os.path.basename(folder)
-
-            # Find .txt file inside the folder
-            txt_files = glob.glob(os.path.join(folder, "*.txt"))
-            if not txt_files:
-                print(f"WARNING: no txt files inside {probe}")
-                continue
-
-            fname = txt_files[0]
-            print(f"Loading file for {probe}: {fname}")
-
-            # Skip truly empty files
-            if os.path.getsize(fname) == 0:
-                print(f"WARNING: Empty data file skipped: {fname}")
-                continue
-
-            # Load numeric data (comma or whitespace separated)
-            try:
-                df = pd.read_csv(
-                    fname,
-                    sep=r"[,\s]+",  # commas or whitespace
-                    engine="python",
-                    comment="#",
-                    header=None,
-                )
-
-                # Remove empty columns (NaNs)
-                df = df.dropna(axis=1, how="all")
-
-                # Ensure minimum structure: at least time + pressure
-                if df.shape[1] < 2:
-                    print(f"WARNING: Not enough columns in {fname}, got {df.shape[1]}")
-                    continue
-
-                if len(df) < 2:
-                    print(f"WARNING: Too few rows in {fname}")
-                    continue
-
-                data_dict[probe] = df
-
-            except Exception as e:
-                print(f"ERROR reading {fname}: {e}")
-                continue
-
-        return data_dict
+        self.dataset = ResultsDataset(results_path)
+        self._probes = None
+
+    def _probe_file(self, probe):
+        """First result file inside a p-folder, as the element name."""
+        elements = self.dataset.elements(probe)
+        if not elements:
+            raise KeyError(f"no result files inside {probe}")
+        return elements[0]
+
+    def _has_data(self, probe):
+        try:
+            path = self.dataset._file(probe, self._probe_file(probe)).path
+        except KeyError:
+            return False
+        return os.path.getsize(path) > 0
 
     def list_probes(self):
-        return list(self.data.keys())
+        """Folders starting with 'p' with a non-empty result file; nothing is loaded here."""
+        if self._probes is None:
+            self._probes = sorted(
+                m for m in self.dataset.models() if m.startswith("p") and self._has_data(m)
+            )
+        return self._probes
 
-    def get(self, probe):
-        return self.data[probe]
+    def get(self, probe, **kwargs):
+        """Probe data as a DataFrame with integer columns (0: time), loaded on first use."""
+        element = self._probe_file(probe)
+        names = self.dataset.variables(probe, element)
+        cols = {}
+        for k, v in enumerate(names):
+            cols[k] = self.dataset.get(probe, element, v, **kwargs)[1]
+        return pd.DataFrame(cols)
 
 
 def load_simulation(config_path="config.yaml"):
@@ -0,0 +1,257 @@
+import os
+import sys
+import shutil
+import argparse
+
+# Overlay models: a model folder whose main.csv has a line
+#   base,../Abel_ref2
+# holds only what differs from the base model (path relative to the folder).
+# Same rules as file_io.cpp::read_model_lines, used by first_blood itself:
+#   main.csv and the moc / lumped model csv files are composed row by row from
+#   the last base to the folder; a row replaces the base row with the same key
+#   (main.csv: the setting name, or type,name of moc / lumped / node lines,
+#   probe lines by model,kind,element,variable; model files: the ID in the
+#   second column) and "remove,<beginning of a row>" deletes the base row,
+#   e.g. "remove,lumped,p5" or "remove,vis_f,A12". Rows without a key
+#   (headers, comments) come from the first file of the chain only.
+#   Other files (time series, output csv) are taken whole from the first folder
+#   of the chain that has them, init/ only from the folder itself.
+#
+#   python model_overlay.py delta ../models/cow_runV23 ../models/Abel_ref2 --out ../models/cow_runV23_delta
+#   python model_overlay.py compose ../models/cow_runV23_delta /tmp/cow_runV23_full
+MAX_DEPTH = 20
+
+
+def _clean(line):
+    return line.replace(" ", "").replace("\r", "").replace("\n", "")
+
+
+def _split(line):
+    return _clean(line).split(",")
+
+
+def model_folders(model_dir):
+    """Folders of the overlay chain: model_dir, its base, the base of the base..."""
+    folders = []
+    while model_dir:
+        folders.append(model_dir)
+        if len(folders) > MAX_DEPTH:
+            raise RuntimeError(f"base models nested too deep, probably a loop: {' -> '.join(folders)}")
+        base = None
+        path = os.path.join(model_dir, "main.csv")
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    sv = _split(line)
+                    if sv[0] == "base" and len(sv) > 1 and sv[1]:
+                        base = sv[1] if os.path.isabs(sv[1]) else os.path.join(model_dir, sv[1])
+        model_dir = base
+    return folders
+
+
+def base_of(model_dir):
+    """Base folder named in main.csv, None for a plain model."""
+    folders = model_folders(model_dir)
+    return folders[1] if len(folders) > 1 else None
+
+
+def model_file(model_dir, name):
+    """Path of name in the first folder of the chain that has it, model_dir/name if none has it."""
+    for d in model_folders(model_dir):
+        path = os.path.join(d, name)
+        if os.path.exists(path):
+            return path
+    return os.path.join(model_dir, name)
+
+
+def overlay_key(sv, is_main):
+    """Key of a split row, None for rows without a key."""
+    if not sv or sv[0] == "":
+        return None
+    if is_main:
+        if sv[0] in ("moc", "lumped", "lum", "node") and len(sv) > 1:
+            return ("lumped" if sv[0] == "lum" else sv[0]) + "," + sv[1]
+        if sv[0] == "probe" and len(sv) > 4:
+            return ",".join(sv[:5])
+        return sv[0]
+    if len(sv) > 1 and sv[0] != "type" and sv[1] != "":
+        return sv[1]
+    return None
+
+
+def _remove_row(sv, is_main):
+    """The remove line deleting the row sv of a base."""
+    key = overlay_key(sv, is_main)
+    return "remove," + (key if is_main else sv[0] + "," + key)
+
+
+def read_lines(model_dir, name):
+    """Lines of a model csv file composed over the chain (spaces removed), FileNotFoundError if no folder has it."""
+    is_main = name == "main.csv"
+    lines, removed, index = [], [], {}
+    found = False
+    for d in reversed(model_folders(model_dir)):
+        path = os.path.join(d, name)
+        if not os.path.exists(path):
+            continue
+        is_first = not found
+        found = True
+        with open(path) as f:
+            for line in f:
+                line = _clean(line)
+                sv = line.split(",")
+                if is_main and sv[0] == "base":
+                    continue
+                if sv[0] == "remove" and len(sv) > 1:
+                    i = index.pop(overlay_key(sv[1:], is_main), None)
+                    if i is not None:
+                        removed[i] = True
+                    continue
+                key = overlay_key(sv, is_main)
+                if key is None:
+                    if is_first:
+                        lines.append(line)
+                        removed.append(False)
+                elif key in index:
+                    lines[index[key]] = line
+                else:
+                    index[key] = len(lines)
+                    lines.append(line)
+                    removed.append(False)
+    if not found:
+        raise FileNotFoundError(f"{name} in none of {model_folders(model_dir)}")
+    return [l for l, r in zip(lines, removed) if not r]
+
+
+def composed_files(model_dir):
+    """main.csv and the model csv files of the moc and lumped lines, the files composed row by row."""
+    files = ["main.csv"]
+    for line in read_lines(model_dir, "main.csv"):
+        sv = line.split(",")
+        if len(sv) > 1 and sv[0] in ("moc", "lumped", "lum"):
+            files.append(sv[1] + ".csv")
+    return files
+
+
+def compose(model_dir, out_dir, init=True):
+    """Writing the plain model of an overlay model to out_dir (and its init/ folder), the list of written files."""
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    composed = composed_files(model_dir)
+    for name in composed:
+        with open(os.path.join(out_dir, name), "w") as f:
+            f.write("\n".join(read_lines(model_dir, name)) + "\n")
+        written.append(name)
+    # other files whole, the folder itself wins over its bases
+    for d in model_folders(model_dir):
+        for name in sorted(os.listdir(d)):
+            src = os.path.join(d, name)
+            if name in written or not os.path.isfile(src):
+                continue
+            shutil.copy2(src, os.path.join(out_dir, name))
+            written.append(name)
+    if init and os.path.isdir(os.path.join(model_dir, "init")):
+        shutil.copytree(os.path.join(model_dir, "init"), os.path.join(out_dir, "init"), dirs_exist_ok=True)
+    return written
+
+
+def _row_delta(lines, base_lines, is_main):
+    """Rows of lines differing from base_lines and remove rows of the base rows missing from lines."""
+    base = {}
+    for line in base_lines:
+        key = overlay_key(line.split(","), is_main)
+        if key is not None:
+            base[key] = line
+    out, keys = [], set()
+    for line in lines:
+        key = overlay_key(line.split(","), is_main)
+        if key is None:
+            continue
+        keys.add(key)
+        if base.get(key) != line:
+            out.append(line)
+    for key, line in base.items():
+        if key not in keys:
+            out.append(_remove_row(line.split(","), is_main))
+    return out
+
+
+def base_path(base_dir, out_dir):
+    """base_dir relative to out_dir if they share more than the root, absolute otherwise."""
+    base_dir, out_dir = os.path.abspath(base_dir), os.path.abspath(out_dir)
+    if os.path.commonpath([base_dir, out_dir]) == os.path.dirname(os.path.commonpath([base_dir, out_dir])):
+        return base_dir
+    return os.path.relpath(base_dir, out_dir)
+
+
+def make_delta(model_dir, base_dir, out_dir):
+    """
+    Writing out_dir as an overlay of base_dir holding what model_dir (plain or
+    overlay) changes: main.csv with the base line, the changed rows of the model
+    files and the files base_dir does not have or has with other content.
+    Returns the list of written files.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    composed = composed_files(model_dir)
+    base_composed = set(composed_files(base_dir))
+    written = []
+
+    main_rows = _row_delta(read_lines(model_dir, "main.csv"), read_lines(base_dir, "main.csv"), True)
+    with open(os.path.join(out_dir, "main.csv"), "w") as f:
+        f.write("\n".join([f"base,{base_path(base_dir, out_dir)}"] + main_rows) + "\n")
+    written.append("main.csv")
+
+    for name in composed[1:]:
+        lines = read_lines(model_dir, name)
+        if name in base_composed and os.path.exists(model_file(base_dir, name)):
+            lines = _row_delta(lines, read_lines(base_dir, name), False)
+            if not lines:
+                continue
+        with open(os.path.join(out_dir, name), "w") as f:
+            f.write("\n".join(lines) + "\n")
+        written.append(name)
+
+    names = set()
+    for d in model_folders(model_dir):
+        names.update(n for n in os.listdir(d) if os.path.isfile(os.path.join(d, n)))
+    for name in sorted(names - set(composed)):
+        src, base = model_file(model_dir, name), model_file(base_dir, name)
+        if os.path.exists(base):
+            with open(src, "rb") as a, open(base, "rb") as b:
+                if a.read() == b.read():
+                    continue
+        if os.path.abspath(src) != os.path.abspath(os.path.join(out_dir, name)):
+            shutil.copy2(src, os.path.join(out_dir, name))
+        written.append(name)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compose or write overlay (base + delta) first_blood models.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("delta", help="write a model as an overlay of a base model")
+    p.add_argument("model_dir", help="model folder, e.g. ../models/cow_runV23")
+    p.add_argument("base_dir", help="base model folder, e.g. ../models/Abel_ref2")
+    p.add_argument("--out", help="overlay folder (default: <model_dir>_delta)")
+    p = sub.add_parser("compose", help="write the plain model of an overlay model")
+    p.add_argument("model_dir")
+    p.add_argument("out_dir")
+    p = sub.add_parser("show", help="print the composed lines of one file")
+    p.add_argument("model_dir")
+    p.add_argument("file", nargs="?", default="main.csv")
+    args = parser.parse_args(argv)
+
+    if args.command == "delta":
+        out = args.out or args.model_dir.rstrip("/") + "_delta"
+        written = make_delta(args.model_dir, args.base_dir, out)
+        print(f"{len(written)} file(s) written to {out}: {', '.join(written)}")
+    elif args.command == "compose":
+        written = compose(args.model_dir, args.out_dir)
+        print(f"{len(written)} file(s) written to {args.out_dir}")
+    else:
+        print("\n".join(read_lines(args.model_dir, args.file)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
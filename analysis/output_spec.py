@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import argparse
+
+import yaml
+
+from model_overlay import read_lines
+
+# Variables first_blood can save per element (solver_moc.h: edge_columns, node_columns).
+# Edge variables exist at both ends, e.g. pressure -> pressure_start, pressure_end.
+EDGE_VARIABLES = ["pressure", "velocity", "volume_flow_rate", "mass_flow_rate", "area", "wave_speed"]
+NODE_VARIABLES = ["pressure", "volume_flow_rate"]
+ENDS = ["start", "end"]
+
+# Element types of the model csv files (solver_moc_io.cpp, solver_lumped_io.cpp)
+MOC_EDGE_TYPES = {"vis", "visM", "vis_f"}
+LUMPED_EDGE_TYPES = {"resistor", "capacitor", "inductor", "voltage", "diode", "resistor2", "valve",
+                     "resistor_coronary", "capacitor_coronary", "current", "elastance"}
+MOC_NODE_TYPES = {"node", "junction", "elag", "perif", "periferia", "perifPC", "periferia_pc", "heart", "sziv"}
+LUMPED_NODE_TYPES = {"node", "ground"}
+
+
+def _split(line):
+    return [s.strip() for s in line.strip().split(",")]
+
+
+def read_main(model_dir):
+    """{model name: "moc" or "lum"} of the main.csv of a model folder (composed with its base models)."""
+    models = {}
+    for line in read_lines(model_dir, "main.csv"):
+        sv = _split(line)
+        if len(sv) > 1 and sv[0] == "moc":
+            models[sv[1]] = "moc"
+        elif len(sv) > 1 and sv[0] in ("lumped", "lum"):
+            models[sv[1]] = "lum"
+    return models
+
+
+def read_elements(model_dir, model, kind):
+    """(edges, nodes) of <model>.csv; edges as {ID: name}, nodes as a list of IDs."""
+    edge_types = MOC_EDGE_TYPES if kind == "moc" else LUMPED_EDGE_TYPES
+    node_types = MOC_NODE_TYPES if kind == "moc" else LUMPED_NODE_TYPES
+    edges, nodes = {}, []
+    for line in read_lines(model_dir, model + ".csv"):
+        sv = _split(line)
+        if len(sv) < 2:
+            continue
+        if sv[0] in edge_types:
+            # moc: type, ID, name, ...; lumped: type, name, ...
+            edges[sv[1]] = sv[2] if kind == "moc" else sv[1]
+        elif sv[0] in node_types:
+            nodes.append(sv[1])
+    return edges, nodes
+
+
+def edge_columns(variables, ends):
+    """Saved column names of an edge, e.g. (["pressure"], ["start"]) -> ["pressure_start"]."""
+    out = []
+    for v in variables:
+        if v.endswith("_start") or v.endswith("_end"):
+            names = [v]
+        elif v in EDGE_VARIABLES:
+            names = [f"{v}_{e}" for e in ends]
+        else:
+            raise ValueError(f"unknown edge variable {v}, available: {EDGE_VARIABLES}")
+        out += [n for n in names if n not in out]
+    return out
+
+
+def node_columns(variables):
+    out = [v for v in variables if v in NODE_VARIABLES]
+    if not out:
+        raise ValueError(f"none of {variables} is saved at moc nodes, available: {NODE_VARIABLES}")
+    return out
+
+
+def match_names(edges, keywords):
+    """IDs of the edges whose name contains any of the keywords (case insensitive)."""
+    keywords = [k.lower() for k in keywords]
+    return [i for i, name in edges.items() if any(k in name.lower() for k in keywords)]
+
+
+def build(spec, model_dir):
+    """
+    Lines of the output csv read by first_blood::load_output_csv from a spec
+    dict (see output_spec.yaml): "moc,model,edge|node,ID[,variables...]" or
+    "lum,model,edge|node,ID".
+    """
+    models = read_main(model_dir)
+    regions = spec.get("regions", {})
+    default_vars = spec.get("variables")
+    default_ends = spec.get("ends", ENDS)
+
+    selected = {}  # (kind, model, edge|node, ID) -> list of columns, None: every column
+    for sel in spec.get("select", []):
+        if "region" in sel:
+            if sel["region"] not in regions:
+                raise KeyError(f"region {sel['region']} is not defined, regions: {list(regions)}")
+            sel = {**regions[sel["region"]], **{k: v for k, v in sel.items() if k != "region"}}
+        model = sel["model"]
+        if model not in models:
+            raise KeyError(f"model {model} is not in main.csv of {model_dir}")
+        kind = models[model]
+        edges, nodes = read_elements(model_dir, model, kind)
+
+        edge_ids = list(sel.get("edges", []))
+        node_ids = list(sel.get("nodes", []))
+        if "names" in sel:
+            edge_ids += match_names(edges, sel["names"])
+        if not edge_ids and not node_ids and "names" not in sel:
+            # a bare model selects all of its elements
+            edge_ids, node_ids = list(edges), list(nodes)
+        for i in edge_ids:
+            if i not in edges:
+                raise KeyError(f"edge {i} is not in {model}.csv")
+        for i in node_ids:
+            if i not in nodes:
+                raise KeyError(f"node {i} is not in {model}.csv")
+
+        variables = sel.get("variables", default_vars)
+        ends = sel.get("ends", default_ends)
+        for kind_el, ids in (("edge", edge_ids), ("node", node_ids)):
+            for i in ids:
+                key = (kind, model, kind_el, i)
+                if kind == "lum" or variables is None:
+                    selected[key] = None
+                    continue
+                cols = edge_columns(variables, ends) if kind_el == "edge" else node_columns(variables)
+                if key in selected:
+                    # the same element in several selections: union of the variables
+                    cols = None if selected[key] is None else selected[key] + [c for c in cols if c not in selected[key]]
+                selected[key] = cols
+
+    lines = []
+    for (kind, model, kind_el, i), cols in selected.items():
+        lines.append(",".join([kind, model, kind_el, i] + (cols or [])))
+    return lines
+
+
+def load_spec(path):
+    with open(path) as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        return yaml.safe_load(f)
+
+
+def write(spec, model_dir, name=None, main=False):
+    """Write <model_dir>/<name>.csv and optionally point main.csv at it with an output line."""
+    name = name or spec.get("name", "output")
+    lines = build(spec, model_dir)
+    with open(os.path.join(model_dir, name + ".csv"), "w") as f:
+        f.write("type,model,element,ID,variables...\n")
+        f.write("\n".join(lines) + "\n")
+
+    if main:
+        path = os.path.join(model_dir, "main.csv")
+        with open(path) as f:
+            old = [l for l in f.read().splitlines() if _split(l)[0] != "output"]
+        # right after the header lines (run, time, ...) like the other settings
+        k = next((j for j, l in enumerate(old) if not l.strip()), len(old))
+        old.insert(k, f"output,{name}")
+        # replaced, main.csv may be a hard link to the base model
+        with open(path + ".tmp", "w") as f:
+            f.write("\n".join(old) + "\n")
+        os.replace(path + ".tmp", path)
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write the output csv of a first_blood model from a yaml/json spec.")
+    parser.add_argument("spec", help="output spec, e.g. output_spec.yaml")
+    parser.add_argument("model_dir", help="model folder with main.csv, e.g. ../models/Abel_ref2")
+    parser.add_argument("--name", help="name of the output csv (default: name in the spec or 'output')")
+    parser.add_argument("--main", action="store_true", help="add the output line to main.csv")
+    parser.add_argument("--dry-run", action="store_true", help="only print the lines")
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args.spec)
+    if args.dry_run:
+        print("\n".join(build(spec, args.model_dir)))
+        return 0
+    lines = write(spec, args.model_dir, args.name, args.main)
+    print(f"{len(lines)} element(s) written to {os.path.join(args.model_dir, (args.name or spec.get('name', 'output')) + '.csv')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
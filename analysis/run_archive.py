@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import zlib
+import argparse
+
+import numpy as np
+
+from load_results import ResultsDataset
+
+# Layout of the run archive files (.fba), written by this module or by first_blood
+# with "save,archive" in main.csv (see file_io.cpp::result_archive):
+#   32 byte header: magic, version, reserved, index offset, index size
+#   column chunks, raw little-endian or zlib compressed
+#   json index: {"version": 1, "runs": {run: {"manifest": {...} or null,
+#       "models": {model: {element: {"type", "rows", "dtype", "codec",
+#           "columns": {variable: [[offset, nbytes, nrows], ...]}}}}}}}
+MAGIC = b"FBARCHIV"
+VERSION = 1
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("version", "<u4"),
+    ("reserved", "<u4"),
+    ("index_offset", "<u8"),
+    ("index_size", "<u8"),
+])
+CHUNK_ROWS = 65536
+
+
+class RunArchive:
+    """
+    Reader of a run archive; one file holding one run or a whole ensemble.
+
+    Only the header and the index are read when opening, a column is read
+    (and decompressed) when requested, e.g.
+    ar["run_0", "arterial", "A1", "pressure_start"].
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            raw = f.read(HEADER_DTYPE.itemsize)
+            if len(raw) < HEADER_DTYPE.itemsize:
+                raise ValueError(f"Truncated header in {path}")
+            h = np.frombuffer(raw, dtype=HEADER_DTYPE)[0]
+            if h["magic"] != MAGIC:
+                raise ValueError(f"Not a first_blood run archive: {path}")
+            f.seek(int(h["index_offset"]))
+            self.index = json.loads(f.read(int(h["index_size"])).decode("utf-8"))
+
+    # ---------------------------------------------------------------- discovery
+    def runs(self):
+        return list(self.index["runs"])
+
+    def manifest(self, run):
+        return self.index["runs"][run]["manifest"]
+
+    def models(self, run):
+        return list(self.index["runs"][run]["models"])
+
+    def elements(self, run, model):
+        return list(self.index["runs"][run]["models"][model])
+
+    def variables(self, run, model, element):
+        return list(self._entry(run, model, element)["columns"])
+
+    def _entry(self, run, model, element):
+        try:
+            return self.index["runs"][run]["models"][model][element]
+        except KeyError:
+            raise KeyError(f"{run}/{model}/{element} not in {self.path}") from None
+
+    # ---------------------------------------------------------------- access
+    def column(self, run, model, element, variable):
+        """One variable of one element; memory-mapped if stored as a single raw chunk."""
+        return self.columns(run, model, element, [variable])[variable]
+
+    def columns(self, run, model, element, variables=None):
+        """{variable: array} of the chosen variables of one element (all by default), the file opened once."""
+        entry = self._entry(run, model, element)
+        variables = variables or list(entry["columns"])
+        dtype = np.dtype(entry["dtype"])
+        out = {}
+        f = None
+        try:
+            for variable in variables:
+                if variable not in entry["columns"]:
+                    raise KeyError(f"{variable} not in {run}/{model}/{element}, available: {list(entry['columns'])}")
+                chunks = entry["columns"][variable]
+                if entry["codec"] == "raw" and len(chunks) == 1:
+                    offset, nbytes, nrows = chunks[0]
+                    if nrows == 0:
+                        out[variable] = np.zeros(0, dtype=dtype)
+                    else:
+                        out[variable] = np.memmap(self.path, dtype=dtype, mode="r", offset=offset, shape=(nrows,))
+                    continue
+
+                if f is None:
+                    f = open(self.path, "rb")
+                x = np.empty(entry["rows"], dtype=dtype)
+                i = 0
+                for offset, nbytes, nrows in chunks:
+                    f.seek(offset)
+                    raw = f.read(nbytes)
+                    if entry["codec"] == "zlib":
+                        raw = zlib.decompress(raw)
+                    x[i:i + nrows] = np.frombuffer(raw, dtype=dtype)
+                    i += nrows
+                out[variable] = x
+        finally:
+            if f is not None:
+                f.close()
+        return out
+
+    def __getitem__(self, key):
+        run, model, element, variable = key
+        return self.column(run, model, element, variable)
+
+
+class _ArchiveWriter:
+    def __init__(self, path, codec="zlib", chunk_rows=CHUNK_ROWS, level=6):
+        self.f = open(path, "wb")
+        self.f.write(b"\0" * HEADER_DTYPE.itemsize)
+        self.codec = codec
+        self.chunk_rows = chunk_rows
+        self.level = level
+        self.runs = {}
+
+    def add_element(self, run, model, element, type_, columns, dtype=np.float64):
+        dtype = np.dtype(dtype).newbyteorder("<")
+        nrows = min((len(c) for c in columns.values()), default=0)
+        entry = {"type": type_, "rows": nrows, "dtype": dtype.str, "codec": self.codec, "columns": {}}
+        for name, values in columns.items():
+            values = np.asarray(values[:nrows], dtype=dtype)
+            # raw columns stay in one chunk so that they can be memory-mapped
+            step = self.chunk_rows if self.codec == "zlib" else max(nrows, 1)
+            chunks = []
+            for i in range(0, max(nrows, 1), step):
+                raw = values[i:i + step].tobytes()
+                if self.codec == "zlib":
+                    raw = zlib.compress(raw, self.level)
+                chunks.append([self.f.tell(), len(raw), len(values[i:i + step])])
+                self.f.write(raw)
+            entry["columns"][name] = chunks
+        run_entry = self.runs.setdefault(run, {"manifest": None, "models": {}})
+        run_entry["models"].setdefault(model, {})[element] = entry
+
+    def set_manifest(self, run, manifest):
+        self.runs.setdefault(run, {"manifest": None, "models": {}})["manifest"] = manifest
+
+    def close(self):
+        index_offset = self.f.tell()
+        index = json.dumps({"version": VERSION, "runs": self.runs}).encode("utf-8")
+        self.f.write(index)
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["version"] = VERSION
+        header["index_offset"] = index_offset
+        header["index_size"] = len(index)
+        self.f.seek(0)
+        self.f.write(header.tobytes())
+        self.f.close()
+
+
+def _element_type(ds, model, element):
+    if ds.manifest:
+        return ds.manifest["models"][model]["elements"][element]["type"]
+    # without manifest only moc edges can be told apart by their columns
+    return "edge" if any(v.endswith("_start") for v in ds.variables(model, element)) else "node"
+
+
+def pack(sources, out_path, compress=True, chunk_rows=CHUNK_ROWS, float32=False):
+    """
+    Pack runs into one archive. sources are results/<case> folders (text or
+    binary files, with or without manifest.json) or existing .fba archives;
+    the run name is the folder or archive name.
+    """
+    writer = _ArchiveWriter(out_path, "zlib" if compress else "raw", chunk_rows)
+    dtype = np.float32 if float32 else np.float64
+    try:
+        for src in sources:
+            src = src.rstrip("/")
+            if src.endswith(".fba"):
+                ar = RunArchive(src)
+                for run in ar.runs():
+                    writer.set_manifest(run, ar.manifest(run))
+                    for model in ar.models(run):
+                        for element in ar.elements(run, model):
+                            cols = ar.columns(run, model, element)
+                            writer.add_element(run, model, element, ar._entry(run, model, element)["type"], cols, dtype)
+            else:
+                run = os.path.basename(src)
+                ds = ResultsDataset(src, cache_size=0)
+                writer.set_manifest(run, ds.manifest)
+                for model in ds.models():
+                    for element in ds.elements(model):
+                        cols = ds.columns(model, element)  # every column of the file from one parse
+                        writer.add_element(run, model, element, _element_type(ds, model, element), cols, dtype)
+    finally:
+        writer.close()
+
+
+def ensemble_sources(results_dir):
+    """Every case folder and .fba archive directly inside a results folder."""
+    out = []
+    for e in sorted(os.scandir(results_dir), key=lambda e: e.name):
+        if e.is_dir() or e.name.endswith(".fba"):
+            out.append(e.path)
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack first_blood results into a single archive file, or list one.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("pack", help="pack case folders / archives into one .fba file")
+    p.add_argument("out", help="archive to write, e.g. ensemble.fba")
+    p.add_argument("sources", nargs="*", help="results/<case> folders or .fba files")
+    p.add_argument("--ensemble", help="pack every case folder and .fba file inside this results folder")
+    p.add_argument("--raw", action="store_true", help="store uncompressed (memory-mappable) columns")
+    p.add_argument("--float32", action="store_true", help="store values as float32")
+
+    l = sub.add_parser("list", help="list the runs (and elements of a run) of an archive")
+    l.add_argument("archive")
+    l.add_argument("--run")
+
+    args = parser.parse_args(argv)
+    if args.command == "pack":
+        sources = list(args.sources)
+        if args.ensemble:
+            sources += [s for s in ensemble_sources(args.ensemble) if os.path.abspath(s) != os.path.abspath(args.out)]
+        if not sources:
+            parser.error("nothing to pack")
+        pack(sources, args.out, compress=not args.raw, float32=args.float32)
+        print(f"{len(sources)} source(s) packed into {args.out}")
+    else:
+        ar = RunArchive(args.archive)
+        if args.run is None:
+            for run in ar.runs():
+                print(run)
+        else:
+            for model in ar.models(args.run):
+                print(f"{model}: {' '.join(ar.elements(args.run, model))}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Number of columns in the first_blood text result files, "%9.7e, %9.7e, ...\n"
+EDGE_NCOLS = 13    # moc edge: time + 6 variables at start and end
+NODE_NCOLS = 3     # moc node: time, pressure, volume flow rate
+LUMPED_NCOLS = 2   # lumped node or edge: time, pressure or volume flow rate
+
+
+def count_columns(path):
+    """Number of comma separated columns in the first line of a result file."""
+    with open(path, "rb") as f:
+        line = f.readline()
+    return line.count(b",") + 1 if line.strip() else 0
+
+
+def read_txt(path, usecols=None, ncols=None):
+    """
+    Read a first_blood text result file into an (nrows, ncols) float64 array.
+
+    np.loadtxt parses the file in C (faster than pandas' C engine on these
+    files, more so with usecols). ncols is taken from the first line when not
+    given (13: edge, 3: node, 2: lumped). usecols keeps only the listed
+    columns.
+    """
+    if ncols is None:
+        ncols = count_columns(path)
+    width = ncols if usecols is None else len(usecols)
+    if ncols == 0 or os.path.getsize(path) == 0:
+        return np.zeros((0, width))
+    try:
+        return np.loadtxt(path, delimiter=",", usecols=usecols, ndmin=2).reshape(-1, width)
+    except ValueError:
+        # e.g. a truncated last line of a killed run: slow path that skips bad rows
+        data = np.genfromtxt(path, delimiter=",", usecols=usecols, invalid_raise=False)
+        return data[~np.isnan(data).any(axis=1)] if data.ndim == 2 else data.reshape(-1, width)
+
+
+def read_ts(path, col=1):
+    """(t, x) of column col of a result file."""
+    data = read_txt(path, usecols=[0, col])
+    return data[:, 0], data[:, 1]
+
+
+def read_frame(path, usecols=None):
+    """Result file as a DataFrame with integer column labels, like pd.read_csv(path, header=None)."""
+    data = read_txt(path, usecols=usecols)
+    columns = range(data.shape[1]) if usecols is None else usecols
+    return pd.DataFrame(data, columns=columns)
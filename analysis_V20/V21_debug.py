@@ -1,10 +1,9 @@
 import os
-import pandas as pd
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import numpy as np
-from io import StringIO
+
+from text_results import read_frame
 
 # ==========================================
 # CONFIGURATION
@@ -27,9 +26,7 @@ def load_data(v_id):
     path = os.path.join(RESULTS_DIR, f"{v_id}.txt") # Assuming .txt based on previous ls
     if not os.path.exists(path): return None
     try:
-        with open(path, 'r') as f: content = f.read().replace(',', ' ')
-        df = pd.read_csv(StringIO(content), sep=r'\s+', header=None, engine='python')
-        return df.apply(pd.to_numeric, errors='coerce').dropna()
+        return read_frame(path)
     except: return None
 
 def run_diagnostics():
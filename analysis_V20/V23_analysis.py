@@ -1,32 +1,49 @@
 import os
 import numpy as np
-import matplotlib.pyplot as plt
 from scipy.signal import find_peaks
 
+from text_results import read_ts
+
+
 def load_ts(path):
-    """Robust loader for first_blood txt files (handles commas, etc.)."""
-    with open(path, "r") as f:
-        raw = f.readlines()
-
-    data = []
-    for line in raw:
-        line = line.replace(",", " ").replace(";", " ").strip()
-        if not line:
-            continue
-        parts = line.split()
-        if len(parts) < 2:
-            continue
-        try:
-            t = float(parts[0])
-            v = float(parts[1])
-            data.append([t, v])
-        except ValueError:
-            continue
-
-    if not data:
+    """Time and first value column of a first_blood txt file."""
+    t, v = read_ts(path, col=1)
+    if t.size == 0:
         raise ValueError(f"No numeric rows in {path}")
-    arr = np.array(data)
-    return arr[:, 0], arr[:, 1]
+    return t, v
+
+
+# physiological ranges of the level-1 metrics, (low, high)
+PHYSIOLOGICAL_RANGES = {
+    "P_sys": (110., 130.),  # mmHg
+    "P_dia": (70., 90.),    # mmHg
+    "P_mean": (85., 100.),  # mmHg
+    "PP": (35., 55.),       # mmHg
+    "CO": (4.5, 5.5),       # L/min
+    "HR": (55., 90.),       # bpm
+}
+
+
+def level1_metrics(t, p_mmHg, q_Lmin, peak_distance=40):
+    """Systolic, diastolic, mean and pulse pressure, heart rate and cardiac output of an aortic signal."""
+    P_sys = np.max(p_mmHg)
+    P_dia = np.min(p_mmHg)
+
+    peaks, _ = find_peaks(p_mmHg, distance=peak_distance)
+    if len(peaks) > 1:
+        dt = np.diff(t[peaks]).mean()
+        HR = 60.0 / dt
+    else:
+        HR = np.nan
+
+    return {
+        "P_sys": P_sys,
+        "P_dia": P_dia,
+        "P_mean": np.mean(p_mmHg),
+        "PP": P_sys - P_dia,
+        "HR": HR,
+        "CO": np.mean(q_Lmin),
+    }
 
 
 def analyze_run(
@@ -72,19 +89,8 @@ def analyze_run(
     q_Lmin = q_raw * 60.0 * 1000.0  # m^3/s -> L/min
 
     # metrics
-    P_sys = np.max(p_mmHg)
-    P_dia = np.min(p_mmHg)
-    P_mean = np.mean(p_mmHg)
-    PP = P_sys - P_dia
-
-    peaks, _ = find_peaks(p_mmHg, distance=40)
-    if len(peaks) > 1:
-        dt = np.diff(t_p[peaks]).mean()
-        HR = 60.0 / dt
-    else:
-        HR = np.nan
-
-    CO = np.mean(q_Lmin)
+    m = level1_metrics(t_p, p_mmHg, q_Lmin)
+    P_sys, P_dia, P_mean, PP, HR, CO = (m[k] for k in ("P_sys", "P_dia", "P_mean", "PP", "HR", "CO"))
 
     print("\n======= LEVEL-1 SANITY CHECK =======")
     print(f"Run: {run_name}")
@@ -105,6 +111,8 @@ def analyze_run(
     print("HR:             55–90 bpm")
 
     # plots
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(12, 4))
     plt.plot(t_p, p_mmHg)
     plt.title(f"{run_name}: Aortic pressure (mmHg)")
@@ -122,5 +130,6 @@ def analyze_run(
     plt.show()
 
 
-analyze_run("Abel_ref2")
-#analyze_run("cow_runV23")
+if __name__ == "__main__":
+    analyze_run("Abel_ref2")
+    #analyze_run("cow_runV23")
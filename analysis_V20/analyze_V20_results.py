@@ -3,8 +3,8 @@ import pandas as pd
 import matplotlib
 matplotlib.use('Agg') 
 import matplotlib.pyplot as plt
-import numpy as np
-from io import StringIO
+
+from text_results import read_frame
 
 # ==========================================
 # 1. CONFIGURATION
@@ -34,11 +34,7 @@ def load_simulation_data(vessel_id):
         path = os.path.join(RESULTS_DIR, vessel_id + ext)
         if os.path.exists(path):
             try:
-                with open(path, 'r') as f:
-                    content = f.read()
-                clean_content = content.replace(',', ' ')
-                df = pd.read_csv(StringIO(clean_content), sep=r'\s+', header=None, engine='python')
-                return df
+                return read_frame(path)
             except Exception as e:
                 print(f"Error reading {path}: {e}")
                 return None
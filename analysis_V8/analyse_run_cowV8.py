@@ -19,9 +19,10 @@ Quick analysis and plotting script for cow_runV8 results.
 import os
 import glob
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
 
+from text_results import read_frame
+
 # --------------------------------------------------------------------
 # Constants
 # --------------------------------------------------------------------
@@ -55,7 +56,7 @@ def load_artery(file_path):
         11: something like c or characteristic variable
         12: same at distal end
     """
-    df = pd.read_csv(file_path, header=None)
+    df = read_frame(file_path, usecols=[0, 1, 2, 3, 4, 9, 10])
 
     t = df[0].to_numpy()
 
@@ -93,7 +94,7 @@ def load_heart_aorta(heart_dir=HEART_DIR):
     if not os.path.exists(path):
         return None, None
 
-    df = pd.read_csv(path, header=None)
+    df = read_frame(path, usecols=[0, 1])
     t = df[0].to_numpy()
     p = df[1].to_numpy()
     p_mmHg = (p - BASELINE_P) / MMHG_TO_PA
@@ -4,6 +4,8 @@ import matplotlib.pyplot as plt
 import csv
 import os
 
+from text_results import read_txt
+
 # ============================================================
 # Paths (adapt if needed)
 # ============================================================
@@ -44,9 +46,9 @@ def find_heart_inlet_from_main(main_csv_path):
 
 
 def load_time_pressure(filename, t_col=0, p_col=1):
-    data = np.loadtxt(filename, delimiter=",")
-    t = data[:, t_col]
-    p = data[:, p_col]
+    data = read_txt(filename, usecols=[t_col, p_col])
+    t = data[:, 0]
+    p = data[:, 1]
     return t, p
 
 
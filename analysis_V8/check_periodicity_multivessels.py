@@ -2,6 +2,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
 
+from text_results import read_txt
+
 # ================================
 # USER SETTINGS
 # ================================
@@ -25,9 +27,9 @@ N_CYCLES_TO_COMPARE = 3
 # ================================
 
 def load_time_pressure(filename, has_header, t_col, p_col):
-    data = np.loadtxt(filename, delimiter=",")
-    t = data[:, t_col]
-    p = data[:, p_col]
+    data = read_txt(filename, usecols=[t_col, p_col])
+    t = data[:, 0]
+    p = data[:, 1]
     return t, p
 
 def find_peaks(t, p):
@@ -2,6 +2,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
 
+from text_results import read_txt
+
 # === SETTINGS =====================================================
 FILENAME = "../projects/simple_run/results/cow_runV10/arterial/N15.txt"
 HAS_HEADER = False
@@ -11,9 +13,9 @@ N_CYCLES_TO_COMPARE = 3
 # ==================================================================
 
 def load_time_pressure(fname, has_header, tcol, pcol):
-    data = np.loadtxt(fname, delimiter=",")
-    t = data[:, tcol]
-    p = data[:, pcol]
+    data = read_txt(fname, usecols=[tcol, pcol])
+    t = data[:, 0]
+    p = data[:, 1]
     return t, p
 
 def find_peaks(t, p):
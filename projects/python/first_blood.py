@@ -0,0 +1,296 @@
+import os
+import ctypes
+
+import numpy as np
+
+# In-process first_blood through the C interface of first_blood_capi.cpp,
+# build the library with: make -f make_first_blood_capi.mk
+LIB_PATH = os.environ.get(
+    "FIRST_BLOOD_LIB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "libfirst_blood.so")
+)
+
+# element kinds of fb_element_kind
+MOC_EDGE, MOC_NODE, LUM_EDGE, LUM_NODE = range(4)
+
+_lib = None
+
+
+def _load(path=LIB_PATH):
+    global _lib
+    if _lib is not None:
+        return _lib
+    lib = ctypes.CDLL(path)
+    p, s, i, d = ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_double
+    dp = ctypes.POINTER(ctypes.c_double)
+    signatures = {
+        "fb_create": ([s], p),
+        "fb_destroy": ([p], None),
+        "fb_load_ok": ([p], i),
+        "fb_run": ([p], i),
+        "fb_double": ([p, s], dp),
+        "fb_int": ([p, s], ctypes.POINTER(ctypes.c_int)),
+        "fb_bool": ([p, s], ctypes.POINTER(ctypes.c_bool)),
+        "fb_model_count": ([p, i], i),
+        "fb_model_name": ([p, i, i], s),
+        "fb_element_count": ([p, i, i, i], i),
+        "fb_element_name": ([p, i, i, i, i], s),
+        "fb_element_kind": ([p, s, s], i),
+        "fb_parameter": ([p, s, s, s, i], dp),
+        "fb_lum_parameter": ([p, s, s], dp),
+        "fb_set_material": ([p, s, s, i, dp, i], i),
+        "fb_history": ([p, s, s, s, ctypes.POINTER(dp)], ctypes.c_long),
+        "fb_clear_save_memory": ([p], None),
+        "fb_set_save_memory": ([p, s, s], i),
+        "fb_load_output_csv": ([p, s], i),
+        "fb_start_stream": ([p, d, s], None),
+        "fb_save_results": ([p, d, s], None),
+        "fb_save_initials": ([p, s, s], None),
+        "fb_add_probe": ([p, s, s, s, s, d], None),
+        "fb_clear_probes": ([p], None),
+    }
+    for name, (args, res) in signatures.items():
+        f = getattr(lib, name)
+        f.argtypes = args
+        f.restype = res
+    _lib = lib
+    return lib
+
+
+def _b(x):
+    return x.encode() if isinstance(x, str) else x
+
+
+class _Setting:
+    """Attribute reading/writing a member of first_blood through its pointer."""
+
+    def __init__(self, getter, ctype):
+        self.getter = getter
+        self.ctype = ctype
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def _ptr(self, obj):
+        ptr = getattr(obj._lib, self.getter)(obj._fb, _b(self.name))
+        if not ptr:
+            raise AttributeError(self.name)
+        return ptr
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return self.ctype(self._ptr(obj)[0])
+
+    def __set__(self, obj, value):
+        self._ptr(obj)[0] = value
+
+
+class _View:
+    """Buffer of a solver vector; the base of the arrays of history(view=True), holding their FirstBlood."""
+
+    def __init__(self, owner, data, n):
+        self.owner = owner
+        self.__array_interface__ = {
+            "shape": (n,),
+            "typestr": "<f8",
+            "data": (ctypes.addressof(data.contents), True),  # read-only
+            "version": 3,
+        }
+
+
+class FirstBlood:
+    """
+    A first_blood model loaded in this process.
+
+    fb = FirstBlood("../../models/Abel_ref2")
+    fb.scale("arterial", "A1", "length", 1.1)
+    fb.run()
+    p = fb.history("arterial", "A1", "pressure_start")
+
+    Parameters are read and written directly in the solver objects, results
+    are read from the vectors the solver records into (no files): copies by
+    default, or with history(..., view=True) NumPy views without a copy that
+    are valid until the next run() or close().
+    """
+
+    time_end = _Setting("fb_double", float)
+    time_period = _Setting("fb_double", float)
+    heart_rate = _Setting("fb_double", float)
+    time_end_min = _Setting("fb_double", float)
+    time_end_max = _Setting("fb_double", float)
+    save_file_dt = _Setting("fb_double", float)
+    pressure_initial = _Setting("fb_double", float)
+    jac_tolerance = _Setting("fb_double", float)
+    material_type = _Setting("fb_int", int)
+    solver_type = _Setting("fb_int", int)
+    history_periods = _Setting("fb_int", int)
+    save_format = _Setting("fb_int", int)
+    save_bytes = _Setting("fb_int", int)
+    period = _Setting("fb_int", int)
+    probe_cycles = _Setting("fb_int", int)
+    probe_bins = _Setting("fb_int", int)
+    newton_solver = _Setting("fb_int", int)
+    number_of_threads = _Setting("fb_int", int)
+    is_periodic_run = _Setting("fb_bool", bool)
+    init_from_file = _Setting("fb_bool", bool)
+    do_autoregulation = _Setting("fb_bool", bool)
+    do_linear_lumped = _Setting("fb_bool", bool)
+
+    def __init__(self, model_folder, lib_path=LIB_PATH):
+        self._lib = _load(lib_path)
+        self.model_folder = model_folder.rstrip("/")
+        self.case_name = os.path.basename(self.model_folder)
+        self._fb = self._lib.fb_create(_b(self.model_folder))
+        if not self._lib.fb_load_ok(self._fb):
+            self.close()
+            raise IOError(f"Could not load the model {model_folder}")
+
+    def close(self):
+        if self._fb:
+            self._lib.fb_destroy(self._fb)
+            self._fb = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        if getattr(self, "_fb", None):
+            self.close()
+
+    # ---------------------------------------------------------------- topology
+    def models(self):
+        """{"moc": [names], "lum": [names]}"""
+        out = {}
+        for t, key in ((0, "moc"), (1, "lum")):
+            n = self._lib.fb_model_count(self._fb, t)
+            out[key] = [self._lib.fb_model_name(self._fb, t, i).decode() for i in range(n)]
+        return out
+
+    def _elements(self, model, kind):
+        for t, key in ((0, "moc"), (1, "lum")):
+            names = self.models()[key]
+            if model in names:
+                m = names.index(model)
+                n = self._lib.fb_element_count(self._fb, t, m, kind)
+                return [self._lib.fb_element_name(self._fb, t, m, kind, i).decode() for i in range(n)]
+        raise KeyError(f"model {model} is not loaded")
+
+    def edges(self, model):
+        return self._elements(model, 0)
+
+    def nodes(self, model):
+        return self._elements(model, 1)
+
+    def kind(self, model, element):
+        k = self._lib.fb_element_kind(self._fb, _b(model), _b(element))
+        if k < 0:
+            raise KeyError(f"{model}/{element} does not exist")
+        return k
+
+    # ---------------------------------------------------------------- parameters
+    def _parameter(self, model, element, name, k=0):
+        ptr = self._lib.fb_parameter(self._fb, _b(model), _b(element), _b(name), k)
+        if not ptr:
+            self.kind(model, element)
+            raise KeyError(f"{model}/{element} has no parameter {name}[{k}]")
+        return ptr
+
+    def get(self, model, element, name, k=0):
+        """Parameter of an element, e.g. ("arterial", "A1", "length") or ("p1", "R1", "parameter", 0)."""
+        return self._parameter(model, element, name, k)[0]
+
+    def set(self, model, element, name, value, k=0):
+        self._parameter(model, element, name, k)[0] = value
+
+    def scale(self, model, element, name, factor, k=0):
+        """Multiplying a parameter, like the multipliers of run_vp.cpp."""
+        ptr = self._parameter(model, element, name, k)
+        ptr[0] *= factor
+
+    def lum_parameter(self, model, name, value=None):
+        """alpha_coronary or beta_coronary of a lumped model; set if value is given."""
+        ptr = self._lib.fb_lum_parameter(self._fb, _b(model), _b(name))
+        if not ptr:
+            raise KeyError(f"lumped model {model} has no parameter {name}")
+        if value is not None:
+            ptr[0] = value
+        return ptr[0]
+
+    def set_material(self, model, edge, material_type, constants=()):
+        c = (ctypes.c_double * len(constants))(*constants)
+        if not self._lib.fb_set_material(self._fb, _b(model), _b(edge), material_type, c, len(constants)):
+            raise KeyError(f"{model}/{edge} is not a moc edge")
+
+    # ---------------------------------------------------------------- running
+    def clear_save_memory(self):
+        self._lib.fb_clear_save_memory(self._fb)
+
+    def set_save_memory(self, model, elements):
+        for e in elements:
+            if not self._lib.fb_set_save_memory(self._fb, _b(model), _b(e)):
+                raise KeyError(f"{model}/{e} does not exist")
+
+    def load_output_csv(self, path):
+        if not self._lib.fb_load_output_csv(self._fb, _b(path)):
+            raise IOError(f"Could not read {path}")
+
+    def add_probe(self, model, element, variable="pressure", tolerance=1.e-3):
+        """
+        Periodicity probe of a moc edge or node, with is_periodic_run the run
+        ends once the relative RMS of the last probe_cycles cycles of every
+        probe is below its tolerance, e.g. add_probe("arterial", "A70", "volume_flow_rate_start").
+        """
+        kind = self.kind(model, element)
+        if kind not in (MOC_EDGE, MOC_NODE):
+            raise KeyError(f"{model}/{element} is not a moc edge or node")
+        self._lib.fb_add_probe(self._fb, _b(model), _b("edge" if kind == MOC_EDGE else "node"), _b(element),
+                               _b(variable), tolerance)
+
+    def clear_probes(self):
+        self._lib.fb_clear_probes(self._fb)
+
+    def run(self):
+        """Running the simulation, True if it finished without error."""
+        return bool(self._lib.fb_run(self._fb))
+
+    # ---------------------------------------------------------------- results
+    def history(self, model, element, variable, view=False):
+        """
+        A recorded variable (or "time") of an element as a NumPy array,
+        variable names as in the result files. Variables not saved in time
+        hold only their last value.
+
+        view=True returns a read-only view of the solver's vector instead of
+        a copy. The view keeps this object alive, but run() and close()
+        reallocate or free the vector: a view read after them is stale or
+        invalid, take a new one (or a copy) after every run.
+        """
+        data = ctypes.POINTER(ctypes.c_double)()
+        n = self._lib.fb_history(self._fb, _b(model), _b(element), _b(variable), ctypes.byref(data))
+        if n < 0:
+            self.kind(model, element)
+            raise KeyError(f"{variable} is not recorded at {model}/{element}")
+        if n == 0:
+            return np.zeros(0)
+        x = np.asarray(_View(self, data, n))
+        return x if view else x.copy()
+
+    def start_stream(self, dt, folder=None):
+        """
+        Writing the moc edges to results/<folder> during the next run(),
+        resampled to dt, like first_blood::start_stream; save_results(dt, folder)
+        after the run closes them and saves the rest.
+        """
+        self._lib.fb_start_stream(self._fb, dt, _b(folder or self.case_name))
+
+    def save_results(self, dt=0., folder=None):
+        """Writing results/<folder> like first_blood::save_results, dt=0: every time step."""
+        self._lib.fb_save_results(self._fb, dt, _b(folder or self.case_name))
+
+    def save_initials(self, model_folder=None):
+        """End state of the last run to <model_folder>/init/, the start of runs with init_from_file = True."""
+        folder = (model_folder or self.model_folder).rstrip("/")
+        self._lib.fb_save_initials(self._fb, _b(os.path.basename(folder)), _b(os.path.dirname(folder) or "."))
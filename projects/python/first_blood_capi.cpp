@@ -0,0 +1,402 @@
+/*===================================================================*\
+								  first_blood_capi
+								 ------------------
+
+	 C interface of first_blood for calling it in-process, e.g. from
+	 Python with ctypes (first_blood.py). Parameters are reached through
+	 pointers to the members, results through the data pointers of the
+	 vectors holding them in memory, nothing is copied.
+
+	 first_blood
+	 R. Weber
+	 git:
+\*==================================================================*/
+
+#include "../../source/first_blood.h"
+#include <string>
+
+using namespace std;
+
+// element kinds for the element functions
+// 0: moc edge, 1: moc node, 2: lumped edge, 3: lumped node
+static int find_moc(first_blood *fb, string name)
+{
+	for(int i=0; i<fb->moc.size(); i++)
+	{
+		if(fb->moc[i]->name == name)
+		{
+			return i;
+		}
+	}
+	return -1;
+}
+
+//--------------------------------------------------------------
+static int find_lum(first_blood *fb, string name)
+{
+	for(int i=0; i<fb->lum.size(); i++)
+	{
+		if(fb->lum[i]->name == name)
+		{
+			return i;
+		}
+	}
+	return -1;
+}
+
+//--------------------------------------------------------------
+// model index (moc or lum) and element index of an element, without the warnings of the id_to_index functions
+static bool find_element(first_blood *fb, string model, string element, int &kind, int &m, int &e)
+{
+	m = find_moc(fb, model);
+	if(m>-1)
+	{
+		for(int i=0; i<fb->moc[m]->edges.size(); i++)
+		{
+			if(fb->moc[m]->edges[i]->ID == element)
+			{
+				kind = 0; e = i;
+				return true;
+			}
+		}
+		for(int i=0; i<fb->moc[m]->nodes.size(); i++)
+		{
+			if(fb->moc[m]->nodes[i]->name == element)
+			{
+				kind = 1; e = i;
+				return true;
+			}
+		}
+		return false;
+	}
+	m = find_lum(fb, model);
+	if(m>-1)
+	{
+		for(int i=0; i<fb->lum[m]->edges.size(); i++)
+		{
+			if(fb->lum[m]->edges[i]->name == element)
+			{
+				kind = 2; e = i;
+				return true;
+			}
+		}
+		for(int i=0; i<fb->lum[m]->nodes.size(); i++)
+		{
+			if(fb->lum[m]->nodes[i]->name == element)
+			{
+				kind = 3; e = i;
+				return true;
+			}
+		}
+	}
+	return false;
+}
+
+extern "C"
+{
+
+//--------------------------------------------------------------
+first_blood *fb_create(const char *folder)
+{
+	return new first_blood(folder);
+}
+
+//--------------------------------------------------------------
+void fb_destroy(first_blood *fb)
+{
+	delete fb;
+}
+
+//--------------------------------------------------------------
+int fb_load_ok(first_blood *fb)
+{
+	return fb->load_ok;
+}
+
+//--------------------------------------------------------------
+int fb_run(first_blood *fb)
+{
+	return fb->run();
+}
+
+//--------------------------------------------------------------
+// settings of the run, NULL if the name is unknown
+double *fb_double(first_blood *fb, const char *name)
+{
+	string n = name;
+	if(n == "time_end") return &fb->time_end;
+	if(n == "time_period") return &fb->time_period;
+	if(n == "heart_rate") return &fb->heart_rate;
+	if(n == "time_end_min") return &fb->time_end_min;
+	if(n == "time_end_max") return &fb->time_end_max;
+	if(n == "save_file_dt") return &fb->save_file_dt;
+	if(n == "pressure_initial") return &fb->pressure_initial;
+	if(n == "jac_tolerance") return &fb->jac_tolerance;
+	return NULL;
+}
+
+//--------------------------------------------------------------
+int *fb_int(first_blood *fb, const char *name)
+{
+	string n = name;
+	if(n == "material_type") return &fb->material_type;
+	if(n == "solver_type") return &fb->solver_type;
+	if(n == "history_periods") return &fb->history_periods;
+	if(n == "save_format") return &fb->save_format;
+	if(n == "save_bytes") return &fb->save_bytes;
+	if(n == "period") return &fb->period;
+	if(n == "probe_cycles") return &fb->probe_cycles;
+	if(n == "probe_bins") return &fb->probe_bins;
+	if(n == "newton_solver") return &fb->newton_solver;
+	if(n == "number_of_threads") return &fb->number_of_threads;
+	return NULL;
+}
+
+//--------------------------------------------------------------
+bool *fb_bool(first_blood *fb, const char *name)
+{
+	string n = name;
+	if(n == "is_periodic_run") return &fb->is_periodic_run;
+	if(n == "init_from_file") return &fb->init_from_file;
+	if(n == "do_autoregulation") return &fb->do_autoregulation;
+	if(n == "do_linear_lumped") return &fb->do_linear_lumped;
+	return NULL;
+}
+
+//--------------------------------------------------------------
+// models, type 0: moc, 1: lumped
+int fb_model_count(first_blood *fb, int type)
+{
+	return type == 0 ? fb->moc.size() : fb->lum.size();
+}
+
+//--------------------------------------------------------------
+const char *fb_model_name(first_blood *fb, int type, int i)
+{
+	return type == 0 ? fb->moc[i]->name.c_str() : fb->lum[i]->name.c_str();
+}
+
+//--------------------------------------------------------------
+int fb_element_count(first_blood *fb, int type, int m, int kind)
+{
+	if(type == 0)
+	{
+		return kind == 0 ? fb->moc[m]->edges.size() : fb->moc[m]->nodes.size();
+	}
+	return kind == 0 ? fb->lum[m]->edges.size() : fb->lum[m]->nodes.size();
+}
+
+//--------------------------------------------------------------
+const char *fb_element_name(first_blood *fb, int type, int m, int kind, int i)
+{
+	if(type == 0)
+	{
+		return kind == 0 ? fb->moc[m]->edges[i]->ID.c_str() : fb->moc[m]->nodes[i]->name.c_str();
+	}
+	return kind == 0 ? fb->lum[m]->edges[i]->name.c_str() : fb->lum[m]->nodes[i]->name.c_str();
+}
+
+//--------------------------------------------------------------
+// kind of an element (see above), -1 if it does not exist
+int fb_element_kind(first_blood *fb, const char *model, const char *element)
+{
+	int kind, m, e;
+	if(find_element(fb, model, element, kind, m, e))
+	{
+		return kind;
+	}
+	return -1;
+}
+
+//--------------------------------------------------------------
+// pointer to a parameter of an element, k: index of vector parameters (material_const, parameter)
+// NULL if the element or the parameter does not exist
+double *fb_parameter(first_blood *fb, const char *model, const char *element, const char *name, int k)
+{
+	int kind, m, e;
+	if(!find_element(fb, model, element, kind, m, e))
+	{
+		return NULL;
+	}
+	string n = name;
+	if(kind == 0)
+	{
+		moc_edge *ed = fb->moc[m]->edges[e];
+		if(n == "length") return &ed->length;
+		if(n == "nominal_diameter_start") return &ed->nominal_diameter_start;
+		if(n == "nominal_diameter_end") return &ed->nominal_diameter_end;
+		if(n == "nominal_thickness_start") return &ed->nominal_thickness_start;
+		if(n == "nominal_thickness_end") return &ed->nominal_thickness_end;
+		if(n == "resistance_start") return &ed->resistance_start;
+		if(n == "resistance_end") return &ed->resistance_end;
+		if(n == "geodetic_height_start") return &ed->geodetic_height_start;
+		if(n == "geodetic_height_end") return &ed->geodetic_height_end;
+		if(n == "elasticity") return &ed->elasticity;
+		if(n == "kinematic_viscosity_factor") return &ed->kinematic_viscosity_factor;
+		if(n == "material_const" && k<ed->material_const.size()) return &ed->material_const[k];
+	}
+	else if(kind == 1)
+	{
+		moc_node *nd = fb->moc[m]->nodes[e];
+		if(n == "resistance") return &nd->resistance;
+		if(n == "pressure_out") return &nd->pressure_out;
+	}
+	else if(kind == 2)
+	{
+		auto *ed = fb->lum[m]->edges[e];
+		if(n == "parameter" && k<ed->parameter.size()) return &ed->parameter[k];
+		if(n == "parameter_factor") return &ed->parameter_factor;
+		if(n == "volume_flow_rate_initial") return &ed->volume_flow_rate_initial;
+	}
+	else if(kind == 3)
+	{
+		auto *nd = fb->lum[m]->nodes[e];
+		if(n == "pressure_initial") return &nd->pressure_initial;
+	}
+	return NULL;
+}
+
+//--------------------------------------------------------------
+// parameters of a whole lumped model
+double *fb_lum_parameter(first_blood *fb, const char *model, const char *name)
+{
+	int m = find_lum(fb, model);
+	if(m<0)
+	{
+		return NULL;
+	}
+	string n = name;
+	if(n == "alpha_coronary") return &fb->lum[m]->alpha_coronary;
+	if(n == "beta_coronary") return &fb->lum[m]->beta_coronary;
+	return NULL;
+}
+
+//--------------------------------------------------------------
+// material of a moc edge, 0: linear, 1: olufsen with n constants
+int fb_set_material(first_blood *fb, const char *model, const char *element, int type, const double *c, int n)
+{
+	int kind, m, e;
+	if(!find_element(fb, model, element, kind, m, e) || kind != 0)
+	{
+		return 0;
+	}
+	fb->moc[m]->edges[e]->material_type = type;
+	fb->moc[m]->edges[e]->material_const.assign(c, c+n);
+	return 1;
+}
+
+//--------------------------------------------------------------
+// recorded variable of an element in memory: data points to the vector, returns its size or -1
+// valid until the next run() or fb_destroy()
+long fb_history(first_blood *fb, const char *model, const char *element, const char *variable, const double **data)
+{
+	int kind, m, e;
+	if(!find_element(fb, model, element, kind, m, e))
+	{
+		return -1;
+	}
+	string n = variable;
+	const vector<double> *x = NULL;
+	if(kind == 0)
+	{
+		moc_edge *ed = fb->moc[m]->edges[e];
+		vector<string> &names = fb->moc[m]->edge_columns;
+		int k = find(names.begin(), names.end(), n) - names.begin();
+		if(k == 0) x = &ed->time;
+		else if(k<names.size()) x = ed->field_variables()[k-1];
+	}
+	else if(kind == 1)
+	{
+		moc_node *nd = fb->moc[m]->nodes[e];
+		if(n == "time") x = &nd->time;
+		else if(n == "pressure") x = &nd->pressure;
+		else if(n == "volume_flow_rate") x = &nd->volume_flow_rate;
+	}
+	else if(kind == 2)
+	{
+		if(n == "time") x = &fb->lum[m]->time;
+		else if(n == "volume_flow_rate") x = &fb->lum[m]->edges[e]->volume_flow_rate;
+	}
+	else if(kind == 3)
+	{
+		if(n == "time") x = &fb->lum[m]->time;
+		else if(n == "pressure") x = &fb->lum[m]->nodes[e]->pressure;
+	}
+	if(x == NULL)
+	{
+		return -1;
+	}
+	*data = x->data();
+	return x->size();
+}
+
+//--------------------------------------------------------------
+void fb_clear_save_memory(first_blood *fb)
+{
+	fb->clear_save_memory();
+}
+
+//--------------------------------------------------------------
+// saving one element to memory, see first_blood::set_save_memory
+int fb_set_save_memory(first_blood *fb, const char *model, const char *element)
+{
+	int kind, m, e;
+	if(!find_element(fb, model, element, kind, m, e))
+	{
+		return 0;
+	}
+	vector<string> el, nl;
+	if(kind == 0 || kind == 2) el.push_back(element);
+	else nl.push_back(element);
+	fb->set_save_memory(model, kind<2 ? "moc" : "lum", el, nl);
+	return 1;
+}
+
+//--------------------------------------------------------------
+int fb_load_output_csv(first_blood *fb, const char *file_path)
+{
+	return fb->load_output_csv(file_path);
+}
+
+//--------------------------------------------------------------
+// periodicity probe of a periodic run, kind: edge or node
+void fb_add_probe(first_blood *fb, const char *model, const char *kind, const char *element, const char *variable, double tolerance)
+{
+	fb->add_probe(model, kind, element, variable, tolerance);
+}
+
+//--------------------------------------------------------------
+void fb_clear_probes(first_blood *fb)
+{
+	fb->probes.clear();
+}
+
+//--------------------------------------------------------------
+// end state of the last run to folder/model_name/init/, read back by a run with init_from_file
+void fb_save_initials(first_blood *fb, const char *model_name, const char *folder)
+{
+	fb->save_initials(model_name, folder);
+}
+
+//--------------------------------------------------------------
+// moc edges written to results/folder during the next run, closed by fb_save_results with the same dt
+void fb_start_stream(first_blood *fb, double dt, const char *folder)
+{
+	fb->start_stream(dt, folder);
+}
+
+//--------------------------------------------------------------
+// dt<=0: every time step
+void fb_save_results(first_blood *fb, double dt, const char *folder)
+{
+	if(dt>0.)
+	{
+		fb->save_results(dt, folder);
+	}
+	else
+	{
+		fb->save_results(folder);
+	}
+}
+
+}
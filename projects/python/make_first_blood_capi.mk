@@ -0,0 +1,24 @@
+CXX=clang++
+CXXFLAGS=-std=c++17 -O3 -pthread -fPIC -shared
+
+SOURCE_FOLDER = ../../source/
+
+MAIN = first_blood_capi
+LIB = libfirst_blood.so
+
+SOURCES += \
+$(SOURCE_FOLDER)file_io.cpp \
+$(SOURCE_FOLDER)first_blood.cpp \
+$(SOURCE_FOLDER)moc_edge.cpp \
+$(SOURCE_FOLDER)moc_node.cpp \
+$(SOURCE_FOLDER)solver_lumped.cpp \
+$(SOURCE_FOLDER)solver_lumped_io.cpp \
+$(SOURCE_FOLDER)solver_moc.cpp \
+$(SOURCE_FOLDER)solver_moc_io.cpp \
+$(SOURCE_FOLDER)statistics.cpp \
+
+$(LIB): $(MAIN).cpp $(SOURCES)
+	$(CXX) $(CXXFLAGS) $(MAIN).cpp $(SOURCES) -o $(LIB)
+
+clean:
+	rm $(LIB)
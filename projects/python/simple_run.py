@@ -0,0 +1,31 @@
+import sys
+
+from first_blood import FirstBlood
+
+# same as simple_run.cpp, without a separate process and result files
+case_folder = "../../models/"
+save_dt = 1e-3
+
+if len(sys.argv) != 2:
+    print(f"Incorrect number of inputs ({len(sys.argv)}). Right one: 1")
+    sys.exit(-1)
+case_name = sys.argv[1]
+
+fb = FirstBlood(case_folder + case_name)
+#fb.time_end = 10. * fb.time_period
+#fb.is_periodic_run = False
+#fb.scale("arterial", "A1", "length", 1.1)  # parameters are edited in place
+#fb.scale("p1", "R1", "parameter", 2.)  # lumped edge parameter[0]
+
+# fielad variable for saving to memory
+#fb.clear_save_memory()
+#fb.set_save_memory("arterial", ["A1", "A5", "n1"])
+
+is_run_ok = fb.run()
+
+if is_run_ok:
+    # views of the solver's vectors, valid until the next run()
+    t = fb.history("arterial", "A1", "time")
+    p = fb.history("arterial", "A1", "pressure_start")
+    print(f"A1 pressure_start: {len(t)} samples, last {p[-1]:.1f} Pa at {t[-1]:.3f} s")
+    fb.save_results(save_dt)
@@ -1,6 +1,8 @@
 import matplotlib.pyplot as plt
 import pandas as pd
 
+from text_results import read_frame
+
 cases = 'Reymond_99_heart_ref3_02'
 
 # plot for the arterial system
@@ -25,7 +27,7 @@ gs = fig.add_gridspec(5,2,wspace=1.2*cm)
 axs = gs.subplots(sharex=True)
 
 for i in range(0,len(elements)):
-	data = pd.read_csv("results\\" + cases + "\\" + models + "\\" + elements[i] + ".txt",header=None)
+	data = read_frame("results\\" + cases + "\\" + models + "\\" + elements[i] + ".txt")
 	t = data[0]
 	p = (data[2-start[i]]-1e5)/mmHg_to_Pa
 	q = data[6-start[i]]*1e3*60
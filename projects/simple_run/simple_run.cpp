@@ -30,10 +30,14 @@ int main(int argc, char* argv[])
    //fb->time_end = sim_time;
    //fb->time_period = period_time;
    //fb->is_periodic_run = false;
-   //fb->init_from_file = init_from_file;
+   //fb->init_from_file = init_from_file; // starting from <case>/init, e.g. written by scripts/warm_start.py apply, same as "init" in main.csv
    //int heart_index = fb->lum_id_to_index("rats");
    //fb->lum[heart_index]->heart_rate = heart_rate;
    //fb->heart_rate = heart_rate;
+   //fb->save_format = 1; // binary result files, same as "save,binary" in main.csv
+   //fb->save_bytes = 4; // float32 values in binary result files
+   //fb->history_periods = 3; // keeping only the last 3 periods in memory, same as "history,3" in main.csv
+   //fb->load_output_csv(case_folder + case_name + "/output.csv"); // saving only the listed elements/variables, same as "output,output" in main.csv
 
    // fielad variable for saving to memory / files
    // variables from moc
@@ -51,6 +55,9 @@ int main(int argc, char* argv[])
    //vector<string> nl2{"left-atrium","left-ventricular","aorta"};
    //fb->set_save_memory(model_name2,model_type2,el2,nl2);
 
+   // writing the moc edges to file during the run instead of keeping them in memory
+   //fb->start_stream(save_dt);
+
    // running the simulation
    bool is_run_ok = fb->run();
 
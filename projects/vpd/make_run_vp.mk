@@ -1,6 +1,6 @@
 
 CXX=clang++
-CXXFLAGS=-std=c++17 -O3 -c
+CXXFLAGS=-std=c++17 -O3 -pthread -c
 
 SOURCE_FOLDER = ../../source/
 BIN_FOLDER = ../../bin/
@@ -30,7 +30,7 @@ $(BIN_FOLDER)solver_moc_io.o \
 $(BIN_FOLDER)statistics.o \
 
 $(MAIN): $(OBJS)
-	$(CXX) $(MAIN).cpp $(BIN_OBJS) -o $(MAIN).out
+	$(CXX) -pthread $(MAIN).cpp $(BIN_OBJS) -o $(MAIN).out
 
 %.o: $(SOURCE_FOLDER)%.cpp
 	$(CXX) $(CXXFLAGS) -o $(BIN_FOLDER)$@ $<
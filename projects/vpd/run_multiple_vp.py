@@ -1,9 +1,22 @@
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts"))
+from ensemble_runner import run_ensemble
 
 project = 'run_vp.out'
 
 first = 0
 last = 999
 
-for i in range(first,last):
-	os.system("./" + project + " " + str(i))
\ No newline at end of file
+# every run in its own folder under ensemble/runs/, results collected in ensemble/results/,
+# finished indices are listed in ensemble/ledger.jsonl and skipped when relaunched
+counts = run_ensemble(
+	["./" + project, "{i}"],
+	range(first,last),
+	root="ensemble",
+	workers=None, # number of cores
+	timeout=None, # seconds
+	links=["VPD.csv"],
+)
+print(counts)
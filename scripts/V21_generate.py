@@ -1,7 +1,6 @@
 import json
 import math
 import os
-import shutil
 
 # ==========================================
 # 1. CONFIGURATION
@@ -237,18 +236,19 @@ perif,p47,0,,"""
 # ==========================================
 # 3. HELPER FUNCTIONS
 # ==========================================
-def load_json(filename):
-    path = os.path.join(RAW_DATA_DIR, filename)
-    try:
-        with open(path, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"CRITICAL ERROR: Could not find file at: {path}")
-        exit(1)
+def load_json(filename, raw_dir=RAW_DATA_DIR):
+    path = os.path.join(raw_dir, filename)
+    with open(path, 'r') as f:
+        return json.load(f)
+
+feat_data, nodes_data, variant_data = {}, {}, {}
 
-feat_data = load_json(f'feature_mr_{PATIENT_ID}.json')
-nodes_data = load_json(f'nodes_mr_{PATIENT_ID}.json')
-variant_data = load_json(f'variant_mr_{PATIENT_ID}.json')
+def set_patient(raw_dir=RAW_DATA_DIR, patient_id=PATIENT_ID):
+    """Loading the MR data of a patient, used by the generation functions."""
+    global feat_data, nodes_data, variant_data
+    feat_data = load_json(f'feature_mr_{patient_id}.json', raw_dir)
+    nodes_data = load_json(f'nodes_mr_{patient_id}.json', raw_dir)
+    variant_data = load_json(f'variant_mr_{patient_id}.json', raw_dir)
 
 def get_coords(node_id):
     for label_group in nodes_data.values():
@@ -484,6 +484,12 @@ node, p_LV1, 1.0110e+05
 # 5. EXECUTION
 # ==========================================
 if __name__ == "__main__":
+    try:
+        set_patient(RAW_DATA_DIR, PATIENT_ID)
+    except FileNotFoundError as e:
+        print(f"CRITICAL ERROR: Could not find file at: {e.filename}")
+        exit(1)
+
     if not os.path.exists(FULL_OUTPUT_PATH):
         os.makedirs(FULL_OUTPUT_PATH)
     
@@ -52,8 +52,15 @@ def load_json(path):
     with open(path, "r") as f:
         return json.load(f)
 
-feat = load_json(FEATURE_FILE)
-var  = load_json(VARIANT_FILE)
+feat = {}
+var  = {}
+
+
+def set_patient(raw_dir=RAW_DIR, patient_id=PATIENT_ID):
+    """Loading the MR geometry of a patient, used by get_geom."""
+    global feat, var
+    feat = load_json(os.path.join(raw_dir, f"feature_mr_{patient_id}.json"))
+    var  = load_json(os.path.join(raw_dir, f"variant_mr_{patient_id}.json"))
 
 
 def get_geom(label, segname):
@@ -112,22 +119,23 @@ COW_VESSELS = {
 # ----------------------------------------------------------------------
 # COPY ABEL_REF2 → OUTPUT
 # ----------------------------------------------------------------------
-def clone_model():
-    if not os.path.exists(BASE_DIR):
-        raise RuntimeError(f"Base model directory not found: {BASE_DIR}")
-    if os.path.exists(OUT_DIR):
-        shutil.rmtree(OUT_DIR)
-    shutil.copytree(BASE_DIR, OUT_DIR)
+def clone_model(base_dir=BASE_DIR, out_dir=OUT_DIR):
+    if not os.path.exists(base_dir):
+        raise RuntimeError(f"Base model directory not found: {base_dir}")
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    shutil.copytree(base_dir, out_dir)
 
 
 # ----------------------------------------------------------------------
 # MODIFY ARTERIAL.CSV BY OVERWRITING ONLY CoW GEOMETRY
 # ----------------------------------------------------------------------
-def modify_arterial():
-    path = os.path.join(OUT_DIR, "arterial.csv")
+def modify_arterial(out_dir=OUT_DIR, base_dir=None):
+    """arterial.csv of base_dir (default: out_dir) with the CoW geometry of the patient to out_dir."""
+    path = os.path.join(out_dir, "arterial.csv")
 
     # load file
-    with open(path, "r") as f:
+    with open(os.path.join(base_dir or out_dir, "arterial.csv"), "r") as f:
         rows = list(csv.reader(f))
 
     if not rows:
@@ -228,6 +236,8 @@ def modify_arterial():
 # MAIN
 # ----------------------------------------------------------------------
 if __name__ == "__main__":
+    set_patient(RAW_DIR, PATIENT_ID)
+
     print("[INFO] Cloning Abel_ref2 → cow_runV23 ...")
     clone_model()
 
@@ -0,0 +1,266 @@
+import os
+import sys
+import json
+import time
+import shutil
+import fnmatch
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "projects", "python"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "analysis"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "analysis_V20"))
+from V23_analysis import PHYSIOLOGICAL_RANGES, level1_metrics
+from parameter_sweep import vessel_metrics
+from model_overlay import base_of, compose
+
+# Calibration of the peripheral lumped parameters against target bands of the
+# aortic level-1 metrics of V23_analysis.analyze_run (P_sys, P_dia, P_mean,
+# PP, CO) and of moc vessel metrics (e.g. A70.q_mean, A70.p_mean).
+#
+#   python calibrate_windkessel.py ../models/cow_runV23 --target A70.q_mean=1.5:3.
+#
+# Groups of lumped edges share one multiplier of their parameter (default: R,
+# every resistor R* and C, every capacitor C* of all lumped models but the
+# heart). A Gauss-Newton loop on the log multipliers moves the metrics towards
+# the centres of their bands. Every evaluation is a short
+# run of --periods heart cycles started from the end state of the previous
+# one (save_initials / init_from_file on the same loaded model), and the loop
+# stops as soon as every metric is inside its band.
+#   <out>/model/                 working copy of the model with init/
+#   <out>/calibration.csv        multipliers and metrics of every evaluation
+#   <out>/calibration.json       final multipliers, metrics and parameter values
+#   <out>/<case>_calibrated/     the model with the calibrated lumped csv files
+AORTIC_TARGETS = ["P_sys", "P_dia", "P_mean", "PP", "CO"]
+
+
+def parse_band(text):
+    """'NAME=LO:HI' -> (NAME, (LO, HI))"""
+    name, band = text.split("=")
+    lo, hi = band.split(":")
+    return name, (float(lo), float(hi))
+
+
+def parse_group(text):
+    """'NAME=MODELS:EDGES[:K]' with glob patterns, e.g. 'R_brain=out_*:R_*'"""
+    name, rest = text.split("=")
+    sv = rest.split(":")
+    return dict(name=name, models=sv[0], edges=sv[1], k=int(sv[2]) if len(sv) > 2 else 0)
+
+
+def group_targets(fb, group, heart):
+    """(model, edge) pairs of a group."""
+    out = []
+    for m in fb.models()["lum"]:
+        if m == heart or not fnmatch.fnmatch(m, group["models"]):
+            continue
+        out += [(m, e) for e in fb.edges(m) if fnmatch.fnmatch(e, group["edges"])]
+    return out
+
+
+class Calibration:
+    def __init__(self, model_dir, out, groups, targets, heart="heart_kim_lit", periods=5, first_periods=10,
+                 p_node="aorta", q_edge="R_lv_aorta"):
+        from first_blood import FirstBlood
+
+        self.out = out
+        self.work = os.path.join(out, "model")
+        if os.path.isdir(self.work):
+            shutil.rmtree(self.work)
+        if base_of(model_dir):
+            compose(model_dir, self.work)  # plain model, the lumped files are rewritten in place
+        else:
+            shutil.copytree(model_dir, self.work, ignore=shutil.ignore_patterns("results"))
+        self.case = os.path.basename(os.path.abspath(model_dir))
+        self.targets = targets
+        self.heart, self.p_node, self.q_edge = heart, p_node, q_edge
+        self.periods = periods
+        self.first_periods = first_periods
+        self.vessels = sorted({t.split(".")[0] for t in targets if t not in PHYSIOLOGICAL_RANGES})
+
+        self.fb = FirstBlood(self.work)
+        self.fb.is_periodic_run = False
+        self.fb.init_from_file = os.path.isdir(os.path.join(self.work, "init"))
+        self.groups = []
+        for g in groups:
+            pairs = group_targets(self.fb, g, heart)
+            if not pairs:
+                raise ValueError(f"group {g['name']} matches no lumped edge ({g['models']}:{g['edges']})")
+            base = [self.fb.get(m, e, "parameter", g["k"]) for m, e in pairs]
+            self.groups.append(dict(g, pairs=pairs, base=base))
+        self.log = []
+
+    def _apply(self, x):
+        for g, f in zip(self.groups, x):
+            for (m, e), b in zip(g["pairs"], g["base"]):
+                self.fb.set(m, e, "parameter", b * f, g["k"])
+
+    def metrics(self):
+        fb = self.fb
+        t = fb.history(self.heart, self.p_node, "time")
+        p = fb.history(self.heart, self.p_node, "pressure")
+        q = fb.history(self.heart, self.q_edge, "volume_flow_rate")
+        ground = 1.e5
+        if "g" in fb.nodes(self.heart):
+            ground = fb.history(self.heart, "g", "pressure")[-1]
+        w = t >= t[-1] - fb.time_period
+        dt = np.median(np.diff(t[w]))
+        # 40 samples of the 1 ms result files of analyze_run
+        m = level1_metrics(t[w], (p[w] - ground) / 133.322, q[w] * 60.e3, peak_distance=max(1, int(.04 / dt)))
+        for v in self.vessels:
+            for k, value in vessel_metrics(fb, "arterial", v, periods=1).items():
+                m[f"{v}.{k}"] = value
+        return m
+
+    def evaluate(self, x):
+        """Metrics with the multipliers x, continuing from the end state of the previous evaluation."""
+        fb = self.fb
+        t0 = time.time()
+        self._apply(x)
+        n = self.periods if fb.init_from_file else self.first_periods
+        fb.time_end = n * fb.time_period
+        fb.clear_save_memory()
+        fb.set_save_memory(self.heart, [self.p_node, self.q_edge] + (["g"] if "g" in fb.nodes(self.heart) else []))
+        if self.vessels:
+            fb.set_save_memory("arterial", self.vessels)
+        if not fb.run():
+            m = {k: np.nan for k in self.targets}
+        else:
+            m = self.metrics()
+            fb.save_initials()
+            fb.init_from_file = True
+        entry = dict(evaluation=len(self.log), seconds=time.time() - t0)
+        entry.update({g["name"]: f for g, f in zip(self.groups, x)})
+        entry.update({k: m.get(k, np.nan) for k in self.targets})
+        self.log.append(entry)
+        pd.DataFrame(self.log).to_csv(os.path.join(self.out, "calibration.csv"), index=False)
+        print(f"[{entry['evaluation']}] " + " ".join(f"{g['name']}={f:.3f}" for g, f in zip(self.groups, x)) + " | "
+              + " ".join(f"{k}={m.get(k, np.nan):.2f}" for k in self.targets), flush=True)
+        return m
+
+    def residuals(self, logx):
+        """Metrics with the multipliers exp(logx) as distances from the band centres in half widths."""
+        m = self.evaluate(np.exp(logx))
+        r = np.array([(m[k] - .5 * (lo + hi)) / (.5 * (hi - lo)) for k, (lo, hi) in self.targets.items()])
+        return np.where(np.isfinite(r), r, 10.)
+
+    def run(self, bounds=(.1, 10.), max_evaluations=60, h=.1, max_step=.7):
+        """
+        Multipliers of the groups, True if every metric ended inside its band.
+
+        Gauss-Newton on the log multipliers with a finite difference Jacobian
+        (step h) at the start and Broyden updates after, one run per iterate.
+        Steps longer than max_step are shortened, and halved after a run that
+        did not reduce the residual.
+        """
+        lb, ub = np.log(bounds[0]), np.log(bounds[1])
+        d = len(self.groups)
+        x = np.zeros(d)
+        r = self.residuals(x)
+        if np.all(np.abs(r) <= 1.):
+            return np.exp(x), True
+        J = np.empty((len(r), d))
+        for i in range(d):
+            e = np.zeros(d)
+            e[i] = h
+            J[:, i] = (self.residuals(x + e) - r) / h
+
+        while len(self.log) < max_evaluations:
+            step = np.linalg.lstsq(J, -r, rcond=None)[0]
+            if np.linalg.norm(step) > max_step:
+                step *= max_step / np.linalg.norm(step)
+            x_new = np.clip(x + step, lb, ub)
+            dx = x_new - x
+            if not dx.any():
+                break  # at the bounds
+            r_new = self.residuals(x_new)
+            if np.all(np.abs(r_new) <= 1.):
+                return np.exp(x_new), True
+            J += np.outer(r_new - r - J @ dx, dx) / (dx @ dx)
+            if r_new @ r_new < r @ r:
+                x, r = x_new, r_new
+            else:
+                max_step /= 2.
+        return np.exp(x), False
+
+    def save(self, x, ok):
+        """calibration.json and <case>_calibrated with the lumped csv files rewritten."""
+        self._apply(x)
+        values = {}
+        rewrites = {}  # (model, parameter index): {edge: value}, the index belongs to the group of each edge
+        for g in self.groups:
+            for m, e in g["pairs"]:
+                v = self.fb.get(m, e, "parameter", g["k"])
+                values.setdefault(m, {})[e] = v
+                rewrites.setdefault((m, g["k"]), {})[e] = v
+        dst = os.path.join(self.out, self.case + "_calibrated")
+        if os.path.isdir(dst):
+            shutil.rmtree(dst)
+        shutil.copytree(self.work, dst, ignore=shutil.ignore_patterns("init"))
+        for (m, k), edges in rewrites.items():
+            rewrite_lumped(os.path.join(dst, m + ".csv"), edges, k)
+        last = self.log[-1] if self.log else {}
+        with open(os.path.join(self.out, "calibration.json"), "w") as f:
+            json.dump({
+                "model": self.case,
+                "in_bands": ok,
+                "evaluations": len(self.log),
+                "multipliers": {g["name"]: float(v) for g, v in zip(self.groups, x)},
+                "groups": {g["name"]: f"{g['models']}:{g['edges']}" for g in self.groups},
+                "targets": self.targets,
+                "metrics": {k: float(last.get(k, np.nan)) for k in self.targets},
+                "parameters": values,
+            }, f, indent=1)
+        return dst
+
+
+def rewrite_lumped(path, values, k=0):
+    """Setting parameter k of the named edges in a lumped csv file, other lines are kept as they are."""
+    with open(path) as f:
+        lines = f.readlines()
+    for i, line in enumerate(lines):
+        sv = [s.strip() for s in line.split(",")]
+        if len(sv) > 5 + k and sv[1] in values:
+            sv[5 + k] = f"{values[sv[1]]:.4e}"
+            lines[i] = ", ".join(sv) + "\n"
+    with open(path, "w") as f:
+        f.writelines(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate peripheral lumped parameters to target metric bands.")
+    parser.add_argument("model", help="model folder, e.g. ../models/cow_runV23")
+    parser.add_argument("--out", default="calibration", help="output folder (default: calibration)")
+    parser.add_argument("--group", action="append", default=None,
+                        help="NAME=MODELS:EDGES[:K] lumped edges scaled together, globs "
+                             "(default: R=*:R* C=*:C*, the heart model excluded)")
+    parser.add_argument("--target", action="append", default=[],
+                        help="NAME=LO:HI, metric band, e.g. P_mean=85:100 or A70.q_mean=1.5:3 (ml/s)")
+    parser.add_argument("--no-default-targets", action="store_true",
+                        help=f"do not target the physiological ranges of {', '.join(AORTIC_TARGETS)}")
+    parser.add_argument("--heart", default="heart_kim_lit", help="heart model (default: heart_kim_lit)")
+    parser.add_argument("--periods", type=int, default=5, help="heart cycles per evaluation (default: 5)")
+    parser.add_argument("--first-periods", type=int, default=10, help="cycles of a cold first run (default: 10)")
+    parser.add_argument("--bounds", type=float, nargs=2, default=[.1, 10.], help="multiplier bounds (default: 0.1 10)")
+    parser.add_argument("--max-evaluations", type=int, default=60)
+    args = parser.parse_args(argv)
+
+    targets = {} if args.no_default_targets else {k: PHYSIOLOGICAL_RANGES[k] for k in AORTIC_TARGETS}
+    targets.update(dict(parse_band(t) for t in args.target))
+    if not targets:
+        parser.error("no targets")
+    groups = [parse_group(g) for g in (args.group or ["R=*:R*", "C=*:C*"])]
+
+    os.makedirs(args.out, exist_ok=True)
+    cal = Calibration(args.model, args.out, groups, targets, args.heart, args.periods, args.first_periods)
+    x, ok = cal.run(args.bounds, args.max_evaluations)
+    dst = cal.save(x, ok)
+    print(("inside every band" if ok else "!!!WARNING!!! not every metric is inside its band")
+          + f" after {len(cal.log)} evaluations, calibrated model: {dst}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+import os
+import sys
+import time
+import shutil
+import fnmatch
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "projects", "python"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "analysis"))
+from parameter_sweep import vessel_metrics
+from model_overlay import base_of, compose
+
+# Global sensitivity of the Circle of Willis pressures and flow rates to the
+# boundary parameters of the generated cow_run models (V20/V21_generate.py):
+# R_prox, R_dist and C_wk of every cerebral outlet (out_*.csv) and the
+# k1, k2, k3 material constants of the patient vessels (P_*).
+#
+#   python cow_sensitivity.py morris ../models/cow_runV21 --out sa_morris
+#   python cow_sensitivity.py sobol ../models/cow_runV21 --out sa_sobol --tol 0.05
+#
+# The model is copied to <out>/model and run once as given in its main.csv,
+# the end state is saved to <out>/model/init (save_initials). Every evaluation
+# then starts from this state (init_from_file) and runs only a few periods on
+# a process pool through first_blood.py. Samples are drawn in batches, the
+# indices and their bootstrap confidence intervals are recomputed after every
+# batch and sampling stops once the widest interval is below the tolerance.
+#   <out>/evaluations.csv   multipliers and outputs of every run
+#   <out>/convergence.csv   sample count and widest interval after every batch
+#   <out>/morris.csv        mu, mu_star, sigma, mu_star_conf per output and factor,
+#                           effects per the whole range of the factor
+#   <out>/sobol.csv         S1, S1_conf, ST, ST_conf per output and factor
+COW_OUTPUTS = {"MCA": ["P_RMCA", "P_LMCA"], "PCA": ["P_RP2", "P_LP2"], "ACA": ["P_RA2", "P_LA2"]}
+WK_EDGES = ["R_prox", "R_dist", "C_wk"]
+
+
+def cow_factors(fb, outlets="out_*", wk_range=(.5, 2.), k_range=(.8, 1.2), cow_edges="P_*", material=True,
+                wk_edges=WK_EDGES):
+    """
+    Factors of the model as dicts: name, targets [(model, element, parameter, k)], low, high, log.
+    The values are multipliers of the parameters as loaded.
+    """
+    factors = []
+    for m in fb.models()["lum"]:
+        if not fnmatch.fnmatch(m, outlets):
+            continue
+        for e in fb.edges(m):
+            if e in wk_edges:
+                factors.append(dict(name=f"{m}.{e}", targets=[(m, e, "parameter", 0)],
+                                    low=wk_range[0], high=wk_range[1], log=True))
+    if material:
+        edges = [e for e in fb.edges("arterial") if fnmatch.fnmatch(e, cow_edges)]
+        for k, name in enumerate(["k1", "k2", "k3"]):
+            factors.append(dict(name=name, targets=[("arterial", e, "material_const", k) for e in edges],
+                                low=k_range[0], high=k_range[1], log=False))
+    return factors
+
+
+def to_multipliers(u, factors):
+    """Unit cube samples (n, d) to parameter multipliers."""
+    x = np.empty_like(u)
+    for j, f in enumerate(factors):
+        if f["log"]:
+            x[:, j] = f["low"] * (f["high"] / f["low"]) ** u[:, j]
+        else:
+            x[:, j] = f["low"] + u[:, j] * (f["high"] - f["low"])
+    return x
+
+
+def output_names(vessels, metrics):
+    return [f"{v}.{m}" for v in vessels for m in metrics]
+
+
+# ---------------------------------------------------------------- evaluation
+_worker = {}
+
+
+def _init_worker(model_dir, factors, vessels, metrics, periods):
+    _worker.update(model_dir=model_dir, factors=factors, vessels=vessels, metrics=metrics, periods=periods)
+
+
+def _evaluate(x):
+    from first_blood import FirstBlood
+
+    w = _worker
+    with FirstBlood(w["model_dir"]) as fb:
+        fb.init_from_file = True
+        fb.is_periodic_run = False
+        fb.time_end = w["periods"] * fb.time_period
+        for f, v in zip(w["factors"], x):
+            for model, element, parameter, k in f["targets"]:
+                fb.scale(model, element, parameter, v, k)
+        fb.clear_save_memory()
+        fb.set_save_memory("arterial", w["vessels"])
+        if not fb.run():
+            return [np.nan] * len(w["vessels"]) * len(w["metrics"])
+        out = []
+        for v in w["vessels"]:
+            m = vessel_metrics(fb, "arterial", v, periods=1)
+            out += [m[k] for k in w["metrics"]]
+    return out
+
+
+def warm_start(model_dir, work_dir):
+    """Copy of the model in work_dir with the end state of a full run in its init/ folder."""
+    from first_blood import FirstBlood
+
+    if not os.path.isdir(work_dir):
+        if base_of(model_dir):
+            compose(model_dir, work_dir, init=False)  # plain model, a relative base line would not resolve from work_dir
+        else:
+            shutil.copytree(model_dir, work_dir, ignore=shutil.ignore_patterns("init", "results"))
+    if not os.path.isdir(os.path.join(work_dir, "init")):
+        print(f"running {model_dir} once for the initial conditions", flush=True)
+        with FirstBlood(work_dir) as fb:
+            # ending on a period boundary, the runs from the saved state start at t=0 of the heart cycle
+            if not fb.is_periodic_run:
+                fb.time_end = np.ceil(fb.time_end / fb.time_period - 1.e-6) * fb.time_period
+            if not fb.run():
+                raise RuntimeError(f"the reference run of {model_dir} failed")
+            fb.save_initials()
+    return work_dir
+
+
+class Evaluator:
+    """Running batches of multiplier rows on a process pool, appending them to evaluations.csv."""
+
+    def __init__(self, model_dir, factors, vessels, metrics, out, periods=3, workers=None):
+        self.factors = factors
+        self.outputs = output_names(vessels, metrics)
+        self.path = os.path.join(out, "evaluations.csv")
+        self.workers = workers or os.cpu_count() or 1
+        self.runs = 0
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                        initargs=(model_dir, factors, vessels, metrics, periods))
+
+    def __call__(self, x, design):
+        t0 = time.time()
+        chunk = max(1, len(x) // (4 * self.workers))
+        y = np.array(list(self.pool.map(_evaluate, x, chunksize=chunk)), dtype=float)
+        df = pd.DataFrame(x, columns=[f["name"] for f in self.factors])
+        df.insert(0, "design", design)
+        df[self.outputs] = y
+        df.to_csv(self.path, mode="a", header=not os.path.exists(self.path), index=False)
+        self.runs += len(x)
+        failed = int(np.isnan(y).any(axis=1).sum())
+        if len(x) > 1 and np.all(np.nanstd(y, axis=0) == 0.):
+            print("!!!WARNING!!! no output changes with the factors, are the outlet models connected in main.csv?")
+        print(f"  {len(x)} runs in {time.time() - t0:.0f} s ({self.runs} total, {failed} failed)", flush=True)
+        return y
+
+    def close(self):
+        self.pool.shutdown()
+
+
+def _widest(conf):
+    # outputs without variance have no intervals, inf when no output has one
+    conf = conf[np.isfinite(conf)]
+    return conf.max() if len(conf) else np.inf
+
+
+# ---------------------------------------------------------------- morris
+def morris_trajectories(r, d, levels, rng):
+    """r one-at-a-time trajectories of d+1 points on a grid of levels, with the step sizes (r, d)."""
+    delta = levels / (2. * (levels - 1))
+    u = np.empty((r, d + 1, d))
+    steps = np.empty((r, d))
+    for t in range(r):
+        x = rng.integers(0, levels, d) / (levels - 1.)
+        order = rng.permutation(d)
+        u[t, 0] = x
+        for n, i in enumerate(order):
+            x = x.copy()
+            s = delta if x[i] + delta <= 1. else -delta
+            x[i] += s
+            steps[t, i] = s
+            u[t, n + 1] = x
+    return u, steps
+
+
+def elementary_effects(u, steps, y):
+    """Elementary effects (r, d, outputs) of the trajectories u with outputs y (r, d+1, outputs)."""
+    r, n, d = u.shape
+    ee = np.empty((r, d, y.shape[2]))
+    for t in range(r):
+        changed = np.argmax(np.abs(np.diff(u[t], axis=0)) > 0, axis=1)  # factor moved at every step
+        dy = np.diff(y[t], axis=0)
+        ee[t, changed] = dy / steps[t, changed][:, None]
+    return ee
+
+
+def morris_indices(ee, rng, n_boot=200):
+    """mu, mu_star, sigma (d, outputs) and the 95% interval half width of mu_star."""
+    ok = ~np.isnan(ee).any(axis=(1, 2))
+    ee = ee[ok]
+    mu_star = np.abs(ee).mean(axis=0)
+    boot = np.array([np.abs(ee[rng.integers(0, len(ee), len(ee))]).mean(axis=0) for _ in range(n_boot)])
+    return ee.mean(axis=0), mu_star, ee.std(axis=0, ddof=1), 1.96 * boot.std(axis=0)
+
+
+def run_morris(evaluate, factors, outputs, out, r_batch=10, r_max=200, tol=.1, levels=4, seed=None):
+    """Adding trajectories until the mu_star interval of every output is below tol * its largest mu_star."""
+    rng = np.random.default_rng(seed)
+    d = len(factors)
+    us, steps, ys = [], [], []
+    conv = []
+    while sum(len(u) for u in us) < r_max:
+        r = min(r_batch, r_max - sum(len(u) for u in us))
+        u, s = morris_trajectories(r, d, levels, rng)
+        print(f"morris: {r} trajectories ({r * (d + 1)} runs)", flush=True)
+        y = evaluate(to_multipliers(u.reshape(-1, d), factors), "morris")
+        us.append(u)
+        steps.append(s)
+        ys.append(y.reshape(r, d + 1, -1))
+        ee = elementary_effects(np.concatenate(us), np.concatenate(steps), np.concatenate(ys))
+        mu, mu_star, sigma, conf = morris_indices(ee, rng)
+        width = _widest(conf / np.where(mu_star.max(axis=0) > 0, mu_star.max(axis=0), np.nan))
+        conv.append(dict(trajectories=len(ee), runs=len(ee) * (d + 1), relative_conf=width))
+        print(f"  widest mu_star interval: {width:.3f} of the largest mu_star (tolerance {tol})")
+        if len(ee) > 1 and width < tol:
+            break
+
+    pd.DataFrame(conv).to_csv(os.path.join(out, "convergence.csv"), index=False)
+    rows = []
+    for o, name in enumerate(outputs):
+        for j, f in enumerate(factors):
+            rows.append(dict(output=name, factor=f["name"], mu=mu[j, o], mu_star=mu_star[j, o],
+                             sigma=sigma[j, o], mu_star_conf=conf[j, o]))
+    df = pd.DataFrame(rows).sort_values(["output", "mu_star"], ascending=[True, False])
+    df.to_csv(os.path.join(out, "morris.csv"), index=False)
+    return df
+
+
+# ---------------------------------------------------------------- sobol
+def sobol_indices(fA, fB, fAB):
+    """First order (Saltelli 2010) and total (Jansen) indices (d, outputs) from f(A), f(B), f(A_B^i)."""
+    var = np.var(np.concatenate([fA, fB]), axis=0)
+    var = np.where(var > 0, var, np.nan)  # constant outputs have no indices
+    s1 = np.mean(fB * (fAB - fA), axis=1) / var
+    st = .5 * np.mean((fA - fAB) ** 2, axis=1) / var
+    return s1, st
+
+
+def sobol_bootstrap(fA, fB, fAB, rng, n_boot=200):
+    s1, st = sobol_indices(fA, fB, fAB)
+    b1, bt = [], []
+    n = len(fA)
+    for _ in range(n_boot):
+        i = rng.integers(0, n, n)
+        a, b = sobol_indices(fA[i], fB[i], fAB[:, i])
+        b1.append(a)
+        bt.append(b)
+    return s1, 1.96 * np.std(b1, axis=0), st, 1.96 * np.std(bt, axis=0)
+
+
+def run_sobol(evaluate, factors, outputs, out, n_start=32, n_max=4096, tol=.05, seed=None):
+    """Doubling the base sample until every S1 and ST interval half width is below tol."""
+    from scipy.stats import qmc
+
+    rng = np.random.default_rng(seed)
+    d = len(factors)
+    sampler = qmc.Sobol(2 * d, scramble=True, seed=seed)
+    fA, fB, fAB = np.empty((0, len(outputs))), np.empty((0, len(outputs))), np.empty((d, 0, len(outputs)))
+    conv = []
+    n = n_start
+    while len(fA) < n_max:
+        # drawing as many base points as there are, the sequence stays balanced at powers of 2
+        u = sampler.random(n)
+        A, B = u[:, :d], u[:, d:]
+        AB = np.repeat(A[None], d, axis=0)
+        for i in range(d):
+            AB[i, :, i] = B[:, i]
+        print(f"sobol: {n} more base samples ({n * (d + 2)} runs)", flush=True)
+        y = evaluate(to_multipliers(np.concatenate([A, B, AB.reshape(-1, d)]), factors), "sobol")
+        ok = ~np.isnan(y[:n]).any(axis=1) & ~np.isnan(y[n:2 * n]).any(axis=1)
+        yAB = y[2 * n:].reshape(d, n, -1)
+        ok &= ~np.isnan(yAB).any(axis=(0, 2))  # a base point is dropped with all its runs
+        fA = np.concatenate([fA, y[:n][ok]])
+        fB = np.concatenate([fB, y[n:2 * n][ok]])
+        fAB = np.concatenate([fAB, yAB[:, ok]], axis=1)
+
+        s1, s1_conf, st, st_conf = sobol_bootstrap(fA, fB, fAB, rng)
+        width = _widest(np.maximum(s1_conf, st_conf))
+        conv.append(dict(base_samples=len(fA), runs=len(fA) * (d + 2), max_conf=width))
+        print(f"  widest interval: {width:.3f} (tolerance {tol})")
+        if width < tol:
+            break
+        n = sampler.num_generated
+
+    pd.DataFrame(conv).to_csv(os.path.join(out, "convergence.csv"), index=False)
+    rows = []
+    for o, name in enumerate(outputs):
+        for j, f in enumerate(factors):
+            rows.append(dict(output=name, factor=f["name"], S1=s1[j, o], S1_conf=s1_conf[j, o],
+                             ST=st[j, o], ST_conf=st_conf[j, o]))
+    df = pd.DataFrame(rows).sort_values(["output", "ST"], ascending=[True, False])
+    df.to_csv(os.path.join(out, "sobol.csv"), index=False)
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Morris screening and Sobol indices of the Circle of Willis "
+                                                 "boundary parameters.")
+    parser.add_argument("method", choices=["morris", "sobol"])
+    parser.add_argument("model", help="model folder, e.g. ../models/cow_runV21")
+    parser.add_argument("--out", default="sensitivity", help="output folder (default: sensitivity)")
+    parser.add_argument("--workers", type=int, default=None, help="parallel runs (default: number of cores)")
+    parser.add_argument("--periods", type=int, default=3, help="periods run from the initial state (default: 3)")
+    parser.add_argument("--outlets", default="out_*", help="lumped outlet models (default: out_*)")
+    parser.add_argument("--wk-edges", nargs="+", default=WK_EDGES,
+                        help="edges of the outlet models varied (default: R_prox R_dist C_wk)")
+    parser.add_argument("--wk-range", type=float, nargs=2, default=[.5, 2.], help="multipliers of R_prox, R_dist, C")
+    parser.add_argument("--k-range", type=float, nargs=2, default=[.8, 1.2], help="multipliers of k1, k2, k3")
+    parser.add_argument("--no-material", action="store_true", help="leave out k1, k2, k3")
+    parser.add_argument("--vessels", nargs="+", default=sum(COW_OUTPUTS.values(), []), help="output vessels")
+    parser.add_argument("--metrics", nargs="+", default=["p_mean", "q_mean"], help="p_mean, p_sys, q_mean, ...")
+    parser.add_argument("--tol", type=float, default=None,
+                        help="sobol: widest index interval (default 0.05), morris: relative to mu_star (default 0.1)")
+    parser.add_argument("--batch", type=int, default=None,
+                        help="morris: trajectories per batch (default 10), sobol: first base sample (default 32)")
+    parser.add_argument("--max", type=int, default=None,
+                        help="morris: trajectories (default 200), sobol: base samples (default 4096)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    from first_blood import FirstBlood
+
+    os.makedirs(args.out, exist_ok=True)
+    if os.path.exists(os.path.join(args.out, "evaluations.csv")):
+        os.remove(os.path.join(args.out, "evaluations.csv"))
+    model = warm_start(args.model, os.path.join(args.out, "model"))
+    with FirstBlood(model) as fb:
+        factors = cow_factors(fb, args.outlets, args.wk_range, args.k_range, material=not args.no_material,
+                              wk_edges=args.wk_edges)
+        if not args.no_material and fb.material_type == 0:
+            print("!!!WARNING!!! material is linear in main.csv, k1, k2, k3 have no effect")
+    if not factors:
+        parser.error(f"no factors, no lumped model matches {args.outlets}")
+    outputs = output_names(args.vessels, args.metrics)
+    print(f"{len(factors)} factors, {len(outputs)} outputs")
+
+    evaluate = Evaluator(model, factors, args.vessels, args.metrics, args.out, args.periods, args.workers)
+    try:
+        if args.method == "morris":
+            df = run_morris(evaluate, factors, outputs, args.out, args.batch or 10, args.max or 200,
+                            args.tol or .1, seed=args.seed)
+            print(df.groupby("output").head(3).to_string(index=False))
+        else:
+            df = run_sobol(evaluate, factors, outputs, args.out, args.batch or 32, args.max or 4096,
+                           args.tol or .05, seed=args.seed)
+            print(df.groupby("output").head(3).to_string(index=False))
+    finally:
+        evaluate.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
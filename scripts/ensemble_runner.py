@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Parallel, resumable runner of first_blood drivers, e.g. run_vp.out 0..999.
+#
+# Every run gets its own working directory so that the cwd-relative results/
+# folders of save_results do not collide:
+#   <root>/runs/<item>/        cwd of the run, with links to the input files
+#   <root>/<up link>           e.g. models -> <launch dir>/../../models, so the
+#                              "../../models/" of the drivers resolves from runs/<item>
+#   <root>/results/<case>      results of the finished runs, moved out of runs/<item>
+#   <root>/logs/<item>.log     stdout and stderr of the run
+#   <root>/ensemble.log        one line per finished run
+#   <root>/ledger.jsonl        one json line per finished run, a re-launch skips
+#                              the items whose last entry is "ok"
+LEDGER_FILE = "ledger.jsonl"
+LOG_FILE = "ensemble.log"
+
+
+def read_ledger(root):
+    """{item: last ledger entry} of an ensemble folder."""
+    path = os.path.join(root, LEDGER_FILE)
+    out = {}
+    if not os.path.exists(path):
+        return out
+    with open(path) as f:
+        for line in f:
+            try:
+                e = json.loads(line)
+            except ValueError:
+                continue  # torn last line of a killed runner
+            out[str(e["item"])] = e
+    return out
+
+
+def parse_items(text):
+    """'0-999' (end exclusive like range), '3,7,10-12' or a file with one item per line."""
+    if os.path.isfile(text):
+        with open(text) as f:
+            return [l.strip() for l in f if l.strip()]
+    items = []
+    for part in text.split(","):
+        if "-" in part:
+            a, b = part.split("-")
+            items += [str(i) for i in range(int(a), int(b))]
+        elif part:
+            items.append(part)
+    return items
+
+
+def _link(src, dst):
+    if os.path.lexists(dst):
+        return
+    try:
+        os.symlink(os.path.abspath(src), dst)
+    except FileExistsError:
+        pass  # made by another runner on the same folder in the meantime
+
+
+class EnsembleRunner:
+    def __init__(self, command, root="ensemble", workers=None, timeout=None, links=(), up_links=("models",),
+                 keep=False, launch_dir=None):
+        self.launch_dir = os.path.abspath(launch_dir or os.getcwd())
+        # the executable is resolved from the launch directory, the runs start elsewhere
+        exe = os.path.join(self.launch_dir, command[0])
+        self.command = [exe if os.path.exists(exe) else command[0]] + list(command[1:])
+        self.root = os.path.abspath(root)
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.links = list(links)
+        self.up_links = list(up_links)
+        self.keep = keep
+        self._lock = threading.Lock()
+
+        for d in ("runs", "results", "logs"):
+            os.makedirs(os.path.join(self.root, d), exist_ok=True)
+        for name in self.up_links:
+            src = os.path.join(self.launch_dir, "..", "..", name)
+            if os.path.exists(src):
+                _link(src, os.path.join(self.root, name))
+
+    # ---------------------------------------------------------------- one run
+    def _record(self, entry):
+        with self._lock:
+            with open(os.path.join(self.root, LEDGER_FILE), "a") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            with open(os.path.join(self.root, LOG_FILE), "a") as f:
+                f.write(f"{entry['finished']} {entry['item']:>8} {entry['status']:<8} rc={entry['returncode']} "
+                        f"{entry['seconds']:.1f}s\n")
+
+    def _collect(self, cwd):
+        """Moving results/<case> of a finished run to <root>/results/<case>."""
+        src = os.path.join(cwd, "results")
+        cases = []
+        if not os.path.isdir(src):
+            return cases
+        for e in os.scandir(src):
+            dst = os.path.join(self.root, "results", e.name)
+            if os.path.isdir(dst):
+                shutil.rmtree(dst)
+            elif os.path.exists(dst):
+                os.remove(dst)
+            shutil.move(e.path, dst)
+            cases.append(e.name)
+        return cases
+
+    def run_one(self, item, name=None):
+        """Running the command for item in runs/<name>, name defaults to the item."""
+        item = str(item)
+        name = str(name or item)
+        cwd = os.path.join(self.root, "runs", name)
+        if os.path.isdir(cwd):
+            shutil.rmtree(cwd)  # leftovers of a killed or failed run
+        os.makedirs(cwd)
+        for link in self.links:
+            _link(os.path.join(self.launch_dir, link), os.path.join(cwd, os.path.basename(link)))
+
+        cmd = [a.replace("{i}", item) for a in self.command]
+        log_path = os.path.join(self.root, "logs", name + ".log")
+        t0 = time.time()
+        with open(log_path, "w") as log:
+            try:
+                proc = subprocess.run(cmd, cwd=cwd, stdout=log, stderr=subprocess.STDOUT, timeout=self.timeout)
+                rc = proc.returncode
+                status = "ok" if rc == 0 else "failed"
+            except subprocess.TimeoutExpired:
+                rc = None
+                status = "timeout"
+            except OSError as e:
+                log.write(f"\n{e}\n")
+                rc = None
+                status = "failed"
+
+        cases = self._collect(cwd) if status == "ok" else []
+        if status == "ok" and not self.keep:
+            shutil.rmtree(cwd, ignore_errors=True)
+
+        entry = {
+            "item": name,
+            "status": status,
+            "returncode": rc,
+            "seconds": time.time() - t0,
+            "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "host": socket.gethostname(),
+            "cases": cases,
+            "log": os.path.relpath(log_path, self.root),
+        }
+        self._record(entry)
+        return entry
+
+    # ---------------------------------------------------------------- ensemble
+    def pending(self, items, retry_failed=True):
+        done = read_ledger(self.root)
+        out = []
+        for i in items:
+            e = done.get(str(i))
+            if e is None or (retry_failed and e["status"] != "ok"):
+                out.append(str(i))
+        return out
+
+    def run(self, items, retry_failed=True, verbose=True):
+        """Running the pending items on the worker pool; returns {status: count} of this launch."""
+        todo = self.pending(items, retry_failed)
+        if verbose:
+            print(f"{len(items) - len(todo)} of {len(items)} already finished, running {len(todo)} "
+                  f"on {self.workers} workers")
+        counts = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.run_one, i): i for i in todo}
+            for n, fut in enumerate(as_completed(futures), 1):
+                e = fut.result()
+                counts[e["status"]] = counts.get(e["status"], 0) + 1
+                if verbose:
+                    print(f"[{n}/{len(todo)}] {e['item']}: {e['status']} ({e['seconds']:.1f} s)", flush=True)
+        return counts
+
+
+def run_ensemble(command, items, root="ensemble", **kwargs):
+    retry_failed = kwargs.pop("retry_failed", True)
+    return EnsembleRunner(command, root, **kwargs).run(items, retry_failed)
+
+
+def status(root, items=None):
+    """{status: count} of the ledger, with "pending" for the items not run yet."""
+    done = read_ledger(root)
+    counts = {}
+    for e in done.values():
+        counts[e["status"]] = counts.get(e["status"], 0) + 1
+    if items is not None:
+        counts["pending"] = sum(1 for i in items if str(i) not in done)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run a first_blood driver for many items in parallel, each in its own working directory.",
+        epilog="example: python ensemble_runner.py --items 0-1000 --link VPD.csv -- ./run_vp.out {i}",
+    )
+    parser.add_argument("command", nargs="*", help="driver and its arguments, {i} is replaced by the item")
+    parser.add_argument("--items", required=True, help="'0-1000' (end exclusive), '1,5,7' or a file with one item per line")
+    parser.add_argument("--root", default="ensemble", help="ensemble folder (default: ensemble)")
+    parser.add_argument("--workers", type=int, default=None, help="parallel runs (default: number of cores)")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds before a run is killed")
+    parser.add_argument("--link", action="append", default=[], help="input file of the launch dir linked into every run dir")
+    parser.add_argument("--up-link", action="append", default=None,
+                        help="folder of ../../ linked into the ensemble folder (default: models)")
+    parser.add_argument("--keep", action="store_true", help="keep the run dirs of successful runs")
+    parser.add_argument("--no-retry", action="store_true", help="do not rerun failed or timed out items")
+    parser.add_argument("--status", action="store_true", help="only print the state of the ledger")
+    args = parser.parse_args(argv)
+
+    items = parse_items(args.items)
+    if args.status:
+        for k, v in sorted(status(args.root, items).items()):
+            print(f"{k}: {v}")
+        return 0
+    if not args.command:
+        parser.error("no command given")
+
+    runner = EnsembleRunner(args.command, args.root, args.workers, args.timeout, args.link,
+                            args.up_link if args.up_link is not None else ["models"], args.keep)
+    counts = runner.run(items, retry_failed=not args.no_retry)
+    print(", ".join(f"{k}: {v}" for k, v in sorted(counts.items())) or "nothing to run")
+    return 0 if set(counts) <= {"ok"} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
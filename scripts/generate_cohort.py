@@ -0,0 +1,205 @@
+import os
+import re
+import sys
+import glob
+import time
+import shutil
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "analysis"))
+from model_overlay import make_delta, base_path
+
+# Patient-specific models for a whole cohort of data_patient<ID>/ folders
+# (feature_mr_<ID>.json, variant_mr_<ID>.json, nodes_mr_<ID>.json).
+#
+#   python generate_cohort.py --generator V23 --workers 16
+#
+# The generators build one model per patient on a process pool:
+#   V23   Abel_ref2 with the CoW geometry of the patient (V23_generate.py)
+#   V21   generated body and patient CoW with outlet Windkessels (V21_generate.py)
+# Only arterial.csv differs between the patients. Every other file is taken
+# from the base folder (Abel_ref2 for V23, <out>/_base_V21 written once for
+# V21) as a hard link (or symlink, or copy with --link). Tools that change a
+# model file in place must replace it (write a new file and os.replace it)
+# instead of writing into it, or the base and every model sharing it change.
+# With --link overlay a model is only a main.csv naming the base folder and the
+# changed arterial.csv rows (model_overlay.py).
+#   <out>/<prefix>_<ID>/                 the model of patient ID
+#   <out>/generation_<prefix>.csv        patient, model, status, seconds, error
+# A failing patient is recorded with its error, the rest of the cohort is built.
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+PATIENT_FILES = ["feature_mr_{}.json", "variant_mr_{}.json"]
+# files written per patient, everything else is linked from the base folder
+PATIENT_SPECIFIC = ["arterial.csv"]
+
+
+def discover(data_root=ROOT, pattern="data_patient*", patients=None):
+    """{ID: folder} of the patient folders under data_root, only the IDs in patients if given."""
+    out = {}
+    for d in sorted(glob.glob(os.path.join(data_root, pattern))):
+        m = re.match(r"data_patient(.+)$", os.path.basename(d))
+        if not os.path.isdir(d) or m is None:
+            continue
+        if patients is None or m.group(1) in patients:
+            out[m.group(1)] = d
+    return out
+
+
+def link_file(src, dst, link="hard"):
+    """dst as a hard link / symlink / copy of src, a copy if hard links are not possible (other filesystem)."""
+    if link == "symlink":
+        os.symlink(os.path.abspath(src), dst)
+        return "symlink"
+    if link == "hard":
+        try:
+            os.link(src, dst)
+            return "hard"
+        except OSError:
+            pass
+    shutil.copy2(src, dst)
+    return "copy"
+
+
+def link_base(base_dir, out_dir, link="hard", skip=PATIENT_SPECIFIC):
+    """A fresh out_dir with every file of base_dir but skip linked, the number of links and copies."""
+    if os.path.lexists(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+    if link == "overlay":
+        with open(os.path.join(out_dir, "main.csv"), "w") as f:
+            f.write(f"base,{base_path(base_dir, out_dir)}\n")
+        return {"overlay": 1}
+    counts = {}
+    for name in sorted(os.listdir(base_dir)):
+        src = os.path.join(base_dir, name)
+        if name in skip or not os.path.isfile(src):
+            continue
+        kind = link_file(src, os.path.join(out_dir, name), link)
+        counts[kind] = counts.get(kind, 0) + 1
+    return counts
+
+
+# ---------------------------------------------------------------- generators
+V21_OUTLETS = ["out_rmca", "out_lmca", "out_rp2", "out_lp2", "out_ra2", "out_la2"]
+
+
+def base_V23(out_root):
+    import V23_generate
+    return V23_generate.BASE_DIR
+
+
+def build_V23(patient_id, patient_dir, base_dir, out_dir):
+    import V23_generate
+    V23_generate.set_patient(patient_dir, patient_id)
+    V23_generate.modify_arterial(out_dir, base_dir)
+
+
+def base_V21(out_root):
+    """Patient-independent files of V21_generate.py, written once per batch."""
+    import V21_generate
+    base_dir = os.path.join(out_root, "_base_V21")
+    os.makedirs(base_dir, exist_ok=True)
+    V21_generate.generate_main(V21_OUTLETS, os.path.join(base_dir, "main.csv"))
+    V21_generate.write_calibrated_heart(base_dir)
+    V21_generate.generate_windkessel_files(V21_OUTLETS, base_dir)
+    return base_dir
+
+
+def build_V21(patient_id, patient_dir, base_dir, out_dir):
+    import V21_generate
+    V21_generate.set_patient(patient_dir, patient_id)
+    outlets = V21_generate.generate_arterial(os.path.join(out_dir, "arterial.csv"))
+    if outlets != V21_OUTLETS:
+        raise RuntimeError(f"outlets {outlets} differ from the base files {V21_OUTLETS}")
+
+
+GENERATORS = {
+    "V23": (base_V23, build_V23, "cow_runV23"),
+    "V21": (base_V21, build_V21, "cow_runV21"),
+}
+
+
+def build_patient(generator, patient_id, patient_dir, base_dir, out_dir, link="hard"):
+    """Building one model, a report row; exceptions are caught and reported."""
+    t0 = time.time()
+    row = {"patient": patient_id, "model": os.path.basename(out_dir), "status": "ok", "error": ""}
+    try:
+        missing = [f.format(patient_id) for f in PATIENT_FILES
+                   if not os.path.exists(os.path.join(patient_dir, f.format(patient_id)))]
+        if missing:
+            raise FileNotFoundError(f"missing {', '.join(missing)}")
+        counts = link_base(base_dir, out_dir, link)
+        GENERATORS[generator][1](patient_id, patient_dir, base_dir, out_dir)
+        if link == "overlay":
+            # the generated arterial.csv overrides every base row, only the changed ones are kept
+            make_delta(out_dir, base_dir, out_dir)
+        row.update({f"{k}_files": v for k, v in counts.items()})
+    except Exception as e:
+        row["status"] = "failed"
+        row["error"] = f"{type(e).__name__}: {e}"
+        row["traceback"] = traceback.format_exc()
+        shutil.rmtree(out_dir, ignore_errors=True)
+    row["seconds"] = time.time() - t0
+    return row
+
+
+def generate_cohort(generator="V23", data_root=ROOT, out_root=None, prefix=None, patients=None, workers=None,
+                    link="hard", verbose=True):
+    """Building the models of every patient folder, the report as a DataFrame."""
+    base, _, default_prefix = GENERATORS[generator]
+    out_root = out_root or os.path.join(ROOT, "models")
+    prefix = prefix or default_prefix
+    os.makedirs(out_root, exist_ok=True)
+    found = discover(data_root, patients=patients)
+    if not found:
+        raise RuntimeError(f"no data_patient* folder in {data_root}")
+    base_dir = base(out_root)
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(build_patient, generator, pid, d, base_dir,
+                               os.path.join(out_root, f"{prefix}_{pid}"), link) for pid, d in found.items()]
+        for f in as_completed(futures):
+            row = f.result()
+            rows.append(row)
+            if verbose:
+                print(f"[{len(rows)}/{len(futures)}] {row['patient']}: {row['status']} {row['error']}", flush=True)
+
+    report = pd.DataFrame(rows).sort_values("patient")
+    report.drop(columns="traceback", errors="ignore").to_csv(
+        os.path.join(out_root, f"generation_{prefix}.csv"), index=False)
+    failed = report[report["status"] != "ok"]
+    if len(failed) and "traceback" in failed:
+        with open(os.path.join(out_root, f"generation_{prefix}.log"), "w") as f:
+            for _, r in failed.iterrows():
+                f.write(f"--- {r['patient']}\n{r['traceback']}\n")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate patient-specific models for every data_patient* folder.")
+    parser.add_argument("--generator", default="V23", choices=sorted(GENERATORS), help="(default: V23)")
+    parser.add_argument("--data", default=ROOT, help="folder of the data_patient* folders (default: repository root)")
+    parser.add_argument("--out", default=os.path.join(ROOT, "models"), help="output folder (default: models)")
+    parser.add_argument("--prefix", help="model name prefix (default: cow_runV23 / cow_runV21)")
+    parser.add_argument("--patients", help="comma separated IDs, e.g. 025,031 (default: every folder)")
+    parser.add_argument("--workers", type=int, default=None, help="parallel builds (default: number of cores)")
+    parser.add_argument("--link", default="hard", choices=["hard", "symlink", "copy", "overlay"],
+                        help="how the unchanged base files are placed, overlay: not at all, "
+                             "main.csv names the base (default: hard)")
+    args = parser.parse_args(argv)
+
+    patients = args.patients.split(",") if args.patients else None
+    report = generate_cohort(args.generator, args.data, args.out, args.prefix, patients, args.workers, args.link)
+    n_failed = int((report["status"] != "ok").sum())
+    print(f"{len(report) - n_failed} models built, {n_failed} failed, report: "
+          f"{os.path.join(args.out, 'generation_' + (args.prefix or GENERATORS[args.generator][2]) + '.csv')}")
+    return 0 if n_failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,398 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+
+from ensemble_runner import EnsembleRunner, parse_items
+
+# Job queue of first_blood runs on a shared filesystem, for a few nodes without
+# a scheduler. Every node starts a worker on the same queue folder:
+#
+#   python job_queue.py submit --queue /shared/q --items 0-1000 --link VPD.csv -- ./run_vp.out {i}
+#   python job_queue.py work --queue /shared/q --slots 16        (on every node)
+#   python job_queue.py status --queue /shared/q --watch 10
+#
+# A job is one json file moving between the state folders; a worker claims a
+# job by renaming it from pending/ to claimed/, which only one worker can do.
+# Jobs run like the items of ensemble_runner.py (own working directory, results
+# moved to <queue>/results/), so the launch directory and the models must be
+# on the shared filesystem under the same path on every node.
+#   <queue>/jobs/pending|claimed|done|failed/<job>.json   spec, attempts and history
+#   <queue>/workers/<host>-<pid>.json    heartbeat: time, running jobs, counts
+#   <queue>/runs/<job>/  <queue>/results/<case>/  <queue>/logs/<job>.log
+#   <queue>/ledger.jsonl  <queue>/ensemble.log   as in ensemble_runner.py
+# A claimed job whose worker has not beaten for --stale seconds (crashed or
+# powered off node) goes back to pending; a failed, timed out or stale run is
+# retried up to the retries of the job, then moved to failed/.
+STATES = ["pending", "claimed", "done", "failed"]
+HEARTBEAT = 30.
+STALE = 300.
+
+
+def _write_json(path, data):
+    """Writing through a temporary file, readers never see a half written file."""
+    tmp = f"{path}.{socket.gethostname()}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+class JobQueue:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        for state in STATES:
+            os.makedirs(os.path.join(self.root, "jobs", state), exist_ok=True)
+        os.makedirs(os.path.join(self.root, "workers"), exist_ok=True)
+
+    def path(self, state, job):
+        return os.path.join(self.root, "jobs", state, job + ".json")
+
+    def jobs(self, state):
+        return sorted(f[:-5] for f in os.listdir(os.path.join(self.root, "jobs", state)) if f.endswith(".json"))
+
+    def state_of(self, job):
+        return next((s for s in STATES if os.path.exists(self.path(s, job))), None)
+
+    def read(self, state, job):
+        return _read_json(self.path(state, job))
+
+    # ---------------------------------------------------------------- submitting
+    def submit(self, command, items, name=None, links=(), up_links=("models",), timeout=None, retries=2,
+               launch_dir=None, force=False):
+        """Adding one pending job per item, <name>-<item>; jobs already in the queue are skipped unless force."""
+        launch_dir = os.path.abspath(launch_dir or os.getcwd())
+        name = name or os.path.splitext(os.path.basename(command[0]))[0]
+        added = 0
+        for item in items:
+            job = f"{name}-{item}"
+            state = self.state_of(job)
+            if state is not None and not (force and state in ("done", "failed")):
+                continue
+            if state is not None:
+                os.remove(self.path(state, job))
+            _write_json(self.path("pending", job), {
+                "job": job,
+                "item": str(item),
+                "command": list(command),
+                "launch_dir": launch_dir,
+                "links": list(links),
+                "up_links": list(up_links),
+                "timeout": timeout,
+                "retries": retries,
+                "attempts": 0,
+                "submitted": time.time(),
+                "history": [],
+            })
+            added += 1
+        return added
+
+    def retry(self, jobs=None):
+        """Failed jobs (all or the given ones) back to pending with their attempts reset."""
+        n = 0
+        for job in jobs or self.jobs("failed"):
+            try:
+                spec = self.read("failed", job)
+            except FileNotFoundError:
+                continue
+            spec["attempts"] = 0
+            _write_json(self.path("pending", job), spec)
+            os.remove(self.path("failed", job))
+            n += 1
+        return n
+
+    # ---------------------------------------------------------------- claiming
+    def claim(self, worker):
+        """The spec of the first pending job this worker could rename to claimed/, None if there is none."""
+        for job in self.jobs("pending"):
+            try:
+                os.rename(self.path("pending", job), self.path("claimed", job))
+            except OSError:
+                continue  # claimed by another worker first
+            spec = self.read("claimed", job)
+            spec.update(worker=worker, claimed=time.time())
+            _write_json(self.path("claimed", job), spec)
+            return spec
+        return None
+
+    def _requeue(self, spec, src, event):
+        """Moving a job of src (a path) to pending, or to failed if it has no retries left."""
+        spec["attempts"] = spec.get("attempts", 0) + 1
+        spec["history"].append(event)
+        spec.pop("worker", None)
+        spec.pop("claimed", None)
+        state = "pending" if spec["attempts"] <= spec.get("retries", 0) else "failed"
+        _write_json(self.path(state, spec["job"]), spec)
+        if os.path.exists(src):
+            os.remove(src)
+        return state
+
+    def finish(self, spec, entry, worker):
+        """Recording the ensemble_runner entry of a finished run, the new state of the job."""
+        event = {k: entry.get(k) for k in ("status", "returncode", "seconds", "finished", "cases", "log")}
+        event["worker"] = worker
+        src = self.path("claimed", spec["job"])
+        if entry["status"] == "ok":
+            spec["history"].append(event)
+            _write_json(self.path("done", spec["job"]), spec)
+            for p in (src, self.path("pending", spec["job"])):  # pending if it was reclaimed meanwhile
+                if os.path.exists(p):
+                    os.remove(p)
+            return "done"
+        return self._requeue(spec, src, event)
+
+    # ---------------------------------------------------------------- workers
+    def workers(self):
+        """{worker: last heartbeat} of the workers/ folder."""
+        out = {}
+        folder = os.path.join(self.root, "workers")
+        for f in os.listdir(folder):
+            if f.endswith(".json"):
+                try:
+                    out[f[:-5]] = _read_json(os.path.join(folder, f))
+                except (OSError, ValueError):
+                    pass
+        return out
+
+    def reclaim(self, stale=STALE, by="reclaim"):
+        """Claimed jobs whose worker has not beaten for stale seconds back to pending (or failed), their number."""
+        now = time.time()
+        beats = self.workers()
+        holding = set()
+        n = 0
+        for job in self.jobs("claimed"):
+            path = self.path("claimed", job)
+            try:
+                spec = _read_json(path)
+                last = beats.get(spec.get("worker"), {}).get("beat") or spec.get("claimed") or os.path.getmtime(path)
+            except (OSError, ValueError):
+                continue  # finished or being rewritten
+            if now - last < stale:
+                holding.add(spec.get("worker"))
+                continue
+            # only one of the reclaiming workers gets the file
+            mine = f"{path}.{by}"
+            try:
+                os.rename(path, mine)
+            except OSError:
+                continue
+            self._requeue(spec, mine, {"status": "stale", "worker": spec.get("worker"),
+                                       "finished": time.strftime("%Y-%m-%dT%H:%M:%S")})
+            n += 1
+        # heartbeat files of dead workers without jobs
+        for w, b in beats.items():
+            if w not in holding and now - b.get("beat", 0) > stale:
+                try:
+                    os.remove(os.path.join(self.root, "workers", w + ".json"))
+                except OSError:
+                    pass
+        return n
+
+    def counts(self):
+        return {s: len(self.jobs(s)) for s in STATES}
+
+
+class Worker:
+    def __init__(self, queue, slots=1, heartbeat=HEARTBEAT, stale=STALE, poll=10., wait=False, keep=False):
+        self.queue = queue
+        self.slots = slots
+        self.heartbeat = heartbeat
+        self.stale = stale
+        self.poll = poll
+        self.wait = wait
+        self.keep = keep
+        self.id = f"{socket.gethostname()}-{os.getpid()}"
+        self.running = {}
+        self.finished = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def beat(self):
+        with self._lock:
+            data = {"host": socket.gethostname(), "pid": os.getpid(), "slots": self.slots, "started": self.started,
+                    "beat": time.time(), "jobs": sorted(self.running), "finished": dict(self.finished)}
+        _write_json(os.path.join(self.queue.root, "workers", self.id + ".json"), data)
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.heartbeat):
+            self.beat()
+
+    def run_job(self, spec):
+        runner = EnsembleRunner(spec["command"], self.queue.root, 1, spec.get("timeout"), spec.get("links", []),
+                                spec.get("up_links", ["models"]), self.keep, spec["launch_dir"])
+        return runner.run_one(spec["item"], spec["job"])
+
+    def _slot(self, verbose):
+        while not self._stop.is_set():
+            self.queue.reclaim(self.stale, self.id)
+            spec = self.queue.claim(self.id)
+            if spec is None:
+                c = self.queue.counts()
+                if not self.wait and c["pending"] == 0 and c["claimed"] == 0:
+                    return
+                self._stop.wait(self.poll)
+                continue
+            with self._lock:
+                self.running[spec["job"]] = time.time()
+            self.beat()
+            entry = self.run_job(spec)
+            state = self.queue.finish(spec, entry, self.id)
+            with self._lock:
+                self.running.pop(spec["job"], None)
+                self.finished[state] = self.finished.get(state, 0) + 1
+            self.beat()
+            if verbose:
+                print(f"{spec['job']}: {entry['status']} ({entry['seconds']:.1f} s) -> {state}", flush=True)
+
+    def run(self, verbose=True):
+        """Running jobs on slots threads until the queue is empty (or forever with wait), {state: count}."""
+        self.beat()
+        beat = threading.Thread(target=self._heartbeat, daemon=True)
+        beat.start()
+        threads = [threading.Thread(target=self._slot, args=(verbose,), daemon=True) for _ in range(self.slots)]
+        for t in threads:
+            t.start()
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(1.)
+        finally:
+            # an interrupted worker stops beating, its claimed jobs are reclaimed after stale seconds
+            self._stop.set()
+            if all(not t.is_alive() for t in threads) and not self.running:
+                os.remove(os.path.join(self.queue.root, "workers", self.id + ".json"))
+        return dict(self.finished)
+
+
+def _age(seconds):
+    if seconds < 120:
+        return f"{seconds:.0f}s"
+    if seconds < 7200:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds / 3600:.1f}h"
+
+
+def dashboard(queue, stale=STALE, failed=5):
+    """Text status of the queue: job counts, workers with their heartbeat, throughput and the last failures."""
+    now = time.time()
+    c = queue.counts()
+    total = sum(c.values())
+    lines = [f"queue {queue.root}",
+             "jobs: " + ", ".join(f"{s} {c[s]}" for s in STATES) + f" (total {total})"]
+
+    recent, seconds = 0, []
+    for job in queue.jobs("done"):
+        try:
+            last = queue.read("done", job)["history"][-1]
+        except (OSError, ValueError, IndexError):
+            continue
+        seconds.append(last.get("seconds") or 0.)
+        if now - os.path.getmtime(queue.path("done", job)) < 3600:
+            recent += 1
+
+    alive_slots = 0
+    lines.append("workers:")
+    for w, b in sorted(queue.workers().items()):
+        age = now - b.get("beat", 0)
+        alive = age < stale
+        alive_slots += b.get("slots", 1) if alive else 0
+        fin = ", ".join(f"{k} {v}" for k, v in sorted(b.get("finished", {}).items())) or "-"
+        lines.append(f"  {w:<28} {'alive' if alive else 'STALE':<6} beat {_age(age)} ago, "
+                     f"{len(b.get('jobs', []))}/{b.get('slots', 1)} running, finished: {fin}")
+    if alive_slots == 0:
+        lines.append("  none alive")
+
+    if seconds:
+        mean = sum(seconds) / len(seconds)
+        left = c["pending"] + c["claimed"]
+        eta = f", eta {_age(left * mean / alive_slots)}" if alive_slots and left else ""
+        lines.append(f"throughput: {recent} done in the last hour, {mean:.1f} s per job{eta}")
+
+    names = queue.jobs("failed")[-failed:]
+    if names:
+        lines.append(f"failed (last {len(names)}):")
+        for job in names:
+            try:
+                h = queue.read("failed", job)["history"]
+            except (OSError, ValueError):
+                continue
+            last = h[-1] if h else {}
+            lines.append(f"  {job}: {last.get('status')} rc={last.get('returncode')} on {last.get('worker')}, "
+                         f"log {last.get('log')}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="File-based job queue of first_blood runs on a shared filesystem.")
+    sub = parser.add_subparsers(dest="command_name", required=True)
+
+    p = sub.add_parser("submit", help="add a job per item",
+                       epilog="example: python job_queue.py submit --queue q --items 0-1000 --link VPD.csv -- ./run_vp.out {i}")
+    p.add_argument("command", nargs="+", help="driver and its arguments, {i} is replaced by the item")
+    p.add_argument("--items", required=True, help="'0-1000' (end exclusive), '1,5,7' or a file with one item per line")
+    p.add_argument("--name", help="job name prefix (default: name of the driver)")
+    p.add_argument("--link", action="append", default=[], help="input file of the launch dir linked into every run dir")
+    p.add_argument("--up-link", action="append", default=None,
+                   help="folder of ../../ linked into the queue folder (default: models)")
+    p.add_argument("--timeout", type=float, default=None, help="seconds before a run is killed")
+    p.add_argument("--retries", type=int, default=2, help="reruns of a failed, timed out or stale job (default: 2)")
+    p.add_argument("--force", action="store_true", help="resubmit jobs that are already done or failed")
+
+    p = sub.add_parser("work", help="run jobs until the queue is empty")
+    p.add_argument("--slots", type=int, default=None, help="parallel runs on this node (default: number of cores)")
+    p.add_argument("--heartbeat", type=float, default=HEARTBEAT, help=f"seconds between heartbeats (default: {HEARTBEAT:.0f})")
+    p.add_argument("--poll", type=float, default=10., help="seconds between looks at an empty queue (default: 10)")
+    p.add_argument("--wait", action="store_true", help="keep waiting for new jobs when the queue is empty")
+    p.add_argument("--keep", action="store_true", help="keep the run dirs of successful runs")
+
+    p = sub.add_parser("status", help="print the state of the queue and its workers")
+    p.add_argument("--watch", type=float, default=None, help="refresh every WATCH seconds")
+
+    sub.add_parser("reclaim", help="requeue the jobs of stale workers now")
+    p = sub.add_parser("retry", help="failed jobs back to pending")
+    p.add_argument("jobs", nargs="*", help="job names (default: every failed job)")
+
+    for p in sub.choices.values():
+        p.add_argument("--queue", default="queue", help="queue folder on the shared filesystem (default: queue)")
+        p.add_argument("--stale", type=float, default=STALE,
+                       help=f"seconds without heartbeat before a worker's jobs are requeued (default: {STALE:.0f})")
+    args = parser.parse_args(argv)
+
+    queue = JobQueue(args.queue)
+    if args.command_name == "submit":
+        n = queue.submit(args.command, parse_items(args.items), args.name, args.link,
+                         args.up_link if args.up_link is not None else ["models"], args.timeout, args.retries,
+                         force=args.force)
+        print(f"{n} job(s) submitted to {queue.root}")
+    elif args.command_name == "work":
+        worker = Worker(queue, args.slots or os.cpu_count() or 1, args.heartbeat, args.stale, args.poll, args.wait,
+                        args.keep)
+        print(f"worker {worker.id} on {queue.root} with {worker.slots} slot(s)", flush=True)
+        counts = worker.run()
+        print(", ".join(f"{k}: {v}" for k, v in sorted(counts.items())) or "nothing to run")
+        return 0 if set(counts) <= {"done", "pending"} else 1
+    elif args.command_name == "status":
+        while True:
+            text = dashboard(queue, args.stale)
+            if args.watch is None:
+                print(text)
+                break
+            print("\033[2J\033[H" + time.strftime("%H:%M:%S ") + text, flush=True)
+            time.sleep(args.watch)
+    elif args.command_name == "reclaim":
+        print(f"{queue.reclaim(args.stale)} job(s) requeued")
+    else:
+        print(f"{queue.retry(args.jobs or None)} job(s) back to pending")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,447 @@
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "projects", "python"))
+
+# Parameter sweeps of first_blood models from a YAML/JSON spec.
+#
+#   model: ../models/Abel_ref2
+#   layout: run_vp              # region multipliers of run_vp.cpp or run_par.cpp
+#   sampler: lhs                # grid, lhs, sobol or list
+#   samples: 256
+#   seed: 1
+#   axes:
+#     diameter.brain: [0.8, 1.2]          # lhs/sobol: bounds, grid: values
+#     perif: {low: 0.5, high: 2., log: true}  # no region: every region of the group
+#     heart.E_max: [0.9, 1.1]
+#   vessels: {arterial: [A1, A5, A12]}
+#   periods: 1                  # metrics over the last periods
+#   settings: {time_end: 8.}    # FirstBlood settings before the run
+#
+# Every sample is a set of multipliers (1 where no axis is given) applied to
+# the loaded model in place, as the C++ drivers do, and run in a worker
+# process through first_blood.py. The results are
+#   <out>/samples.csv     run index and axis values of every sample
+#   <out>/runs*.csv       status and run time per run
+#   <out>/metrics*.csv    one row per run and vessel: axis values, pressure (mmHg)
+#                         and flow rate (ml/s) statistics over the last periods
+# where --shard a:b runs samples a..b-1 only and writes runs_a_b.csv and
+# metrics_a_b.csv, joined by the merge command.
+MMHG_TO_PA = 133.3616
+ATMOSPHERIC_PRESSURE = 1.e5
+
+# regions of run_vp.cpp
+VP_EDGES = {
+    "brain": ["A5", "A6", "A20", "A15", "A12", "A80", "A72", "A70", "A71", "A76", "A78", "A73", "A74", "A75", "A82",
+              "A102", "A16", "A56", "A57", "A58", "A59", "A60", "A64", "A61", "A65", "A62", "A63", "A81", "A79", "A66",
+              "A67", "A101", "A103", "A69", "A68", "A77", "A100"],
+    "face": ["A17", "A85", "A86", "A89", "A90", "A93", "A94", "A13", "A83", "A84", "A87", "A88", "A91", "A92"],
+    "hands": ["A3", "A4", "A7", "A8", "A9", "A10", "A11", "A19", "A21", "A22", "A23", "A24", "A25"],
+    "legs": ["A42", "A50", "A51", "A53", "A52", "A55", "A54", "A43", "A44", "A45", "A47", "A46", "A48", "A49"],
+    "spine": ["A27", "A29", "A30", "A31", "A32", "A33", "A28", "A34", "A35", "A36", "A37", "A38", "A39", "A40", "A41",
+              "A1", "A95", "A2", "A14", "A18", "A26"],
+    "coronary": ["A96", "A97", "A98", "A99"],
+}
+VP_NODES = {
+    "brain": ["n30", "n31", "n36", "n37", "n38", "n39", "n40", "n41", "n42", "n43", "n44", "n45", "n46", "n47", "n48",
+              "n49", "n50"],
+    "face": ["n26", "n27", "n28", "n29", "n32", "n33", "n34", "n35"],
+    "hands": ["n6", "n7", "n8", "n9", "n10", "n11", "n12"],
+    "legs": ["n14", "n15", "n16", "n17", "n18", "n19"],
+    "spine": ["n20", "n21", "n22", "n23", "n24", "n25", "n51", "n52", "n13"],
+    "coronary": ["n53"],
+}
+VP_PERIF = {
+    "brain": ["p29", "p30", "p31", "p32", "p33", "p34", "p35", "p36", "p37", "p38", "p39", "p40", "p45", "p46"],
+    "face": ["p25", "p26", "p27", "p28", "p41", "p42", "p43", "p44"],
+    "hands": ["p4", "p5", "p6", "p15", "p16", "p17"],
+    "legs": ["p7", "p8", "p9", "p10", "p11", "p12", "p13", "p14"],
+    "spine": ["p18", "p19", "p20", "p21", "p22", "p23", "p24", "p47"],
+}
+VP_CORONARY = ["p1", "p2", "p3"]
+VP_HEART = ["V_ra", "R", "E_max", "E_min", "R_p", "E_la", "heart_rate"]
+OLUFSEN_CONST = [2.e6, -2253., 8.65e4]
+
+# regions of run_par.cpp (A83 is listed twice in its brain edges, scaled once here)
+PAR_EDGES = {
+    "brain": ["A5", "A6", "A20", "A15", "A13", "A84", "A83", "A88", "A87", "A91", "A92", "A12", "A80", "A72", "A70",
+              "A71", "A76", "A78", "A73", "A74", "A75", "A82", "A102", "A16", "A17", "A85", "A86", "A89", "A90", "A94",
+              "A56", "A57", "A58", "A59", "A60", "A64", "A61", "A65", "A62", "A63", "A81", "A79", "A66", "A67", "A101",
+              "A103", "A69", "A68", "A77", "A100"],
+    "hands": VP_EDGES["hands"],
+    "legs": VP_EDGES["legs"],
+    "spine": VP_EDGES["spine"],
+}
+PAR_NODES = {
+    "brain": ["n%d" % i for i in range(26, 51)],
+    "hands": VP_NODES["hands"],
+    "legs": VP_NODES["legs"],
+    "spine": VP_NODES["spine"],
+}
+PAR_PERIF = {
+    "brain": ["p%d" % i for i in range(25, 47)],
+    "hands": VP_PERIF["hands"],
+    "legs": VP_PERIF["legs"],
+    "spine": VP_PERIF["spine"],
+}
+PAR_REGION_GROUPS = ["res_node", "res_perif_1", "res_perif_2", "cap_perif", "length", "diameter", "thickness",
+                     "elas_spring", "elas_voigt"]
+
+
+def _names(groups, regions):
+    return [f"{g}.{r}" for g in groups for r in regions]
+
+
+# multipliers of the layouts, in the order of the VPD.csv columns / run_par.cpp argv
+LAYOUT_FACTORS = {
+    "run_vp": (["cor.R", "cor.alpha", "cor.beta"] + [f"heart.{h}" for h in VP_HEART] + ["mat.k1", "mat.k2", "mat.k3"]
+               + _names(["perif"], VP_PERIF) + _names(["length", "diameter", "node_res"], VP_EDGES)),
+    "run_par": ["res_mitral", "res_aorta", "pres_atrium"] + _names(PAR_REGION_GROUPS, PAR_EDGES),
+}
+
+
+def _existing(fb, model, names):
+    # the region lists are written for Abel_ref2, other models may miss elements
+    out = []
+    for n in names:
+        try:
+            fb.kind(model, n)
+            out.append(n)
+        except KeyError:
+            pass
+    return out
+
+
+def apply_run_vp(fb, x):
+    """Multipliers x (name -> value) applied like run_vp.cpp."""
+    fb.heart_rate = 75.6 * x["heart.heart_rate"]
+    fb.time_period = 60. / fb.heart_rate
+    fb.is_periodic_run = True
+
+    lum = fb.models()["lum"]
+    for p in VP_CORONARY:
+        if p in lum:
+            fb.lum_parameter(p, "alpha_coronary", .5 * x["cor.alpha"])
+            fb.lum_parameter(p, "beta_coronary", 5. * x["cor.beta"])
+            e = fb.edges(p)
+            fb.scale(p, e[0], "parameter", x["cor.R"])
+            fb.scale(p, e[1], "parameter", x["cor.R"])
+            fb.scale(p, e[2], "parameter", 1. / x["cor.R"])
+
+    if "heart_kim_lit" in lum:
+        e = fb.edges("heart_kim_lit")
+        h = {k: x["heart." + k] for k in VP_HEART}
+        heart = [(0, 0, h["V_ra"]), (1, 0, h["R"]), (2, 0, h["R"]), (3, 0, h["E_max"]), (3, 1, h["E_min"]),
+                   (4, 0, h["R"]), (5, 0, h["R"]), (6, 0, h["R_p"]), (7, 0, 1. / h["R_p"]), (8, 0, h["E_la"]),
+                   (9, 0, h["R"]), (10, 0, h["R"]), (11, 0, h["E_max"]), (11, 1, h["E_min"]), (12, 0, h["R"]),
+                   (13, 0, h["R"])]
+        for i, k, f in heart:
+            fb.scale("heart_kim_lit", e[i], "parameter", f, k)
+
+    for region, ids in VP_PERIF.items():
+        f = x["perif." + region]
+        for p in ids:
+            if p not in lum:
+                continue
+            e = fb.edges(p)
+            for i in range(13):
+                # resistors and inductors are multiplied, capacitors divided
+                fb.scale(p, e[i], "parameter", 1. / f if 5 <= i <= 8 else f)
+
+    mat = [c * x[k] for c, k in zip(OLUFSEN_CONST, ["mat.k1", "mat.k2", "mat.k3"])]
+    for region, ids in VP_EDGES.items():
+        for a in _existing(fb, "arterial", ids):
+            fb.scale("arterial", a, "length", x["length." + region])
+            fb.scale("arterial", a, "nominal_diameter_start", x["diameter." + region])
+            fb.scale("arterial", a, "nominal_diameter_end", x["diameter." + region])
+            fb.set_material("arterial", a, 1, mat)
+    for region, ids in VP_NODES.items():
+        for n in _existing(fb, "arterial", ids):
+            fb.scale("arterial", n, "resistance", x["node_res." + region])
+
+
+def apply_run_par(fb, x):
+    """Multipliers x applied like run_par.cpp."""
+    if any(x["elas_voigt." + r] != 1. for r in PAR_EDGES):
+        raise ValueError("elas_voigt: the moc edges of this solver have no Voigt elasticity")
+    fb.heart_rate = 75.6
+    fb.time_period = 60. / fb.heart_rate
+    fb.is_periodic_run = True
+
+    lum = fb.models()["lum"]
+    if "heart_kim" in lum:
+        e = fb.edges("heart_kim")
+        fb.scale("heart_kim", e[0], "parameter", x["res_mitral"])
+        fb.scale("heart_kim", e[1], "parameter", x["res_aorta"])
+        fb.scale("heart_kim", e[2], "parameter", x["pres_atrium"])
+
+    for region, ids in PAR_NODES.items():
+        for n in _existing(fb, "arterial", ids):
+            fb.scale("arterial", n, "resistance", x["res_node." + region])
+    for region, ids in PAR_PERIF.items():
+        for p in ids:
+            if p not in lum:
+                continue
+            e = fb.edges(p)
+            fb.scale(p, e[0], "parameter", x["res_perif_1." + region])
+            fb.scale(p, e[1], "parameter", x["res_perif_2." + region])
+            fb.scale(p, e[2], "parameter", x["cap_perif." + region])
+    for region, ids in PAR_EDGES.items():
+        for a in _existing(fb, "arterial", ids):
+            fb.scale("arterial", a, "length", x["length." + region])
+            for end in ("start", "end"):
+                fb.scale("arterial", a, "nominal_diameter_" + end, x["diameter." + region])
+                fb.scale("arterial", a, "nominal_thickness_" + end, x["thickness." + region])
+            fb.scale("arterial", a, "elasticity", x["elas_spring." + region])
+
+
+LAYOUTS = {"run_vp": apply_run_vp, "run_par": apply_run_par}
+
+
+def expand_axis(layout, name):
+    """Multipliers an axis sets: the factor itself, or every region of a group ("diameter")."""
+    factors = LAYOUT_FACTORS[layout]
+    if name in factors:
+        return [name]
+    out = [f for f in factors if f.startswith(name + ".")]
+    if not out:
+        raise KeyError(f"{name} is not a multiplier of {layout}, known: {', '.join(factors)}")
+    return out
+
+
+def run_par_argv(case_name, x):
+    """argv of run_par.cpp for the multipliers x."""
+    return [case_name] + [repr(float(x[f])) for f in LAYOUT_FACTORS["run_par"]]
+
+
+def vpd_row(index, x, sex=0., age=0):
+    """Line of VPD.csv (read by run_vp.cpp) for the multipliers x."""
+    return [index, sex, age] + [float(x[f]) for f in LAYOUT_FACTORS["run_vp"]]
+
+
+# ---------------------------------------------------------------- sampling
+def _bounds(axis):
+    if isinstance(axis, dict):
+        return float(axis["low"]), float(axis["high"]), bool(axis.get("log", False))
+    return float(axis[0]), float(axis[-1]), False
+
+
+def _scale(u, axes):
+    out = np.empty_like(u)
+    for j, axis in enumerate(axes.values()):
+        lo, hi, log = _bounds(axis)
+        if log:
+            out[:, j] = np.exp(np.log(lo) + u[:, j] * (np.log(hi) - np.log(lo)))
+        else:
+            out[:, j] = lo + u[:, j] * (hi - lo)
+    return out
+
+
+def sample(spec):
+    """DataFrame of the samples (one column per axis), index: run number."""
+    axes = spec.get("axes", {})
+    sampler = spec.get("sampler", "grid")
+    seed = spec.get("seed")
+    if sampler == "grid":
+        values = [a["values"] if isinstance(a, dict) else a for a in axes.values()]
+        rows = list(itertools.product(*values))
+    elif sampler in ("lhs", "sobol"):
+        from scipy.stats import qmc
+        n = int(spec["samples"])
+        if sampler == "lhs":
+            u = qmc.LatinHypercube(d=len(axes), seed=seed).random(n)
+        else:
+            s = qmc.Sobol(d=len(axes), scramble=True, seed=seed)
+            m = int(np.log2(n))
+            u = s.random_base2(m) if 2 ** m == n else s.random(n)
+        rows = _scale(u, axes)
+    elif sampler == "list":
+        runs = spec["runs"]
+        if isinstance(runs, str):
+            return pd.read_csv(runs).rename_axis("run")
+        return pd.DataFrame(runs).rename_axis("run")
+    else:
+        raise ValueError(f"unknown sampler {sampler}, use grid, lhs, sobol or list")
+    return pd.DataFrame(rows, columns=list(axes)).rename_axis("run")
+
+
+def factors(layout, row):
+    """Every multiplier of the layout for one sample row (axis name -> value)."""
+    x = {f: 1. for f in LAYOUT_FACTORS[layout]}
+    for name, value in row.items():
+        if pd.isna(value):
+            continue  # axis not given in this row of a list
+        for f in expand_axis(layout, name):
+            x[f] = float(value)
+    return x
+
+
+# ---------------------------------------------------------------- running
+def vessel_metrics(fb, model, vessel, periods=1):
+    """Pressure (mmHg) and flow rate (ml/s) statistics at the start of a moc edge over the last periods."""
+    t = fb.history(model, vessel, "time")
+    p = (fb.history(model, vessel, "pressure_start") - ATMOSPHERIC_PRESSURE) / MMHG_TO_PA
+    q = fb.history(model, vessel, "volume_flow_rate_start") * 1.e6
+    w = t >= t[-1] - periods * fb.time_period
+    p, q = p[w], q[w]
+    return {
+        "p_sys": p.max(), "p_dia": p.min(), "p_mean": p.mean(),
+        "q_max": q.max(), "q_min": q.min(), "q_mean": q.mean(),
+    }
+
+
+def run_sample(model_dir, layout, row, vessels, settings=None, periods=1):
+    """Running one sample in this process; returns (status, seconds, [metric rows])."""
+    from first_blood import FirstBlood
+
+    t0 = time.time()
+    with FirstBlood(model_dir) as fb:
+        LAYOUTS[layout](fb, factors(layout, row))
+        for k, v in (settings or {}).items():
+            setattr(fb, k, v)
+        fb.clear_save_memory()
+        for model, ids in vessels.items():
+            fb.set_save_memory(model, ids)
+        if not fb.run():
+            return "failed", time.time() - t0, []
+        rows = []
+        for model, ids in vessels.items():
+            for v in ids:
+                rows.append(dict(model=model, vessel=v, **vessel_metrics(fb, model, v, periods)))
+    return "ok", time.time() - t0, rows
+
+
+def _run_indexed(i, *args):
+    try:
+        return (i,) + run_sample(*args)
+    except Exception as e:
+        return i, f"error: {e}", 0., []
+
+
+def run_sweep(spec, samples, out=".", shard=None, workers=None, verbose=True):
+    """Running the samples (rows shard[0]..shard[1]-1) on a process pool; returns (runs, metrics) DataFrames."""
+    a, b = shard or (0, len(samples))
+    todo = samples.iloc[a:b]
+    layout = spec.get("layout", "run_vp")
+    vessels = spec.get("vessels", {"arterial": ["A1"]})
+    args = (spec["model"], layout)
+    tail = (vessels, spec.get("settings"), spec.get("periods", 1))
+    workers = workers or os.cpu_count() or 1
+    if verbose:
+        print(f"running samples {a}..{b - 1} of {len(samples)} on {workers} workers")
+
+    runs, metrics = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_run_indexed, i, *args, row.to_dict(), *tail): i for i, row in todo.iterrows()}
+        for n, fut in enumerate(as_completed(futures), 1):
+            try:
+                i, status, seconds, rows = fut.result()
+            except Exception as e:
+                # a worker killed by the solver breaks the pool, the remaining runs are reported too
+                i, status, seconds, rows = futures[fut], f"crashed: {e}", 0., []
+            axis_values = samples.loc[i].to_dict()
+            runs.append(dict(run=i, status=status, seconds=seconds, **axis_values))
+            metrics += [dict(run=i, **axis_values, **r) for r in rows]
+            if verbose:
+                print(f"[{n}/{len(todo)}] {i}: {status} ({seconds:.1f} s)", flush=True)
+
+    suffix = "" if shard is None else f"_{a}_{b}"
+    runs = pd.DataFrame(runs).sort_values("run")
+    metrics = pd.DataFrame(metrics)
+    if len(metrics):
+        metrics = metrics.sort_values(["run", "model", "vessel"])
+    runs.to_csv(os.path.join(out, f"runs{suffix}.csv"), index=False)
+    metrics.to_csv(os.path.join(out, f"metrics{suffix}.csv"), index=False)
+    return runs, metrics
+
+
+def merge(out="."):
+    """Joining the runs_a_b.csv and metrics_a_b.csv of the shards into runs.csv and metrics.csv."""
+    for name in ("runs", "metrics"):
+        parts = sorted(f for f in os.listdir(out) if f.startswith(name + "_") and f.endswith(".csv"))
+        frames = [pd.read_csv(os.path.join(out, f)) for f in parts]
+        frames = [f for f in frames if len(f)]
+        df = pd.concat(frames).sort_values("run") if frames else pd.DataFrame()
+        df.to_csv(os.path.join(out, name + ".csv"), index=False)
+        print(f"{name}.csv: {len(parts)} shards, {len(df)} rows")
+
+
+def load_spec(path):
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def _parse_shard(text, n):
+    a, b = text.split(":")
+    return int(a or 0), min(int(b) if b else n, n)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parameter sweeps of first_blood models with region multipliers.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    r = sub.add_parser("run", help="sample the spec and run (a shard of) the samples")
+    r.add_argument("spec", help="YAML/JSON sweep spec")
+    r.add_argument("--out", default="sweep", help="output folder (default: sweep)")
+    r.add_argument("--shard", help="sample index range a:b (end exclusive) run by this process")
+    r.add_argument("--workers", type=int, default=None, help="parallel runs (default: number of cores)")
+    s = sub.add_parser("samples", help="only write samples.csv")
+    s.add_argument("spec")
+    s.add_argument("--out", default="sweep")
+    s.add_argument("--vpd", action="store_true", help="also write VPD.csv rows for run_vp.cpp")
+    s.add_argument("--argv", action="store_true", help="also write the run_par.cpp arguments, one run per line")
+    m = sub.add_parser("merge", help="join the shard files of an output folder")
+    m.add_argument("--out", default="sweep")
+    args = parser.parse_args(argv)
+
+    if args.command == "merge":
+        merge(args.out)
+        return 0
+
+    spec = load_spec(args.spec)
+    layout = spec.get("layout", "run_vp")
+    if layout not in LAYOUTS:
+        parser.error(f"unknown layout {layout}, use {' or '.join(LAYOUTS)}")
+    samples = sample(spec)
+    for name in samples.columns:
+        try:
+            expand_axis(layout, name)  # failing before any run on unknown axes
+        except KeyError as e:
+            parser.error(e.args[0])
+    os.makedirs(args.out, exist_ok=True)
+    samples.to_csv(os.path.join(args.out, "samples.csv"))
+
+    if args.command == "samples":
+        if args.vpd and layout != "run_vp" or args.argv and layout != "run_par":
+            parser.error("--vpd is for the run_vp layout, --argv for run_par")
+        case = os.path.basename(spec["model"].rstrip("/"))
+        if args.vpd:
+            cols = ["idx", "sex", "age"] + LAYOUT_FACTORS["run_vp"]
+            rows = [vpd_row(i, factors("run_vp", row)) for i, row in samples.iterrows()]
+            pd.DataFrame(rows, columns=cols).to_csv(os.path.join(args.out, "VPD.csv"), index=False)
+        if args.argv:
+            with open(os.path.join(args.out, "run_par_argv.txt"), "w") as f:
+                for i, row in samples.iterrows():
+                    f.write(" ".join(run_par_argv(case, factors("run_par", row))) + "\n")
+        print(f"{len(samples)} samples written to {args.out}")
+        return 0
+
+    shard = _parse_shard(args.shard, len(samples)) if args.shard else None
+    runs, _ = run_sweep(spec, samples, args.out, shard, args.workers)
+    counts = runs["status"].value_counts().to_dict()
+    print(", ".join(f"{k}: {v}" for k, v in sorted(counts.items())))
+    return 0 if set(counts) <= {"ok"} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "analysis"))
+from model_overlay import model_folders, model_file, read_lines, composed_files
+
+# Content-addressed cache of first_blood results.
+#
+# The key of a run is the sha256 of every input csv the model references
+# (main.csv, the moc and lumped model csv files, time series, output file),
+# the driver overrides, the driver arguments after the binary, the input files
+# of its working directory (e.g. VPD.csv of run_vp.out) and the solver binary;
+# for overlay models (base line in main.csv) the composed lines of main.csv and
+# the model files and the files of the base folders. Entries are stored as
+#   <cache>/<key[:2]>/<key>/results/<case>/...   the saved results folder
+#   <cache>/<key[:2]>/<key>/entry.json           model, case, size, created, last_used, ...
+# and evicted least recently used first when the cache is larger than max_bytes.
+DEFAULT_CACHE = os.environ.get("FIRST_BLOOD_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "first_blood"))
+ENTRY_FILE = "entry.json"
+
+_binary_digests = {}  # (path, size, mtime) -> digest, a binary is hashed once per process
+
+
+def _sha_file(path, h):
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+
+
+def referenced_files(model_dir):
+    """
+    Input csv files of a model folder: main.csv, then every <token>.csv named
+    in main.csv or in the moc model files (model csv files, lumped models,
+    time series of the upstream nodes, output,<file>).
+    """
+    files = ["main.csv"]
+    queue = ["main.csv"]
+    moc_models = set()
+    while queue:
+        name = queue.pop(0)
+        for line in read_lines(model_dir, name):
+            sv = [s.strip() for s in line.split(",")]
+            if name == "main.csv" and len(sv) > 1 and sv[0] == "moc":
+                moc_models.add(sv[1] + ".csv")
+            for token in sv:
+                csv = token + ".csv"
+                if token and csv not in files and os.path.isfile(model_file(model_dir, csv)):
+                    files.append(csv)
+                    # only main.csv and the moc files name other files
+                    if csv in moc_models:
+                        queue.append(csv)
+    return sorted(files)
+
+
+def binary_digest(path):
+    st = os.stat(path)
+    k = (os.path.abspath(path), st.st_size, st.st_mtime)
+    if k not in _binary_digests:
+        h = hashlib.sha256()
+        _sha_file(path, h)
+        _binary_digests[k] = h.hexdigest()
+    return _binary_digests[k]
+
+
+def cwd_inputs(cwd, binary=None):
+    """Files directly in the working directory of a driver (links followed), the binary excluded."""
+    skip = os.path.realpath(binary) if binary is not None else None
+    out = []
+    for e in sorted(os.scandir(cwd), key=lambda e: e.name):
+        if e.is_file() and os.path.realpath(e.path) != skip:
+            out.append(e.path)
+    return out
+
+
+def run_key(model_dir, overrides=None, binary=None, args=(), inputs=()):
+    """
+    Hex key of a run of model_dir with the driver overrides (json-able), the
+    solver binary, the driver arguments after the binary and the input files
+    the driver reads besides the model (hashed by name and content).
+    """
+    h = hashlib.sha256()
+    composed = set(composed_files(model_dir)) if len(model_folders(model_dir)) > 1 else set()
+    for name in referenced_files(model_dir):
+        h.update(b"file\0" + name.encode() + b"\0")
+        if name in composed:
+            h.update("\n".join(read_lines(model_dir, name)).encode())
+        else:
+            _sha_file(model_file(model_dir, name), h)
+    h.update(b"overrides\0" + json.dumps(overrides or {}, sort_keys=True).encode())
+    h.update(b"args\0" + json.dumps([str(a) for a in args]).encode())
+    for path in inputs:
+        h.update(b"input\0" + os.path.basename(path).encode() + b"\0")
+        _sha_file(path, h)
+    if binary is not None:
+        h.update(b"binary\0" + binary_digest(binary).encode())
+    return h.hexdigest()
+
+
+def _folder_size(path):
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for f in files:
+            total += os.path.getsize(os.path.join(dirpath, f))
+    return total
+
+
+class ResultCache:
+    def __init__(self, path=DEFAULT_CACHE, max_bytes=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+
+    def _dir(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    # ---------------------------------------------------------------- entries
+    def entries(self):
+        """entry.json of every complete entry."""
+        out = []
+        for sub in sorted(os.listdir(self.path)):
+            d = os.path.join(self.path, sub)
+            if len(sub) != 2 or not os.path.isdir(d):
+                continue
+            for key in sorted(os.listdir(d)):
+                if ".tmp" in key:
+                    continue  # being written
+                e = self.entry(key)
+                if e is not None:
+                    out.append(e)
+        return out
+
+    def entry(self, key):
+        path = os.path.join(self._dir(key), ENTRY_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def get(self, key):
+        """Path of the cached results/<case> folder (or .fba archive), None on a miss."""
+        e = self.entry(key)
+        if e is None:
+            return None
+        e["last_used"] = time.time()
+        e["hits"] = e.get("hits", 0) + 1
+        self._write_entry(key, e)
+        return os.path.join(self._dir(key), "results", e["case"])
+
+    def put(self, key, result_path, **meta):
+        """Copying a finished results/<case> folder (or <case>.fba) into the cache, returns the cached path."""
+        final = self._dir(key)
+        case = os.path.basename(result_path.rstrip("/"))
+        if not os.path.exists(final):
+            tmp = final + f".tmp{os.getpid()}"
+            os.makedirs(os.path.join(tmp, "results"), exist_ok=True)
+            dst = os.path.join(tmp, "results", case)
+            if os.path.isdir(result_path):
+                shutil.copytree(result_path, dst)
+            else:
+                shutil.copy2(result_path, dst)
+            now = time.time()
+            e = {"key": key, "case": case, "size": _folder_size(tmp), "created": now, "last_used": now, "hits": 0}
+            e.update(meta)
+            with open(os.path.join(tmp, ENTRY_FILE), "w") as f:
+                json.dump(e, f, indent=1)
+            try:
+                os.rename(tmp, final)  # atomic, a concurrent put of the same key wins or loses as a whole
+            except OSError:
+                shutil.rmtree(tmp, ignore_errors=True)
+        if self.max_bytes is not None:
+            self.prune(self.max_bytes, keep=key)
+        return os.path.join(final, "results", case)
+
+    def _write_entry(self, key, e):
+        tmp = os.path.join(self._dir(key), ENTRY_FILE + f".tmp{os.getpid()}")
+        with open(tmp, "w") as f:
+            json.dump(e, f, indent=1)
+        os.replace(tmp, os.path.join(self._dir(key), ENTRY_FILE))
+
+    def remove(self, key):
+        shutil.rmtree(self._dir(key), ignore_errors=True)
+
+    def size(self):
+        return sum(e["size"] for e in self.entries())
+
+    def prune(self, max_bytes=None, older_than=None, keep=None):
+        """Evicting least recently used entries until the cache fits max_bytes, and entries unused for older_than seconds."""
+        entries = sorted(self.entries(), key=lambda e: e["last_used"])
+        removed = []
+        now = time.time()
+        total = sum(e["size"] for e in entries)
+        for e in entries:
+            if e["key"] == keep:
+                continue
+            too_old = older_than is not None and now - e["last_used"] > older_than
+            too_big = max_bytes is not None and total > max_bytes
+            if too_old or too_big:
+                self.remove(e["key"])
+                total -= e["size"]
+                removed.append(e)
+        return removed
+
+
+def cached_run(model_dir, command, cwd=".", overrides=None, binary=None, case=None, cache=None, inputs=None):
+    """
+    Results of command run in cwd for model_dir, taken from the cache when the
+    model, the arguments, the input files, overrides and binary match a
+    previous run. Returns (path, hit) where path is the cached results/<case>
+    folder.
+
+    binary defaults to the first element of command; case (the name of the
+    results folder) to the name of the model folder; inputs (the files the
+    driver reads besides the model) to every file in cwd but the binary.
+    """
+    cache = cache or ResultCache()
+    binary = binary or os.path.join(cwd, command[0])
+    case = case or os.path.basename(os.path.abspath(model_dir))
+    if inputs is None:
+        inputs = cwd_inputs(cwd, binary)
+    key = run_key(model_dir, overrides, binary, command[1:], inputs)
+    path = cache.get(key)
+    if path is not None:
+        return path, True
+
+    subprocess.run(command, cwd=cwd, check=True)
+    result_path = os.path.join(cwd, "results", case)
+    if not os.path.exists(result_path) and os.path.exists(result_path + ".fba"):
+        result_path += ".fba"
+    meta = {"model_dir": os.path.abspath(model_dir), "binary": os.path.abspath(binary), "overrides": overrides or {},
+            "args": [str(a) for a in command[1:]], "inputs": [os.path.basename(p) for p in inputs]}
+    return cache.put(key, result_path, **meta), False
+
+
+def _parse_size(text):
+    units = {"k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+    text = text.strip().lower().rstrip("b")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def _human(n):
+    for u in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.0f} {u}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect, prune or use the first_blood result cache.")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help=f"cache folder (default: {DEFAULT_CACHE})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="entries, least recently used first")
+    i = sub.add_parser("info", help="entry.json of one entry")
+    i.add_argument("key", help="key or unique key prefix")
+    k = sub.add_parser("key", help="key of a model folder")
+    k.add_argument("model_dir")
+    k.add_argument("--binary")
+    k.add_argument("--overrides", help="json of the driver overrides")
+    k.add_argument("--args", nargs="*", default=[], help="driver arguments after the binary")
+    k.add_argument("--input", action="append", default=[], help="input file of the driver besides the model")
+    p = sub.add_parser("prune", help="evict entries")
+    p.add_argument("--max-size", help="evict least recently used entries down to this size, e.g. 20G")
+    p.add_argument("--older-than", type=float, help="evict entries unused for this many days")
+    p.add_argument("--all", action="store_true", help="empty the cache")
+    r = sub.add_parser("run", help="run a driver unless its result is cached, print the result folder")
+    r.add_argument("model_dir", help="model folder the driver reads, for the key")
+    r.add_argument("driver", nargs="+", help="driver and its arguments, e.g. ./simple_run.out Abel_ref2")
+    r.add_argument("--cwd", default=".", help="working directory of the driver")
+    r.add_argument("--case", help="results folder name (default: model folder name)")
+    r.add_argument("--overrides", help="json of the driver overrides")
+    r.add_argument("--input", action="append", default=None,
+                   help="input file of the driver besides the model (default: every file in --cwd)")
+    r.add_argument("--max-size", help="evict down to this size after storing")
+
+    args = parser.parse_args(argv)
+    cache = ResultCache(args.cache)
+
+    if args.command == "list":
+        entries = sorted(cache.entries(), key=lambda e: e["last_used"])
+        for e in entries:
+            used = time.strftime("%Y-%m-%d %H:%M", time.localtime(e["last_used"]))
+            print(f"{e['key'][:12]}  {_human(e['size']):>8}  {used}  hits={e.get('hits', 0):<4} "
+                  f"{e['case']}  {e.get('model_dir', '')}")
+        print(f"{len(entries)} entries, {_human(sum(e['size'] for e in entries))}")
+    elif args.command == "info":
+        matches = [e for e in cache.entries() if e["key"].startswith(args.key)]
+        if len(matches) != 1:
+            parser.error(f"{len(matches)} entries match {args.key}")
+        print(json.dumps(matches[0], indent=1))
+    elif args.command == "key":
+        overrides = json.loads(args.overrides) if args.overrides else None
+        print(run_key(args.model_dir, overrides, args.binary, args.args, args.input))
+    elif args.command == "prune":
+        if args.all:
+            removed = cache.prune(max_bytes=0)
+        else:
+            max_bytes = _parse_size(args.max_size) if args.max_size else None
+            older = args.older_than * 86400 if args.older_than is not None else None
+            if max_bytes is None and older is None:
+                parser.error("give --max-size, --older-than or --all")
+            removed = cache.prune(max_bytes, older)
+        print(f"removed {len(removed)} entries, {_human(sum(e['size'] for e in removed))}")
+    else:
+        cache.max_bytes = _parse_size(args.max_size) if args.max_size else None
+        overrides = json.loads(args.overrides) if args.overrides else None
+        path, hit = cached_run(args.model_dir, args.driver, args.cwd, overrides, case=args.case, cache=cache,
+                               inputs=args.input)
+        print(("hit: " if hit else "stored: ") + path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "projects", "python"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "analysis"))
+from output_spec import MOC_EDGE_TYPES, LUMPED_EDGE_TYPES, LUMPED_NODE_TYPES, read_main, read_elements
+from model_overlay import read_lines
+from result_cache import run_key
+
+# Store of periodic end states (save_initials) to warm start new model variants.
+#
+# States are grouped by the topology of the model: the connections of main.csv,
+# the moc edges with their nodes and the lumped edges and nodes, without any
+# parameter. A new variant, e.g. Abel_ref2 with changed CoW lengths, diameters
+# or division points, gets the init/ folder of the closest stored state: same
+# topology first, then the most elements in common, then the smallest mean
+# log difference of the moc geometry and lumped parameters. Elements missing
+# from the state start from pressure_initial as usual, the moc profiles are
+# interpolated onto the new division points by moc_edge::set_initials.
+#   <store>/<topology>/<key>/init/<model>.csv   files of save_initials
+#   <store>/<topology>/<key>/state.json         model, time, period, last_used, ...
+#   <store>/<topology>/<key>/features.json      geometry and parameters of the model
+#
+#   python warm_start.py run ../models/Abel_ref2 --periods 2 --cold-periods 8
+DEFAULT_STORE = os.environ.get("FIRST_BLOOD_STATES",
+                               os.path.join(os.path.expanduser("~"), ".cache", "first_blood_states"))
+STATE_FILE = "state.json"
+FEATURES_FILE = "features.json"
+
+
+def _split(line):
+    return [s.strip() for s in line.strip().split(",")]
+
+
+def _floats(sv):
+    out = []
+    for s in sv:
+        try:
+            out.append(float(s))
+        except ValueError:
+            break
+    return out
+
+
+def read_model(model_dir):
+    """
+    (topology, features) of a model folder. topology is a sorted list of
+    connection strings, features maps "moc/<model>/<ID>" to [start diameter,
+    end diameter, length, division points] and "lum/<model>/<edge>" to the
+    parameters of the lumped edge.
+    """
+    topology, features = [], {}
+    for line in read_lines(model_dir, "main.csv"):
+        sv = _split(line)
+        if len(sv) > 1 and sv[0] in ("moc", "lumped", "lum", "node"):
+            topology.append("main/" + "/".join(sv))
+    for model, kind in read_main(model_dir).items():
+        for line in read_lines(model_dir, model + ".csv"):
+            sv = _split(line)
+            if len(sv) < 2:
+                continue
+            if kind == "moc" and sv[0] in MOC_EDGE_TYPES and len(sv) > 10:
+                topology.append(f"moc/{model}/{sv[1]}/{sv[3]}/{sv[4]}")
+                features[f"moc/{model}/{sv[1]}"] = [float(sv[5]), float(sv[6]), float(sv[9]), int(sv[10])]
+            elif kind == "lum" and sv[0] in LUMPED_EDGE_TYPES and len(sv) > 4:
+                topology.append(f"lum/{model}/{sv[0]}/{sv[1]}/{sv[2]}/{sv[3]}")
+                features[f"lum/{model}/{sv[1]}"] = _floats(sv[5:])
+            elif kind == "lum" and sv[0] in LUMPED_NODE_TYPES:
+                topology.append(f"lum/{model}/{sv[0]}/{sv[1]}")
+    return sorted(topology), features
+
+
+def topology_key(topology):
+    return hashlib.sha256("\n".join(topology).encode()).hexdigest()[:16]
+
+
+def distance(features, other):
+    """
+    (missing, difference) of a state with features other for a model with
+    features: the fraction of the elements of the model the state does not
+    have, and the mean over the common elements of the largest |log| ratio of
+    their diameters, length or parameters (division points are left out, the
+    profiles are interpolated).
+    """
+    common = [k for k in features if k in other]
+    missing = 1. - len(common) / max(len(features), 1)
+    diffs = []
+    for k in common:
+        a, b = features[k], other[k]
+        if k.startswith("moc/"):
+            a, b = a[:3], b[:3]
+        d = 0.
+        for x, y in zip(a, b):
+            if x != y:
+                d = max(d, abs(np.log(x / y)) if x * y > 0. else 1.)
+        diffs.append(d)
+    return missing, float(np.mean(diffs)) if diffs else 0.
+
+
+class StateStore:
+    def __init__(self, path=DEFAULT_STORE):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def states(self, topology=None):
+        """state.json of every state, of one topology if given."""
+        out = []
+        tops = [topology] if topology is not None else sorted(os.listdir(self.path))
+        for top in tops:
+            d = os.path.join(self.path, top)
+            if not os.path.isdir(d):
+                continue
+            for key in sorted(os.listdir(d)):
+                path = os.path.join(d, key, STATE_FILE)
+                if ".tmp" not in key and os.path.exists(path):
+                    with open(path) as f:
+                        out.append(json.load(f))
+        return out
+
+    def _dir(self, state):
+        return os.path.join(self.path, state["topology"], state["key"])
+
+    def put(self, model_dir, init_dir=None, **meta):
+        """
+        Storing the init/ folder written by save_initials for model_dir (or
+        init_dir), replacing an earlier state of the same inputs. Returns the
+        state.json.
+        """
+        init_dir = init_dir or os.path.join(model_dir, "init")
+        topology, features = read_model(model_dir)
+        state = {"topology": topology_key(topology), "key": run_key(model_dir)[:16],
+                 "model_dir": os.path.abspath(model_dir),
+                 "case": os.path.basename(os.path.abspath(model_dir)),
+                 "created": time.time(), "last_used": time.time(), "uses": 0}
+        state.update(meta)
+        final = self._dir(state)
+        tmp = final + f".tmp{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        shutil.copytree(init_dir, os.path.join(tmp, "init"))
+        with open(os.path.join(tmp, FEATURES_FILE), "w") as f:
+            json.dump(features, f)
+        with open(os.path.join(tmp, STATE_FILE), "w") as f:
+            json.dump(state, f, indent=1)
+        shutil.rmtree(final, ignore_errors=True)
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        os.rename(tmp, final)
+        return state
+
+    def features(self, state):
+        with open(os.path.join(self._dir(state), FEATURES_FILE)) as f:
+            return json.load(f)
+
+    def closest(self, model_dir):
+        """(state.json, (missing, difference)) of the closest state to model_dir, (None, None) for an empty store."""
+        topology, features = read_model(model_dir)
+        top = topology_key(topology)
+        best, best_score = None, None
+        for s in self.states():
+            missing, diff = distance(features, self.features(s))
+            if missing >= 1.:
+                continue
+            score = (s["topology"] != top, missing, diff)
+            if best_score is None or score < best_score:
+                best, best_score = s, score
+        return best, (best_score[1:] if best is not None else None)
+
+    def apply(self, model_dir, state=None, main=True):
+        """
+        Writing <model_dir>/init/ from state (default: the closest one), only
+        the elements the model has, an empty file for models the state does
+        not have. main=True adds the "init" line to main.csv, so every driver
+        starts from it. Returns the state.json used, None if there is none.
+        """
+        if state is None:
+            state, _ = self.closest(model_dir)
+            if state is None:
+                return None
+        src = os.path.join(self._dir(state), "init")
+        dst = os.path.join(model_dir, "init")
+        os.makedirs(dst, exist_ok=True)
+        for model, kind in read_main(model_dir).items():
+            edges, nodes = read_elements(model_dir, model, kind)
+            lines = []
+            path = os.path.join(src, model + ".csv")
+            if os.path.exists(path):
+                with open(path) as f:
+                    for line in f:
+                        sv = _split(line)
+                        if kind == "moc" and sv[0] in edges:
+                            lines.append(line)
+                        elif kind == "lum" and len(sv) > 1 and sv[1] in (edges if sv[0] == "edge" else nodes):
+                            lines.append(line)
+            with open(os.path.join(dst, model + ".csv"), "w") as f:
+                f.writelines(lines)
+        if main:
+            set_init_line(model_dir)
+        state["last_used"] = time.time()
+        state["uses"] = state.get("uses", 0) + 1
+        with open(os.path.join(self._dir(state), STATE_FILE), "w") as f:
+            json.dump(state, f, indent=1)
+        return state
+
+    def remove(self, state):
+        shutil.rmtree(self._dir(state), ignore_errors=True)
+
+    def prune(self, keep=5):
+        """Keeping the keep most recently used states of every topology."""
+        removed = []
+        for top in sorted(os.listdir(self.path)):
+            states = sorted(self.states(top), key=lambda s: s["last_used"], reverse=True)
+            for s in states[keep:]:
+                self.remove(s)
+                removed.append(s)
+        return removed
+
+
+def set_init_line(model_dir):
+    """Adding "init" to main.csv (first_blood::init_from_file) if it is not there."""
+    path = os.path.join(model_dir, "main.csv")
+    with open(path) as f:
+        lines = f.readlines()
+    if any(_split(line)[0] == "init" for line in lines):
+        return
+    # after the settings at the top, before the first empty line
+    i = next((i for i, line in enumerate(lines) if not line.strip()), len(lines))
+    lines.insert(i, "init\n")
+    # replaced, not written into: main.csv may be a hard link to the base model (generate_cohort.py)
+    with open(path + ".tmp", "w") as f:
+        f.writelines(lines)
+    os.replace(path + ".tmp", path)
+
+
+def warm_run(model_dir, periods=2, cold_periods=8, store=None, save_dt=None):
+    """
+    Running model_dir through first_blood.py from the closest stored state for
+    periods heart cycles (cold_periods from pressure_initial if there is
+    none), then storing its end state. Returns (fb, state used or None).
+    """
+    from first_blood import FirstBlood
+
+    store = store or StateStore()
+    state = store.apply(model_dir, main=False)
+    fb = FirstBlood(model_dir)
+    fb.is_periodic_run = False
+    fb.init_from_file = state is not None
+    # whole periods, the heart model restarts at t=0 of its cycle
+    fb.time_end = (periods if state is not None else cold_periods) * fb.time_period
+    if not fb.run():
+        raise RuntimeError(f"run of {model_dir} failed")
+    fb.save_initials()
+    store.put(model_dir, time_end=fb.time_end, time_period=fb.time_period,
+              warm_from=state["key"] if state is not None else None)
+    if save_dt is not None:
+        fb.save_results(save_dt)
+    return fb, state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm start first_blood models from stored periodic states.")
+    parser.add_argument("--store", default=DEFAULT_STORE, help=f"store folder (default: {DEFAULT_STORE})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="stored states")
+    p = sub.add_parser("put", help="store <model>/init written by save_initials at the end of a whole period")
+    p.add_argument("model_dir")
+    a = sub.add_parser("apply", help="write <model>/init from the closest state and add init to main.csv")
+    a.add_argument("model_dir")
+    a.add_argument("--no-main", action="store_true", help="do not change main.csv")
+    r = sub.add_parser("run", help="run through first_blood.py from the closest state and store the end state")
+    r.add_argument("model_dir")
+    r.add_argument("--periods", type=int, default=2, help="heart cycles from a stored state (default: 2)")
+    r.add_argument("--cold-periods", type=int, default=8, help="heart cycles without a stored state (default: 8)")
+    r.add_argument("--save-dt", type=float, help="save the results with this time step")
+    q = sub.add_parser("prune", help="keep the most recently used states of every topology")
+    q.add_argument("--keep", type=int, default=5)
+
+    args = parser.parse_args(argv)
+    store = StateStore(args.store)
+
+    if args.command == "list":
+        states = store.states()
+        for s in states:
+            used = time.strftime("%Y-%m-%d %H:%M", time.localtime(s["last_used"]))
+            print(f"{s['topology']}  {s['key']}  {used}  uses={s.get('uses', 0):<4} {s['case']}  {s['model_dir']}")
+        print(f"{len(states)} states, {len({s['topology'] for s in states})} topologies")
+    elif args.command == "put":
+        s = store.put(args.model_dir)
+        print(f"stored {s['topology']}/{s['key']}")
+    elif args.command == "apply":
+        s = store.apply(args.model_dir, main=not args.no_main)
+        if s is None:
+            print("no stored state, the model starts from pressure_initial")
+            return 1
+        missing, diff = distance(read_model(args.model_dir)[1], store.features(s))
+        print(f"init from {s['case']} ({s['topology']}/{s['key']}), "
+              f"{100. * missing:.0f}% elements missing, mean |log| difference {diff:.3f}")
+    elif args.command == "run":
+        t0 = time.time()
+        fb, s = warm_run(args.model_dir, args.periods, args.cold_periods, store, args.save_dt)
+        start = f"warm from {s['case']} ({s['key']})" if s is not None else "cold"
+        print(f"{start}, {fb.time_end / fb.time_period:.0f} periods in {time.time() - t0:.1f} s, end state stored")
+    else:
+        removed = store.prune(args.keep)
+        print(f"removed {len(removed)} states")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,16 @@
 #include "file_io.h"
 
+// layout of the binary result files
+const char binary_magic[8] = {'F','B','R','E','S','U','L','T'};
+const uint32_t binary_version = 1;
+const uint32_t binary_header_size = 64;
+const uint32_t binary_name_size = 32;
+
+// layout of the result archive files
+const char archive_magic[8] = {'F','B','A','R','C','H','I','V'};
+const uint32_t archive_version = 1;
+const uint64_t archive_header_size = 32;
+
 using namespace std;
 
 //--------------------------------------------------
@@ -35,4 +46,629 @@ void make_directory(string name)
 	#else 
 		mkdir(name.c_str(), 0700); 
 	#endif
-}
\ No newline at end of file
+}
+
+//--------------------------------------------------------------
+// removing spaces and line ends like the loaders do
+static string clean_line(string line)
+{
+	line.erase(remove(line.begin(), line.end(), ' '), line.end());
+	line.erase(remove(line.begin(), line.end(), '\n'), line.end());
+	line.erase(remove(line.begin(), line.end(), '\r'), line.end());
+	return line;
+}
+
+//--------------------------------------------------------------
+vector<string> model_folders(string folder)
+{
+	vector<string> folders;
+	while(folder != "")
+	{
+		folders.push_back(folder);
+		if(folders.size()>20)
+		{
+			cout << "! ERROR !" << endl << " Base models are nested too deep, probably a loop in model_folders() function!!! folder: " << folder << "\nExiting..." << endl;
+			exit(-1);
+		}
+
+		string base = "";
+		ifstream file_in(folder + "/main.csv");
+		string line;
+		while(getline(file_in,line))
+		{
+			vector<string> sv = separate_line(clean_line(line));
+			if(sv[0] == "base" && sv.size()>1 && sv[1] != "")
+			{
+				base = sv[1][0] == '/' ? sv[1] : folder + "/" + sv[1];
+			}
+		}
+		folder = base;
+	}
+	return folders;
+}
+
+//--------------------------------------------------------------
+string model_file_path(string folder, string file)
+{
+	vector<string> folders = model_folders(folder);
+	for(unsigned int i=0; i<folders.size(); i++)
+	{
+		ifstream file_in(folders[i] + "/" + file);
+		if(file_in.is_open())
+		{
+			return folders[i] + "/" + file;
+		}
+	}
+	return folder + "/" + file;
+}
+
+//--------------------------------------------------------------
+// key of a row in the overlay, "" for rows without a key
+static string overlay_key(const vector<string> &sv, bool is_main)
+{
+	if(sv[0] == "")
+	{
+		return "";
+	}
+	if(is_main)
+	{
+		if((sv[0] == "moc" || sv[0] == "lumped" || sv[0] == "lum" || sv[0] == "node") && sv.size()>1)
+		{
+			return (sv[0] == "lum" ? "lumped" : sv[0]) + "," + sv[1];
+		}
+		if(sv[0] == "probe" && sv.size()>4)
+		{
+			return sv[0] + "," + sv[1] + "," + sv[2] + "," + sv[3] + "," + sv[4];
+		}
+		return sv[0];
+	}
+	if(sv.size()>1 && sv[0] != "type" && sv[1] != "")
+	{
+		return sv[1];
+	}
+	return "";
+}
+
+//--------------------------------------------------------------
+bool read_model_lines(string folder, string file, vector<string> &lines)
+{
+	bool is_main = file == "main.csv";
+	vector<string> folders = model_folders(folder);
+
+	vector<bool> removed;
+	map<string,int> key_index;
+	bool found = false;
+	lines.clear();
+
+	// from the last base to the folder itself
+	for(int i=folders.size()-1; i>=0; i--)
+	{
+		ifstream file_in(folders[i] + "/" + file);
+		if(!file_in.is_open())
+		{
+			continue;
+		}
+		bool is_first = !found;
+		found = true;
+
+		string line;
+		while(getline(file_in,line))
+		{
+			line = clean_line(line);
+			vector<string> sv = separate_line(line);
+			if(is_main && sv[0] == "base")
+			{
+				continue;
+			}
+
+			if(sv[0] == "remove" && sv.size()>1)
+			{
+				vector<string> rest(sv.begin()+1, sv.end());
+				map<string,int>::iterator it = key_index.find(overlay_key(rest, is_main));
+				if(it != key_index.end())
+				{
+					removed[it->second] = true;
+					key_index.erase(it);
+				}
+				continue;
+			}
+
+			string key = overlay_key(sv, is_main);
+			if(key == "")
+			{
+				if(is_first)
+				{
+					lines.push_back(line);
+					removed.push_back(false);
+				}
+				continue;
+			}
+
+			map<string,int>::iterator it = key_index.find(key);
+			if(it != key_index.end())
+			{
+				lines[it->second] = line;
+			}
+			else
+			{
+				key_index[key] = lines.size();
+				lines.push_back(line);
+				removed.push_back(false);
+			}
+		}
+	}
+
+	vector<string> out;
+	for(unsigned int i=0; i<lines.size(); i++)
+	{
+		if(!removed[i])
+		{
+			out.push_back(lines[i]);
+		}
+	}
+	lines = out;
+
+	return found;
+}
+
+//--------------------------------------------------------------
+void save_columns_txt(string file_name, const vector<const vector<double>*> &columns)
+{
+	size_t nrows = 0;
+	if(columns.size()>0)
+	{
+		nrows = columns[0]->size();
+		for(size_t k=1; k<columns.size(); k++)
+		{
+			nrows = min(nrows,columns[k]->size());
+		}
+	}
+
+	FILE *out_file;
+	out_file = fopen(file_name.c_str(),"w");
+	for(size_t j=0; j<nrows; j++)
+	{
+		for(size_t k=0; k<columns.size(); k++)
+		{
+			if(k>0)
+			{
+				fprintf(out_file, ", ");
+			}
+			fprintf(out_file, "%9.7e", (*columns[k])[j]);
+		}
+		fprintf(out_file, "\n");
+	}
+	fclose(out_file);
+}
+
+//--------------------------------------------------------------
+static bool is_little_endian()
+{
+	uint16_t one = 1;
+	unsigned char c;
+	memcpy(&c,&one,1);
+	return c == 1;
+}
+
+//--------------------------------------------------------------
+static void write_le(FILE *out_file, const void *value, int bytes)
+{
+	unsigned char b[8];
+	memcpy(b,value,bytes);
+	if(!is_little_endian())
+	{
+		for(int i=0; i<bytes/2; i++)
+		{
+			swap(b[i],b[bytes-1-i]);
+		}
+	}
+	fwrite(b,1,bytes,out_file);
+}
+
+//--------------------------------------------------------------
+static void write_column_le(FILE *out_file, const vector<double> &c, uint64_t nrows, int itemsize)
+{
+	if(itemsize == 8)
+	{
+		if(is_little_endian())
+		{
+			fwrite(c.data(),8,nrows,out_file);
+		}
+		else
+		{
+			for(uint64_t j=0; j<nrows; j++)
+			{
+				write_le(out_file,&c[j],8);
+			}
+		}
+	}
+	else
+	{
+		vector<float> cf(c.begin(),c.begin()+nrows);
+		if(is_little_endian())
+		{
+			fwrite(cf.data(),4,nrows,out_file);
+		}
+		else
+		{
+			for(uint64_t j=0; j<nrows; j++)
+			{
+				write_le(out_file,&cf[j],4);
+			}
+		}
+	}
+}
+
+//--------------------------------------------------------------
+void save_columns_bin(string file_name, const vector<string> &names, const vector<const vector<double>*> &columns, int bytes)
+{
+	uint64_t nrows = 0;
+	if(columns.size()>0)
+	{
+		nrows = columns[0]->size();
+		for(size_t k=1; k<columns.size(); k++)
+		{
+			nrows = min(nrows,(uint64_t)columns[k]->size());
+		}
+	}
+	uint32_t ncols = columns.size();
+	uint32_t itemsize = (bytes == 4) ? 4 : 8;
+	uint64_t data_offset = binary_header_size + binary_name_size*ncols;
+
+	FILE *out_file;
+	out_file = fopen(file_name.c_str(),"wb");
+
+	// fixed header
+	unsigned char header[binary_header_size] = {0};
+	fwrite(binary_magic,1,8,out_file);
+	write_le(out_file,&binary_version,4);
+	write_le(out_file,&itemsize,4);
+	write_le(out_file,&nrows,8);
+	write_le(out_file,&ncols,4);
+	write_le(out_file,&binary_name_size,4);
+	write_le(out_file,&data_offset,8);
+	fwrite(header,1,binary_header_size-40,out_file);
+
+	// column names, zero padded
+	for(uint32_t k=0; k<ncols; k++)
+	{
+		char name[binary_name_size] = {0};
+		if(k<names.size())
+		{
+			strncpy(name,names[k].c_str(),binary_name_size-1);
+		}
+		fwrite(name,1,binary_name_size,out_file);
+	}
+
+	// column blocks, one column after the other
+	for(uint32_t k=0; k<ncols; k++)
+	{
+		write_column_le(out_file,*columns[k],nrows,itemsize);
+	}
+	fclose(out_file);
+}
+
+//--------------------------------------------------------------
+string variable_unit(string variable)
+{
+	// dropping the _start/_end suffix of edge variables
+	size_t pos = variable.rfind('_');
+	if(pos != string::npos)
+	{
+		string suffix = variable.substr(pos);
+		if(suffix == "_start" || suffix == "_end")
+		{
+			variable = variable.substr(0,pos);
+		}
+	}
+
+	if(variable == "time")
+	{
+		return "s";
+	}
+	else if(variable == "pressure")
+	{
+		return "Pa";
+	}
+	else if(variable == "velocity" || variable == "wave_speed")
+	{
+		return "m/s";
+	}
+	else if(variable == "volume_flow_rate")
+	{
+		return "m3/s";
+	}
+	else if(variable == "mass_flow_rate")
+	{
+		return "kg/s";
+	}
+	else if(variable == "area")
+	{
+		return "m2";
+	}
+	return "";
+}
+
+//--------------------------------------------------------------
+result_archive::result_archive(string a_file_name, string a_run_name)
+{
+	file_name = a_file_name;
+	run_name = a_run_name;
+	data_end = archive_header_size;
+
+	out_file = fopen(file_name.c_str(),"w+b");
+	if(out_file == NULL)
+	{
+		cout << "! ERROR !" << endl << " File could not be opened in result_archive() function!!! file: " << file_name << endl;
+		return;
+	}
+
+	// header, index offset and size are filled by write_index
+	unsigned char header[archive_header_size] = {0};
+	memcpy(header,archive_magic,8);
+	fwrite(header,1,archive_header_size,out_file);
+	fseek(out_file,8,SEEK_SET);
+	write_le(out_file,&archive_version,4);
+}
+
+//--------------------------------------------------------------
+result_archive::~result_archive()
+{
+	if(out_file != NULL)
+	{
+		fclose(out_file);
+	}
+}
+
+//--------------------------------------------------------------
+bool result_archive::is_open()
+{
+	return out_file != NULL;
+}
+
+//--------------------------------------------------------------
+void result_archive::write_columns(string model, string element, string type, const vector<string> &names, const vector<const vector<double>*> &columns, int bytes)
+{
+	if(out_file == NULL)
+	{
+		return;
+	}
+
+	uint64_t nrows = 0;
+	if(columns.size()>0)
+	{
+		nrows = columns[0]->size();
+		for(size_t k=1; k<columns.size(); k++)
+		{
+			nrows = min(nrows,(uint64_t)columns[k]->size());
+		}
+	}
+	int itemsize = (bytes == 4) ? 4 : 8;
+
+	// blocks are appended after the last one, overwriting the previous index
+	fseek(out_file,data_end,SEEK_SET);
+	ostringstream entry;
+	entry << "{\"type\": \"" << type << "\", \"rows\": " << nrows << ", \"dtype\": \"" << (itemsize == 8 ? "<f8" : "<f4") << "\", \"codec\": \"raw\", \"columns\": {";
+	for(size_t k=0; k<columns.size(); k++)
+	{
+		write_column_le(out_file,*columns[k],nrows,itemsize);
+		uint64_t nbytes = nrows*itemsize;
+		entry << (k>0 ? ", " : "") << "\"" << (k<names.size() ? names[k] : "col"+to_string(k)) << "\": [[" << data_end << ", " << nbytes << ", " << nrows << "]]";
+		data_end += nbytes;
+	}
+	entry << "}}";
+
+	// replacing an element saved earlier
+	for(size_t i=0; i<entries.size(); i++)
+	{
+		if(models[i] == model && elements[i] == element)
+		{
+			entries[i] = entry.str();
+			return;
+		}
+	}
+	models.push_back(model);
+	elements.push_back(element);
+	entries.push_back(entry.str());
+}
+
+//--------------------------------------------------------------
+void result_archive::write_index(string manifest)
+{
+	if(out_file == NULL)
+	{
+		return;
+	}
+
+	// grouping the elements by model, in the order of saving
+	vector<string> model_list;
+	for(size_t i=0; i<models.size(); i++)
+	{
+		if(find(model_list.begin(),model_list.end(),models[i]) == model_list.end())
+		{
+			model_list.push_back(models[i]);
+		}
+	}
+
+	ostringstream index;
+	index << "{\"version\": " << archive_version << ", \"runs\": {\"" << run_name << "\": {\"manifest\": " << (manifest.empty() ? "null" : manifest) << ", \"models\": {";
+	for(size_t m=0; m<model_list.size(); m++)
+	{
+		index << (m>0 ? ", " : "") << "\n\"" << model_list[m] << "\": {";
+		bool first = true;
+		for(size_t i=0; i<models.size(); i++)
+		{
+			if(models[i] == model_list[m])
+			{
+				index << (first ? "" : ", ") << "\n\"" << elements[i] << "\": " << entries[i];
+				first = false;
+			}
+		}
+		index << "}";
+	}
+	index << "}}}}\n";
+
+	string index_str = index.str();
+	uint64_t index_size = index_str.size();
+	fseek(out_file,data_end,SEEK_SET);
+	fwrite(index_str.c_str(),1,index_size,out_file);
+
+	// bytes of an older, longer index may remain after it, the header gives the size
+	fseek(out_file,16,SEEK_SET);
+	write_le(out_file,&data_end,8);
+	write_le(out_file,&index_size,8);
+	fflush(out_file);
+}
+
+//--------------------------------------------------------------
+column_stream::column_stream(string a_file_name, const vector<string> &a_names, int a_format, int a_bytes, int a_chunk_rows)
+{
+	names = a_names;
+	format = a_format;
+	bytes = (a_bytes == 4) ? 4 : 8;
+	chunk_rows = a_chunk_rows>0 ? a_chunk_rows : 1;
+	rows = 0;
+
+	if(format == 1)
+	{
+		file_name = a_file_name + ".bin";
+		out_file = fopen((file_name + ".part").c_str(),"wb");
+	}
+	else
+	{
+		file_name = a_file_name + ".txt";
+		out_file = fopen(file_name.c_str(),"w");
+	}
+	if(out_file == NULL)
+	{
+		cout << "! ERROR !" << endl << " File could not be opened in column_stream() function!!! file: " << file_name << endl;
+	}
+	buffer.reserve(chunk_rows*names.size());
+}
+
+//--------------------------------------------------------------
+column_stream::~column_stream()
+{
+	close();
+}
+
+//--------------------------------------------------------------
+bool column_stream::is_open()
+{
+	return out_file != NULL;
+}
+
+//--------------------------------------------------------------
+void column_stream::push_row(const vector<double> &row)
+{
+	buffer.insert(buffer.end(),row.begin(),row.end());
+	rows++;
+	if(buffer.size() >= chunk_rows*names.size())
+	{
+		flush();
+	}
+}
+
+//--------------------------------------------------------------
+void column_stream::flush()
+{
+	if(out_file == NULL)
+	{
+		buffer.clear();
+		return;
+	}
+
+	size_t ncols = names.size();
+	if(format == 1)
+	{
+		// raw native doubles, only read back by close()
+		fwrite(buffer.data(),sizeof(double),buffer.size(),out_file);
+	}
+	else
+	{
+		for(size_t j=0; j<buffer.size(); j+=ncols)
+		{
+			for(size_t k=0; k<ncols; k++)
+			{
+				if(k>0)
+				{
+					fprintf(out_file, ", ");
+				}
+				fprintf(out_file, "%9.7e", buffer[j+k]);
+			}
+			fprintf(out_file, "\n");
+		}
+	}
+	buffer.clear();
+}
+
+//--------------------------------------------------------------
+void column_stream::close()
+{
+	if(out_file == NULL)
+	{
+		return;
+	}
+	flush();
+	fclose(out_file);
+	out_file = NULL;
+
+	if(format != 1)
+	{
+		return;
+	}
+
+	// transposing the row-major part file to column blocks, chunk by chunk
+	string part_name = file_name + ".part";
+	FILE *in_file = fopen(part_name.c_str(),"rb");
+	uint32_t ncols = names.size();
+	uint32_t itemsize = bytes;
+	uint64_t nrows = rows;
+	uint64_t data_offset = binary_header_size + binary_name_size*ncols;
+
+	FILE *bin_file = fopen(file_name.c_str(),"wb");
+	unsigned char header[binary_header_size] = {0};
+	fwrite(binary_magic,1,8,bin_file);
+	write_le(bin_file,&binary_version,4);
+	write_le(bin_file,&itemsize,4);
+	write_le(bin_file,&nrows,8);
+	write_le(bin_file,&ncols,4);
+	write_le(bin_file,&binary_name_size,4);
+	write_le(bin_file,&data_offset,8);
+	fwrite(header,1,binary_header_size-40,bin_file);
+	for(uint32_t k=0; k<ncols; k++)
+	{
+		char name[binary_name_size] = {0};
+		strncpy(name,names[k].c_str(),binary_name_size-1);
+		fwrite(name,1,binary_name_size,bin_file);
+	}
+
+	vector<double> chunk(chunk_rows*ncols);
+	vector<double> column(chunk_rows);
+	uint64_t row0 = 0;
+	while(in_file != NULL && row0 < nrows)
+	{
+		uint64_t n = fread(chunk.data(),sizeof(double)*ncols,chunk_rows,in_file);
+		if(n == 0)
+		{
+			break;
+		}
+		for(uint32_t k=0; k<ncols; k++)
+		{
+			for(uint64_t j=0; j<n; j++)
+			{
+				column[j] = chunk[j*ncols+k];
+			}
+			fseek(bin_file,data_offset + (k*nrows + row0)*itemsize,SEEK_SET);
+			write_column_le(bin_file,column,n,itemsize);
+		}
+		row0 += n;
+	}
+
+	fclose(bin_file);
+	if(in_file != NULL)
+	{
+		fclose(in_file);
+	}
+	remove(part_name.c_str());
+}
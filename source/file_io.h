@@ -3,6 +3,14 @@
 
 #include <string>
 #include <vector>
+#include <cstdint>
+#include <cstring>
+#include <algorithm>
+#include <stdio.h>
+#include <sstream>
+#include <iostream>
+#include <fstream>
+#include <map>
 #include <sys/stat.h> // mkdir
 
 using namespace std;
@@ -13,4 +21,75 @@ vector<string> separate_line(string line);
 // make new directory, works for windows and linux
 void make_directory(string name);
 
-#endif
\ No newline at end of file
+// overlay models: a main.csv line "base,<folder>" (relative to the model folder) names the model the folder overrides
+// folders of the overlay chain of a model: the folder itself, its base, the base of the base...
+vector<string> model_folders(string folder);
+// path of file in the first folder of the chain that has it, folder/file if none has it
+string model_file_path(string folder, string file);
+// lines of a model csv file composed from the base to the folder, spaces and line ends removed
+// a row replaces the row of the base with the same key (main.csv: setting name or type,name of moc/lumped/node; other files: ID)
+// "remove,<beginning of a row>" deletes the row of the base, rows without a key (headers, comments) are kept from the first file only
+// returns false if no folder of the chain has the file
+bool read_model_lines(string folder, string file, vector<string> &lines);
+
+// saving columns to text file, every value with %9.7e separated by commas
+void save_columns_txt(string file_name, const vector<const vector<double>*> &columns);
+
+// saving columns to binary file: fixed header, column names and little-endian column blocks
+// bytes: 8 for float64, 4 for float32
+void save_columns_bin(string file_name, const vector<string> &names, const vector<const vector<double>*> &columns, int bytes);
+
+// single file archive of the results of one run (save,archive in main.csv)
+// layout: 32 byte header (magic, version, index offset, index size), raw little-endian column blocks, json index
+// the index is rewritten after every write_index call, so the file can be extended by later save_results calls
+class result_archive
+{
+public:
+	result_archive(string a_file_name, string a_run_name);
+	~result_archive();
+
+	string file_name;
+	string run_name;
+	bool is_open();
+
+	// appending the columns of one element, an element saved again replaces the older one in the index
+	void write_columns(string model, string element, string type, const vector<string> &names, const vector<const vector<double>*> &columns, int bytes);
+	// writing the json index (with the manifest of the run) after the blocks and updating the header
+	void write_index(string manifest);
+
+private:
+	FILE *out_file;
+	uint64_t data_end; // end of the last block, the index starts here
+	vector<string> models, elements, entries; // json entry of every element
+};
+
+// writing rows to a result file during the run, keeping only chunk_rows rows in memory
+// format 0: text (.txt, same as save_columns_txt), 1: binary (.bin, same as save_columns_bin)
+// binary files are column-major, so the rows go to file_name.part first and are transposed by close()
+class column_stream
+{
+public:
+	column_stream(string a_file_name, const vector<string> &a_names, int a_format, int a_bytes, int a_chunk_rows);
+	~column_stream();
+
+	string file_name; // with extension
+	vector<string> names;
+	int format, bytes, chunk_rows;
+	uint64_t rows; // number of rows pushed so far
+
+	bool is_open();
+	void push_row(const vector<double> &row);
+	// writing the buffered rows to file
+	void flush();
+	// flushing and finishing the file, called once at the end
+	void close();
+
+private:
+	FILE *out_file;
+	vector<double> buffer; // row-major, at most chunk_rows rows
+};
+
+// SI unit of a saved variable (column name of the result files), e.g. pressure_start -> Pa
+string variable_unit(string variable);
+
+#endif
@@ -29,6 +29,7 @@ first_blood::first_blood(string folder_name)
 first_blood::~first_blood()
 {
     initialization();
+    delete archive;
 }
 
 //--------------------------------------------------------------
@@ -53,6 +54,12 @@ bool first_blood::load_model()
     {
         lum[i]->load_model();
     }
+
+    // saving only the elements and variables listed in the output file
+    if(output_file != "")
+    {
+        load_ok = load_output_csv(model_file_path(input_folder_path, output_file + ".csv"));
+    }
     return load_ok;
 }
 
@@ -61,21 +68,16 @@ bool first_blood::load_main_csv()
 {
     load_ok = false;
 
+    // composed with the base models if main.csv has a base line
     string file_path = input_folder_path + "/main.csv";
-    ifstream file_in;
-    file_in.open(file_path);
-    string line;
+    vector<string> lines;
 
-    if(file_in.is_open())
+    if(read_model_lines(input_folder_path, "main.csv", lines))
     {
         int nm=0,nl=0,nn=0;
-        while(getline(file_in,line))
+        for(unsigned int l=0; l<lines.size(); l++)
         {
-            line.erase(remove(line.begin(), line.end(), ' '), line.end());
-            line.erase(remove(line.begin(), line.end(), '\n'), line.end());
-            line.erase(remove(line.begin(), line.end(), '\r'), line.end());
-
-            vector<string> sv = separate_line(line);
+            vector<string> sv = separate_line(lines[l]);
 
             if(sv.size() == 0) continue;
 
@@ -108,6 +110,51 @@ bool first_blood::load_main_csv()
                 else if(sv[1] == "moc") solver_type = 1;
                 else solver_type = 0;
             }
+            else if(sv[0] == "output")
+            {
+                output_file = sv[1];
+            }
+            else if(sv[0] == "history")
+            {
+                history_periods = stoi(sv[1]);
+            }
+            else if(sv[0] == "periodic")
+            {
+                is_periodic_run = true;
+                if(sv.size()>1) time_end_min = stod(sv[1],0);
+                if(sv.size()>2) time_end_max = stod(sv[2],0);
+                if(sv.size()>3) probe_cycles = stoi(sv[3]);
+            }
+            else if(sv[0] == "probe")
+            {
+                add_probe(sv[1],sv[2],sv[3],sv[4],sv.size()>5 ? stod(sv[5],0) : 1.e-3);
+            }
+            else if(sv[0] == "init")
+            {
+                init_from_file = true;
+            }
+            else if(sv[0] == "newton")
+            {
+                if(sv[1] == "dense") newton_solver = 0;
+                else newton_solver = 1;
+                if(sv.size()>2) jac_tolerance = stod(sv[2],0);
+            }
+            else if(sv[0] == "threads")
+            {
+                number_of_threads = max(1, stoi(sv[1]));
+            }
+            else if(sv[0] == "linear_lumped")
+            {
+                do_linear_lumped = !(sv.size()>1 && (sv[1] == "off" || sv[1] == "0" || sv[1] == "false"));
+            }
+            else if(sv[0] == "save")
+            {
+                if(sv[1] == "binary") save_format = 1;
+                else if(sv[1] == "archive") save_format = 2;
+                else save_format = 0;
+                if(sv.size()>2 && sv[2] == "float32") save_bytes = 4;
+                else save_bytes = 8;
+            }
             else if(sv[0] == "moc")
             {
                 moc.push_back(new solver_moc(sv[1],input_folder_path));
@@ -166,7 +213,6 @@ bool first_blood::load_main_csv()
         }
     }
 
-    file_in.close();
     return load_ok;
 }
 
@@ -198,6 +244,7 @@ bool first_blood::run()
 			}	
 
 			// finding lowest new timestep
+			build_event_queue();
 			double t_act = lowest_new_time(moc_idx, e_idx);
 			double t_old = -1.e10;
 
@@ -225,53 +272,37 @@ bool first_blood::run()
 					autoregulation();
 				}*/
 
-				// solving lowest edge inner points
-				if(solver_type == 0)
+				if(number_of_threads>1 && collect_batch()>1)
 				{
-					moc[moc_idx]->edges[e_idx]->solve_maccormack();
+					if(workers.empty())
+					{
+						start_workers();
+					}
+					// independent edges from t_act on, advanced together
+					is_run_ok = advance_batch();
+					t_old = batch_time.back();
 				}
-				else if(solver_type == 1)
+				else
 				{
-					moc[moc_idx]->edges[e_idx]->solve_moc();
-				}
-
-				// boundaries (inner)
-				moc[moc_idx]->boundaries(e_idx, t_act);
+					is_run_ok = advance_edge(moc_idx, e_idx, t_act);
 
-				// boundaries with 0D if exist
-				int si = moc[moc_idx]->edges[e_idx]->node_index_start;
-				if(moc[moc_idx]->nodes[si]->is_master_node)
-				{
-					int lum_idx = moc[moc_idx]->nodes[si]->master_node_lum;
-					solve_lum_newton(lum_idx, t_act);
-				}
+					// periodicity probes
+					if(is_periodic_run && probes.size()>0)
+					{
+						update_probes(moc_idx, e_idx, t_act);
+					}
 
-				int ei = moc[moc_idx]->edges[e_idx]->node_index_end;
-				if(moc[moc_idx]->nodes[ei]->is_master_node)
-				{
-					int lum_idx = moc[moc_idx]->nodes[ei]->master_node_lum;
-					solve_lum_newton(lum_idx, t_act);
-				}
+					// get the time average values, e.g MAP
+					//if(moc[moc_idx]->edges[e_idx]->ID == "A1")
+					//{
+					//	calculate_time_average();
+					//}
 
-				// postproc: interpolate, save
-				moc[moc_idx]->edges[e_idx]->update();
-				//moc[moc_idx]->edges[e_idx]->update_variables();
-				if(moc[moc_idx]->edges[e_idx]->do_save_memory)
-				{
-					moc[moc_idx]->edges[e_idx]->save_field_variables();
+					t_old = t_act;
+					update_event(moc_idx, e_idx);
 				}
 
-				// get the time average values, e.g MAP
-				//if(moc[moc_idx]->edges[e_idx]->ID == "A1")
-				//{
-				//	calculate_time_average();
-				//}
-
-				// new timestep
-				is_run_ok = moc[moc_idx]->edges[e_idx]->new_timestep();
-
-				// find new lowest timestep
-				t_old = t_act;
+				// find new lowest timestep, only the advanced edges have a new time
 				t_act = lowest_new_time(moc_idx, e_idx);
 
 				// decreasing time_counter if it passed t_end
@@ -281,8 +312,16 @@ bool first_blood::run()
 				}
 
 				// update the period
+				int period_old = period;
 				period = floor(t_act/time_period);
+
+				// keeping only the last history_periods periods in memory
+				if(history_periods>0 && period>period_old)
+				{
+					trim_history((period-history_periods)*time_period);
+				}
 			}
+			stop_workers();
 		}
 		else // only LUMPED MODEL without any moc
 		{
@@ -297,6 +336,13 @@ bool first_blood::run()
 			{
 				t_act = lum[0]->time.back() + dt_lumped;
 				solve_lum_newton(0, t_act);
+
+				int period_old = period;
+				period = floor(t_act/time_period);
+				if(history_periods>0 && period>period_old)
+				{
+					trim_history((period-history_periods)*time_period);
+				}
 			}
 		}
 	}
@@ -304,23 +350,352 @@ bool first_blood::run()
 	return is_run_ok;
 }
 
+//--------------------------------------------------------------
+bool first_blood::advance_edge(int moc_idx, int e_idx, double t_act)
+{
+	// solving lowest edge inner points
+	if(solver_type == 0)
+	{
+		moc[moc_idx]->edges[e_idx]->solve_maccormack();
+	}
+	else if(solver_type == 1)
+	{
+		moc[moc_idx]->edges[e_idx]->solve_moc();
+	}
+
+	// boundaries (inner)
+	moc[moc_idx]->boundaries(e_idx, t_act);
+
+	// boundaries with 0D if exist
+	int si = moc[moc_idx]->edges[e_idx]->node_index_start;
+	if(moc[moc_idx]->nodes[si]->is_master_node)
+	{
+		int lum_idx = moc[moc_idx]->nodes[si]->master_node_lum;
+		solve_lum_newton(lum_idx, t_act);
+	}
+
+	int ei = moc[moc_idx]->edges[e_idx]->node_index_end;
+	if(moc[moc_idx]->nodes[ei]->is_master_node)
+	{
+		int lum_idx = moc[moc_idx]->nodes[ei]->master_node_lum;
+		solve_lum_newton(lum_idx, t_act);
+	}
+
+	// postproc: interpolate, save
+	moc[moc_idx]->edges[e_idx]->update();
+	//moc[moc_idx]->edges[e_idx]->update_variables();
+	moc[moc_idx]->edges[e_idx]->save_field_variables();
+
+	// new timestep
+	return moc[moc_idx]->edges[e_idx]->new_timestep();
+}
+
+//--------------------------------------------------------------
+void first_blood::trim_history(double t_keep)
+{
+	for(int i=0; i<number_of_moc; i++)
+	{
+		for(int j=0; j<moc[i]->number_of_edges; j++)
+		{
+			moc[i]->edges[j]->trim_history(t_keep);
+		}
+		for(int j=0; j<moc[i]->number_of_nodes; j++)
+		{
+			moc[i]->nodes[j]->trim_history(t_keep);
+		}
+	}
+	for(int i=0; i<number_of_lum; i++)
+	{
+		lum[i]->trim_history(t_keep);
+	}
+}
+
 //--------------------------------------------------------------
 double first_blood::lowest_new_time(int &moc_idx, int &e_idx)
 {
-	double t_act=1.e10;
-	int idx;
+	if(event_heap.size() == 0)
+	{
+		return 1.e10;
+	}
+	int k = event_heap[0];
+	moc_idx = event_moc[k];
+	e_idx = event_edge[k];
+	return event_time[k];
+}
+
+//--------------------------------------------------------------
+void first_blood::build_event_queue()
+{
+	event_moc.clear();
+	event_edge.clear();
+	event_time.clear();
+	event_first.clear();
 	for(int i=0; i<number_of_moc; i++)
 	{
-		double t = moc[i]->min_time(idx);
-		if(t<t_act)
+		event_first.push_back(event_moc.size());
+		for(int j=0; j<moc[i]->number_of_edges; j++)
 		{
-			t_act = t;
-			moc_idx = i;
-			e_idx = idx;
+			event_moc.push_back(i);
+			event_edge.push_back(j);
+			event_time.push_back(moc[i]->edges[j]->time.back() + moc[i]->edges[j]->dt_act);
 		}
 	}
 
-	return t_act;
+	// conflict keys of the parallel mode: every moc node, then every lumped model
+	event_node_first.clear();
+	int n_keys = 0;
+	for(int i=0; i<number_of_moc; i++)
+	{
+		event_node_first.push_back(n_keys);
+		n_keys += moc[i]->number_of_nodes;
+	}
+	event_lock.assign(n_keys + number_of_lum, -1);
+
+	int n = event_time.size();
+	event_heap.resize(n);
+	event_pos.resize(n);
+	for(int k=0; k<n; k++)
+	{
+		event_heap[k] = k;
+		event_pos[k] = k;
+	}
+	for(int i=n/2-1; i>=0; i--)
+	{
+		event_sift_down(i);
+	}
+}
+
+//--------------------------------------------------------------
+void first_blood::update_event(int moc_idx, int e_idx)
+{
+	int k = event_first[moc_idx] + e_idx;
+	event_time[k] = moc[moc_idx]->edges[e_idx]->time.back() + moc[moc_idx]->edges[e_idx]->dt_act;
+	// an edge only moves forward in time, its event can only go down
+	event_sift_down(event_pos[k]);
+}
+
+//--------------------------------------------------------------
+int first_blood::collect_batch()
+{
+	batch_moc.clear();
+	batch_edge.clear();
+	batch_time.clear();
+
+	// only within one period and before the end, where the serial loop does nothing but advancing:
+	// no trim_history, no period check of is_run_end, no time_counter change
+	double t_first = event_time[event_heap[0]];
+	double t_low = floor(t_first/time_period)*time_period;
+	double t_high = t_low + time_period;
+	if(t_first <= t_low)
+	{
+		return 0;
+	}
+	if(is_periodic_run)
+	{
+		t_high = min(t_high, time_end_max);
+		if(probe_period >= 0) // probes_periodic is checked at every step
+		{
+			return 0;
+		}
+	}
+	else
+	{
+		t_high = min(t_high, time_end);
+	}
+
+	// events in the order of the queue (best first through the heap), an event conflicting with an earlier
+	// one is left for later and its keys are locked too, so no later event overtakes it that depends on it
+	batch_count++;
+	auto later = [this](int a, int b){ return event_before(event_heap[b], event_heap[a]); };
+	vector<int> front{0};
+	int n_scanned = 0;
+	while(front.size()>0 && batch_moc.size()<64 && n_scanned<128)
+	{
+		n_scanned++;
+		pop_heap(front.begin(), front.end(), later);
+		int pos = front.back();
+		front.pop_back();
+		int k = event_heap[pos];
+		if(event_time[k] >= t_high)
+		{
+			break;
+		}
+
+		int mi = event_moc[k], ej = event_edge[k];
+		vector<int> keys;
+		int node_index[2] = {moc[mi]->edges[ej]->node_index_start, moc[mi]->edges[ej]->node_index_end};
+		for(int j=0; j<2; j++)
+		{
+			keys.push_back(event_node_first[mi] + node_index[j]);
+			if(moc[mi]->nodes[node_index[j]]->is_master_node)
+			{
+				keys.push_back(event_lock.size() - number_of_lum + moc[mi]->nodes[node_index[j]]->master_node_lum);
+			}
+		}
+		bool is_free = true;
+		for(int j=0; j<keys.size(); j++)
+		{
+			is_free = is_free && event_lock[keys[j]] != batch_count;
+		}
+		for(int j=0; j<keys.size(); j++)
+		{
+			event_lock[keys[j]] = batch_count;
+		}
+		if(is_free)
+		{
+			batch_moc.push_back(mi);
+			batch_edge.push_back(ej);
+			batch_time.push_back(event_time[k]);
+		}
+
+		for(int c=2*pos+1; c<=2*pos+2 && c<event_heap.size(); c++)
+		{
+			front.push_back(c);
+			push_heap(front.begin(), front.end(), later);
+		}
+	}
+	return batch_moc.size();
+}
+
+//--------------------------------------------------------------
+bool first_blood::advance_batch()
+{
+	batch_ok.assign(batch_moc.size(), 1);
+	batch_next = 0;
+	batch_finished = 0;
+	batch_id.fetch_add(1, memory_order_release);
+	{
+		// the sleeping workers either saw the new batch_id or are waiting already
+		lock_guard<mutex> lock(batch_mutex);
+	}
+	batch_cv.notify_all();
+
+	// the main thread takes its share too, then waits for every worker
+	advance_batch_items();
+	int spins = 0;
+	while(batch_finished.load(memory_order_acquire) < workers.size())
+	{
+		if(++spins > 1000)
+		{
+			this_thread::yield();
+		}
+	}
+
+	// serial order again for the probes and the queue
+	bool is_ok = true;
+	for(int i=0; i<batch_moc.size(); i++)
+	{
+		if(is_periodic_run && probes.size()>0)
+		{
+			update_probes(batch_moc[i], batch_edge[i], batch_time[i]);
+		}
+		update_event(batch_moc[i], batch_edge[i]);
+		is_ok = is_ok && batch_ok[i];
+	}
+	return is_ok;
+}
+
+//--------------------------------------------------------------
+void first_blood::advance_batch_items()
+{
+	int i;
+	while((i = batch_next.fetch_add(1)) < batch_moc.size())
+	{
+		batch_ok[i] = advance_edge(batch_moc[i], batch_edge[i], batch_time[i]);
+	}
+}
+
+//--------------------------------------------------------------
+void first_blood::worker_loop()
+{
+	long seen = 0; // start_workers set it before the threads started
+	while(true)
+	{
+		int spins = 0;
+		while(batch_id.load(memory_order_acquire) == seen)
+		{
+			if(++spins > worker_spins)
+			{
+				unique_lock<mutex> lock(batch_mutex);
+				batch_cv.wait(lock, [&]{ return batch_id.load(memory_order_acquire) != seen; });
+			}
+			else if(spins > 1000)
+			{
+				this_thread::yield();
+			}
+		}
+		seen = batch_id.load(memory_order_acquire);
+		if(workers_stop)
+		{
+			return;
+		}
+		advance_batch_items();
+		batch_finished.fetch_add(1, memory_order_release);
+	}
+}
+
+//--------------------------------------------------------------
+void first_blood::start_workers()
+{
+	workers_stop = false;
+	batch_id = 0;
+	for(int i=1; i<number_of_threads; i++)
+	{
+		workers.push_back(thread(&first_blood::worker_loop, this));
+	}
+}
+
+//--------------------------------------------------------------
+void first_blood::stop_workers()
+{
+	workers_stop = true;
+	batch_id.fetch_add(1, memory_order_release);
+	{
+		lock_guard<mutex> lock(batch_mutex);
+	}
+	batch_cv.notify_all();
+	for(int i=0; i<workers.size(); i++)
+	{
+		workers[i].join();
+	}
+	workers.clear();
+}
+
+//--------------------------------------------------------------
+bool first_blood::event_before(int a, int b)
+{
+	// same order as a linear scan: lower time, then lower moc and edge index
+	if(event_time[a] != event_time[b])
+	{
+		return event_time[a] < event_time[b];
+	}
+	return a < b;
+}
+
+//--------------------------------------------------------------
+void first_blood::event_swap(int i, int j)
+{
+	swap(event_heap[i], event_heap[j]);
+	event_pos[event_heap[i]] = i;
+	event_pos[event_heap[j]] = j;
+}
+
+//--------------------------------------------------------------
+void first_blood::event_sift_down(int i)
+{
+	int n = event_heap.size();
+	while(true)
+	{
+		int l = 2*i+1, r = 2*i+2, m = i;
+		if(l<n && event_before(event_heap[l], event_heap[m])) m = l;
+		if(r<n && event_before(event_heap[r], event_heap[m])) m = r;
+		if(m == i)
+		{
+			return;
+		}
+		event_swap(i, m);
+		i = m;
+	}
 }
 
 //--------------------------------------------------------------
@@ -347,8 +722,17 @@ void first_blood::solve_lum_newton(int index, double t_act)
 		moc[moc_index]->initialization_newton(lum[index]->x,N,moc_edge_index,edge_end);
 	}
 
+	// linear models with one moc boundary (e.g. Windkessel outlets): one scalar equation instead of the Newton system
+	if(do_linear_lumped && lum[index]->is_linear)
+	{
+		solve_lum_linear(index, t_act);
+		substitute_lum_newton(index, t_act);
+		return;
+	}
+
 	// start of newton iteration
 	int i=0;
+	double f_norm_old=0.;
 	do
 	{
 		lum[index]->coefficients_newton(t_act);
@@ -396,7 +780,18 @@ void first_blood::solve_lum_newton(int index, double t_act)
 		// cout << "f" << endl << lum[index]->f << endl;
 
 		// actually solving the Newton's technique
-		VectorXd dx = lum[index]->Jac.colPivHouseholderQr().solve(-lum[index]->f);
+		// sparse: chord steps with an earlier LU, refactorising if |f| did not halve since the last step
+		VectorXd dx;
+		double f_norm = lum[index]->f.norm();
+		if(newton_solver == 0)
+		{
+			dx = lum[index]->Jac.colPivHouseholderQr().solve(-lum[index]->f);
+		}
+		else
+		{
+			dx = lum[index]->newton_step(i>0 && f_norm>0.5*f_norm_old, jac_tolerance);
+		}
+		f_norm_old = f_norm;
 		lum[index]->x += dx;
 
 		//cout << " ITERATION END " << endl;
@@ -417,6 +812,66 @@ void first_blood::solve_lum_newton(int index, double t_act)
 		exit(-1);
 	}
 
+	substitute_lum_newton(index, t_act);
+}
+
+//--------------------------------------------------------------
+void first_blood::solve_lum_linear(int index, double t_act)
+{
+	int m = lum[index]->number_of_edges;
+	int n = lum[index]->number_of_nodes;
+	int l = lum[index]->number_of_elastance;
+	int N = m+n+2*l; // index of the moc flow rate q in x
+
+	int moc_index = lum[index]->boundary_indices[0][0];
+	int moc_edge_index = lum[index]->boundary_indices[0][1];
+	int edge_end = lum[index]->boundary_indices[0][2];
+
+	// lumped part exactly: the pressure of the boundary node is affine in q
+	lum[index]->coefficients_newton(t_act);
+	double p0, dp_dq; // mmHg, mmHg/(m3/s)
+	lum[index]->boundary_law(edge_end*1.e6, p0, dp_dq);
+
+	// characteristic equation in q only, same stopping rule as the Newton system
+	double q = lum[index]->x(N);
+	int i=0;
+	double f_char;
+	do
+	{
+		double p = (p0 + dp_dq*q)*mmHg_to_Pa;
+		vector<double> v; // f_char,dchar_dp,dchard_dq
+		if(edge_end==1)
+		{
+			v = moc[moc_index]->edges[moc_edge_index]->boundary_newton_end(q,p,t_act);
+		}
+		else
+		{
+			v = moc[moc_index]->edges[moc_edge_index]->boundary_newton_start(q,p,t_act);
+		}
+		f_char = v[0];
+		q -= v[0]/(v[2] + v[1]*mmHg_to_Pa*dp_dq);
+		i++;
+	}
+	while(fabs(f_char) > 1e-5 && i<100);
+
+	if(i>=100)
+	{
+		cout << "\n !!! ERROR !!! Characteristic equation did NOT converge at linear Lum model " << lum[index]->name << endl;
+		cout << "q: " << q << " f: " << f_char << endl;
+		exit(-1);
+	}
+
+	lum[index]->linear_update(edge_end*1.e6, q);
+	lum[index]->x(N) = q;
+}
+
+//--------------------------------------------------------------
+void first_blood::substitute_lum_newton(int index, double t_act)
+{
+	int m = lum[index]->number_of_edges;
+	int n = lum[index]->number_of_nodes;
+	int l = lum[index]->number_of_elastance;
+
 	// substitute the results back to 0D
 	lum[index]->substitute_newton(t_act);
 
@@ -520,6 +975,16 @@ bool first_blood::is_run_end(double t_act, double t_old)
 		}
 		else
 		{
+			// probes: the last cycle is checked as soon as every probe closed it
+			if(probe_period>=0)
+			{
+				if(probes_periodic())
+				{
+					time_end = t_act;
+					return true;
+				}
+			}
+
 			int n=0;
 			double t = t_act;
 			while(t >= time_period)
@@ -531,6 +996,12 @@ bool first_blood::is_run_end(double t_act, double t_old)
  			// checking the end of a cycle
  			if((double)n*time_period>=t_old && (double)n*time_period<t_act)
  			{
+				if(probes.size()>0)
+				{
+					probe_period = n-1;
+					return false;
+				}
+
 				int idx = moc[0]->node_id_to_index(time_node);
 				if(idx<0)
 				{
@@ -577,6 +1048,116 @@ bool first_blood::is_run_end(double t_act, double t_old)
 	}
 }
 
+//--------------------------------------------------------------
+void first_blood::add_probe(string model, string kind, string element, string variable, double tolerance)
+{
+	probe p;
+	p.model = model;
+	p.kind = kind;
+	p.element = element;
+	p.variable = variable;
+	p.tolerance = tolerance;
+	probes.push_back(p);
+}
+
+//--------------------------------------------------------------
+void first_blood::set_probes()
+{
+	probe_period = -1;
+	for(int j=0; j<probes.size(); j++)
+	{
+		probe &p = probes[j];
+		p.check = periodicity(time_period, probe_cycles, probe_bins);
+		p.moc_index = -1;
+		p.index = -1;
+		p.value = NULL;
+		for(int i=0; i<number_of_moc; i++)
+		{
+			if(moc[i]->name != p.model) continue;
+			p.moc_index = i;
+			if(p.kind == "edge")
+			{
+				for(int k=0; k<moc[i]->number_of_edges; k++)
+				{
+					if(moc[i]->edges[k]->ID == p.element) p.index = k;
+				}
+				if(p.index<0) break;
+				// field_variables() is in the order of edge_columns without time
+				vector<string> &names = moc[i]->edge_columns;
+				int k = find(names.begin()+1, names.end(), p.variable) - names.begin() - 1;
+				if(k<names.size()-1)
+				{
+					p.value = moc[i]->edges[p.index]->field_variables()[k];
+				}
+			}
+			else
+			{
+				for(int k=0; k<moc[i]->number_of_nodes; k++)
+				{
+					if(moc[i]->nodes[k]->name == p.element) p.index = k;
+				}
+				if(p.index<0) break;
+				if(p.variable == "pressure") p.value = &moc[i]->nodes[p.index]->pressure;
+				else if(p.variable == "volume_flow_rate") p.value = &moc[i]->nodes[p.index]->volume_flow_rate;
+			}
+		}
+		if(p.value == NULL)
+		{
+			cout << "\n!!!WARNING!!!\n first_blood::set_probes function\n Probe is not existing: " << p.model << "," << p.kind << "," << p.element << "," << p.variable << "\n It is left out, continouing..." << endl;
+			probes.erase(probes.begin()+j);
+			j--;
+		}
+	}
+}
+
+//--------------------------------------------------------------
+void first_blood::update_probes(int moc_idx, int e_idx, double t_act)
+{
+	int si = moc[moc_idx]->edges[e_idx]->node_index_start;
+	int ei = moc[moc_idx]->edges[e_idx]->node_index_end;
+	for(int j=0; j<probes.size(); j++)
+	{
+		probe &p = probes[j];
+		if(p.moc_index != moc_idx) continue;
+		bool solved = p.kind == "edge" ? p.index == e_idx : (p.index == si || p.index == ei);
+		if(solved)
+		{
+			p.check.update(t_act, p.value->back());
+		}
+	}
+}
+
+//--------------------------------------------------------------
+bool first_blood::probes_periodic()
+{
+	for(int j=0; j<probes.size(); j++)
+	{
+		if(probes[j].check.period <= probe_period)
+		{
+			return false; // not closed yet, checking again at the next time step
+		}
+	}
+
+	bool is_periodic = true;
+	double rel_max = 0.;
+	for(int j=0; j<probes.size(); j++)
+	{
+		double rel = probes[j].check.relative_rms();
+		if(rel<0. || rel>probes[j].tolerance)
+		{
+			is_periodic = false;
+		}
+		rel_max = max(rel_max, rel);
+	}
+	probe_period = -1;
+
+	if(is_periodic)
+	{
+		cout << " periodic after " << probes[0].check.period << " periods, largest relative RMS of the probes: " << rel_max << endl;
+	}
+	return is_periodic;
+}
+
 //--------------------------------------------------------------
 void first_blood::initialization()
 {
@@ -585,6 +1166,7 @@ void first_blood::initialization()
 	number_of_lum = lum.size();
 	number_of_nodes = nodes.size();
 	time_counter = 0;
+	period = 0;
 
 	// setting initial conditions
 	for(int i=0; i<number_of_moc; i++)
@@ -620,9 +1202,16 @@ void first_blood::initialization()
 		{
 			vector<string> el, nl{time_node};
 		   set_save_memory(moc[0]->name,"moc",el,nl);
+			moc[0]->nodes[idx]->save_variable[0] = true;
 		}
 	}
 
+	// periodicity probes
+	if(is_periodic_run)
+	{
+		set_probes();
+	}
+
 	// saving these for time average vectors
 	// vector<string> el{"A1","A5","A6","A15","A20"}, nl;
 	// set_save_memory(moc[0]->name,"moc",el,nl);
@@ -680,11 +1269,12 @@ void first_blood::build_master()
 //--------------------------------------------------------------
 void first_blood::save_results()
 {
-   mkdir("results",0777);
-   mkdir(("results/" + case_name).c_str(),0777);
-
    string folder_name = case_name;
 
+	set_save_format(folder_name);
+   mkdir("results",0777);
+   if(save_format != 2) mkdir(("results/" + folder_name).c_str(),0777);
+
 	// saving the results of moc models
 	for(int i=0; i<number_of_moc; i++)
 	{
@@ -697,6 +1287,8 @@ void first_blood::save_results()
 		lum[i]->save_results(folder_name);
 	}
 
+	save_manifest(folder_name, 0.);
+
 	// saving time averages, e.g. map, cfr
 	// save_time_average("results/" + folder_name);
 }
@@ -704,8 +1296,9 @@ void first_blood::save_results()
 //--------------------------------------------------------------
 void first_blood::save_results(string folder_name)
 {
+	set_save_format(folder_name);
    mkdir("results",0777);
-   mkdir(("results/" + folder_name).c_str(),0777);
+   if(save_format != 2) mkdir(("results/" + folder_name).c_str(),0777);
 
 	// saving the results of moc models
 	for(int i=0; i<number_of_moc; i++)
@@ -719,6 +1312,8 @@ void first_blood::save_results(string folder_name)
 		lum[i]->save_results(folder_name);
 	}
 
+	save_manifest(folder_name, 0.);
+
 	// saving time averages, e.g. map, cfr
 	// save_time_average("results/" + folder_name);
 }
@@ -726,11 +1321,12 @@ void first_blood::save_results(string folder_name)
 //--------------------------------------------------------------
 void first_blood::save_results(double dt)
 {
-   mkdir("results",0777);
-   mkdir(("results/" + case_name).c_str(),0777);
-
    string folder_name = case_name;
 
+	set_save_format(folder_name);
+   mkdir("results",0777);
+   if(save_format != 2) mkdir(("results/" + folder_name).c_str(),0777);
+
 	// saving the results of moc models
 	for(int i=0; i<number_of_moc; i++)
 	{
@@ -743,6 +1339,8 @@ void first_blood::save_results(double dt)
 		lum[i]->save_results(dt, folder_name);
 	}
 
+	save_manifest(folder_name, dt);
+
 	// saving time averages, e.g. map, cfr
 	// save_time_average(dt, "results/" + folder_name);
 }
@@ -750,8 +1348,9 @@ void first_blood::save_results(double dt)
 //--------------------------------------------------------------
 void first_blood::save_results(double dt, string folder_name)
 {
+	set_save_format(folder_name);
    mkdir("results",0777);
-   mkdir(("results/" + folder_name).c_str(),0777);
+   if(save_format != 2) mkdir(("results/" + folder_name).c_str(),0777);
 
 	// saving the results of moc models
 	for(int i=0; i<number_of_moc; i++)
@@ -764,13 +1363,16 @@ void first_blood::save_results(double dt, string folder_name)
 	{
 		lum[i]->save_results(dt, folder_name);
 	}
+
+	save_manifest(folder_name, dt);
 }
 
 //--------------------------------------------------------------
 void first_blood::save_results(string folder_name, string model_name, string model_type, vector<string> edge_list, vector<string> node_list)
 {
+	set_save_format(folder_name);
    mkdir("results",0777);
-   mkdir(("results/" + folder_name).c_str(),0777);
+   if(save_format != 2) mkdir(("results/" + folder_name).c_str(),0777);
 
 	if(model_type == "moc")
 	{
@@ -792,13 +1394,16 @@ void first_blood::save_results(string folder_name, string model_name, string mod
 			}
 		}
 	}
+
+	save_manifest(folder_name, 0.);
 }
 
 //--------------------------------------------------------------
 void first_blood::save_results(double dt, string folder_name, string model_name, string model_type, vector<string> edge_list, vector<string> node_list)
 {
+	set_save_format(folder_name);
 	mkdir("results",0777);
-   mkdir(("results/" + folder_name).c_str(),0777);
+   if(save_format != 2) mkdir(("results/" + folder_name).c_str(),0777);
 
 	if(model_type == "moc")
 	{
@@ -820,6 +1425,176 @@ void first_blood::save_results(double dt, string folder_name, string model_name,
 			}
 		}
 	}
+
+	save_manifest(folder_name, dt);
+}
+
+//--------------------------------------------------------------
+void first_blood::start_stream(double dt)
+{
+	start_stream(dt, case_name);
+}
+
+//--------------------------------------------------------------
+void first_blood::start_stream(double dt, string folder_name)
+{
+	set_save_format(folder_name);
+	for(int i=0; i<number_of_moc; i++)
+	{
+		moc[i]->start_stream(dt, folder_name);
+	}
+}
+
+//--------------------------------------------------------------
+void first_blood::set_save_format(string folder_name)
+{
+	// one archive file per results folder, kept open so that several save_results calls can add to it
+	if(save_format == 2 && (archive == NULL || archive->run_name != folder_name))
+	{
+		delete archive;
+		mkdir("results",0777);
+		archive = new result_archive("results/" + folder_name + ".fba", folder_name);
+	}
+
+	for(int i=0; i<number_of_moc; i++)
+	{
+		moc[i]->save_format = save_format;
+		moc[i]->save_bytes = save_bytes;
+		moc[i]->archive = archive;
+	}
+	for(int i=0; i<number_of_lum; i++)
+	{
+		lum[i]->save_format = save_format;
+		lum[i]->save_bytes = save_bytes;
+		lum[i]->archive = archive;
+	}
+}
+
+//--------------------------------------------------------------
+void first_blood::save_manifest(string folder_name, double dt)
+{
+	// json listing every saved file, its columns and the run parameters, so the results can be opened without scanning the folders
+	string manifest = manifest_json(dt);
+
+	if(save_format == 2)
+	{
+		if(archive != NULL)
+		{
+			archive->write_index(manifest);
+		}
+		return;
+	}
+
+	string file_name = "results/" + folder_name + "/manifest.json";
+	FILE *out_file = fopen(file_name.c_str(),"w");
+	if(out_file == NULL)
+	{
+		cout << "! ERROR !" << endl << " File could not be opened in save_manifest() function!!! file: " << file_name << endl;
+		return;
+	}
+	fprintf(out_file, "%s", manifest.c_str());
+	fclose(out_file);
+}
+
+//--------------------------------------------------------------
+string first_blood::manifest_json(double dt)
+{
+	string ext = "";
+	string format = "archive";
+	if(save_format == 0)
+	{
+		ext = ".txt";
+		format = "text";
+	}
+	else if(save_format == 1)
+	{
+		ext = ".bin";
+		format = "binary";
+	}
+
+	ostringstream out;
+	out << scientific << setprecision(7);
+	out << "{\n";
+	out << "  \"case\": \"" << case_name << "\",\n";
+	out << "  \"format\": \"" << format << "\",\n";
+	out << "  \"bytes\": " << (save_format == 0 ? 0 : save_bytes) << ",\n";
+	out << "  \"save_dt\": " << dt << ",\n";
+	out << "  \"time_end\": " << time_end << ",\n";
+	out << "  \"time_period\": " << time_period << ",\n";
+	out << "  \"periods\": " << (int)floor(time_end/time_period) << ",\n";
+	out << "  \"solver_type\": " << solver_type << ",\n";
+	out << "  \"material_type\": " << material_type << ",\n";
+	// the columns of the elements below are a selection of this file, not the full layout
+	out << "  \"output\": \"" << output_selection << "\",\n";
+
+	// units of every variable name appearing in the files
+	vector<string> variables;
+	for(int i=0; i<number_of_moc; i++)
+	{
+		variables.insert(variables.end(), moc[i]->edge_columns.begin(), moc[i]->edge_columns.end());
+		variables.insert(variables.end(), moc[i]->node_columns.begin(), moc[i]->node_columns.end());
+	}
+	for(int i=0; i<number_of_lum; i++)
+	{
+		variables.insert(variables.end(), lum[i]->node_columns.begin(), lum[i]->node_columns.end());
+		variables.insert(variables.end(), lum[i]->edge_columns.begin(), lum[i]->edge_columns.end());
+	}
+	out << "  \"units\": {";
+	vector<string> written;
+	for(unsigned int i=0; i<variables.size(); i++)
+	{
+		if(find(written.begin(), written.end(), variables[i]) == written.end())
+		{
+			out << (written.size()>0 ? ", " : "") << "\"" << variables[i] << "\": \"" << variable_unit(variables[i]) << "\"";
+			written.push_back(variables[i]);
+		}
+	}
+	out << "},\n";
+
+	// models with their saved elements
+	out << "  \"models\": {";
+	bool first_model = true;
+	for(int i=0; i<number_of_moc+number_of_lum; i++)
+	{
+		string model_name, model_type;
+		vector<string> *elements, *types;
+		vector<vector<string> > *columns;
+		vector<int> *rows;
+		if(i<number_of_moc)
+		{
+			solver_moc *m = moc[i];
+			model_name = m->name; model_type = "moc";
+			elements = &m->saved_elements; types = &m->saved_types; rows = &m->saved_rows;
+			columns = &m->saved_columns;
+		}
+		else
+		{
+			solver_lumped *m = lum[i-number_of_moc];
+			model_name = m->name; model_type = "lumped";
+			elements = &m->saved_elements; types = &m->saved_types; rows = &m->saved_rows;
+			columns = &m->saved_columns;
+		}
+		if(elements->size() == 0)
+		{
+			continue;
+		}
+
+		out << (first_model ? "" : ",") << "\n    \"" << model_name << "\": {\n      \"type\": \"" << model_type << "\",\n      \"elements\": {";
+		first_model = false;
+		for(unsigned int j=0; j<elements->size(); j++)
+		{
+			out << (j>0 ? "," : "") << "\n        \"" << elements->at(j) << "\": {\"type\": \"" << types->at(j) << "\", \"file\": \"" << model_name << "/" << elements->at(j) << ext << "\", \"rows\": " << rows->at(j) << ", \"columns\": {";
+			for(unsigned int k=0; k<columns->at(j).size(); k++)
+			{
+				out << (k>0 ? ", " : "") << "\"" << columns->at(j)[k] << "\": " << k;
+			}
+			out << "}}";
+		}
+		out << "\n      }\n    }";
+	}
+	out << "\n  }\n}\n";
+
+	return out.str();
 }
 
 //--------------------------------------------------------------
@@ -926,6 +1701,82 @@ void first_blood::set_save_memory(string model_name, string model_type, vector<s
 	}
 }
 
+//--------------------------------------------------------------
+bool first_blood::load_output_csv(string file_path)
+{
+	ifstream file_in;
+	file_in.open(file_path);
+	if(!file_in.is_open())
+	{
+		cout << "! ERROR !" << endl << " File is not open when calling load_output_csv() function!!! file: " << file_path << "\n" << endl;
+		return false;
+	}
+
+	// only the listed elements are saved from now on
+	clear_save_memory();
+	output_selection = file_path;
+
+	string line;
+	while(getline(file_in,line))
+	{
+		line.erase(remove(line.begin(), line.end(), ' '), line.end());
+		line.erase(remove(line.begin(), line.end(), '\r'), line.end());
+
+		vector<string> sv = separate_line(line);
+		if(sv.size() < 4 || (sv[0] != "moc" && sv[0] != "lum" && sv[0] != "lumped")) continue;
+
+		// moc,model,edge|node,ID[,variables...] or lum,model,edge|node,ID
+		vector<string> el, nl;
+		if(sv[2] == "edge") el.push_back(sv[3]);
+		else nl.push_back(sv[3]);
+		set_save_memory(sv[1],sv[0],el,nl);
+
+		if(sv[0] != "moc") continue;
+
+		for(int i=0; i<number_of_moc; i++)
+		{
+			if(moc[i]->name != sv[1]) continue;
+
+			// empty variable list: every variable of the element
+			vector<string> *names;
+			vector<bool> *flags;
+			if(sv[2] == "edge")
+			{
+				int idx = moc[i]->edge_id_to_index(sv[3]);
+				if(idx<0) continue;
+				names = &moc[i]->edge_columns;
+				flags = &moc[i]->edges[idx]->save_variable;
+			}
+			else
+			{
+				int idx = moc[i]->node_id_to_index(sv[3]);
+				if(idx<0) continue;
+				names = &moc[i]->node_columns;
+				flags = &moc[i]->nodes[idx]->save_variable;
+			}
+			for(int k=0; k<flags->size(); k++)
+			{
+				(*flags)[k] = sv.size() == 4;
+			}
+			for(int j=4; j<sv.size(); j++)
+			{
+				int k = find(names->begin()+1, names->end(), sv[j]) - names->begin() - 1;
+				if(k<flags->size())
+				{
+					(*flags)[k] = true;
+				}
+				else
+				{
+					cout << "\n!!!WARNING!!!\n first_blood::load_output_csv function\n Variable is not existing: " << sv[j] << " of " << sv[3] << "\n Continouing..." << endl;
+				}
+			}
+		}
+	}
+
+	file_in.close();
+	return true;
+}
+
 //--------------------------------------------------------------
 int first_blood::lum_id_to_index(string lum_id)
 {
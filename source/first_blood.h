@@ -30,6 +30,10 @@
 #include <fstream>
 #include <algorithm>
 #include <stdio.h>
+#include <thread>
+#include <atomic>
+#include <mutex>
+#include <condition_variable>
 
 using namespace Eigen;
 
@@ -54,8 +58,21 @@ public:
 	// solving lumped model as boundary condition
 	void solve_lum(int index, double dt);
 	void solve_lum_newton(int index, double dt);
-	// finding lowest time step level
+	void solve_lum_linear(int index, double t_act); // is_linear models: the lumped part solved exactly, Newton on the characteristic only
+	void substitute_lum_newton(int index, double t_act); // x of the lumped model back to its elements and to the moc edges
+	// finding lowest time step level, the top of the event queue
 	double lowest_new_time(int &moc_idx, int &e_idx);
+	// indexed binary heap of every moc edge keyed by its next time (time.back()+dt_act)
+	// build_event_queue after the initial timesteps, update_event after an edge advanced: only its key changes, O(log E)
+	void build_event_queue();
+	void update_event(int moc_idx, int e_idx);
+
+	// advancing one edge to t_act: inner points, boundaries (with the lumped models), saving, new time step
+	bool advance_edge(int moc_idx, int e_idx, double t_act);
+	// parallel mode, main.csv: threads,N (1: serial)
+	// the lowest events of the queue sharing no moc node and no lumped model are advanced together on
+	// number_of_threads threads, identical to the serial order as none of them reads what an other writes
+	int number_of_threads = 1;
 
 	// finding and setting the master nodes in every model
 	void build_master();
@@ -85,6 +102,11 @@ public:
 	// lumped time step if only lumped model exists
 	double dt_lumped = 1.e-3;
 
+	// Newton solver of the lumped models, main.csv: newton,sparse[,jac_tolerance] or newton,dense
+	int newton_solver = 1; // 0: dense QR in every iteration, 1: sparse LU reused while the Jacobian hardly changes
+	double jac_tolerance = 0.01; // relative change of a Jacobian entry forcing a new LU, 0: factorising every iteration
+	bool do_linear_lumped = true; // linear lumped models with one moc boundary without the Newton system, main.csv: linear_lumped,off
+
 	/// Loading the system from CSV
 	bool load_ok;
 	bool load_model();
@@ -93,13 +115,25 @@ public:
 	/// Saving results to file
 	void clear_save_memory(); // not saving anything to memory
 	void set_save_memory(string model_name, string model_type, vector<string> edge_list, vector<string> node_list);
+	string output_file = ""; // main.csv: output,file_name (without .csv) next to main.csv, see load_output_csv
+	bool load_output_csv(string file_path); // lines: moc,model,edge|node,ID[,variables...] or lum,model,edge|node,ID, only these are saved
+	string output_selection = ""; // file of the last load_output_csv, written into the manifest as "output"
 	double save_file_dt = 0.0; // time step of saving data in files, if 0, every data is saved
+	int save_format = 0; // 0: text (.txt), 1: binary (.bin), 2: single archive file (results/case_name.fba)
+	int save_bytes = 8; // size of one value in binary files, 8: float64, 4: float32
+	result_archive *archive = NULL; // open archive if save_format == 2
+	void set_save_format(string folder_name); // passing save_format and save_bytes (and the archive) to every model
 	void save_results(); // default folder name: case_name
 	void save_results(string folder_name);
 	void save_results(double dt); // default folder name: case_name
 	void save_results(double dt, string folder_name);
 	void save_results(string folder_name, string model_name, string model_type, vector<string> edge_list, vector<string> node_list); // saving specific time results to save time
 	void save_results(double dt, string folder_name, string model_name, string model_type, vector<string> edge_list, vector<string> node_list); // saving specific time results to save time
+	void save_manifest(string folder_name, double dt); // results/folder_name/manifest.json listing the saved files, called by save_results
+	string manifest_json(double dt); // content of the manifest, also stored in the archive
+	// streaming the moc edges to file during run() with bounded memory, call before run() and save_results(dt) after it
+	void start_stream(double dt); // default folder name: case_name
+	void start_stream(double dt, string folder_name);
 
 	// Saving full model
 	void save_model(string folder_name);
@@ -122,6 +156,25 @@ public:
 	double time_val_old = -1.e10;
 	bool is_run_end(double t_act, double t_old);
 
+	// periodicity probes, if there is any a periodic run ends when all of them are periodic instead of time_node/time_var
+	class probe
+	{
+	public:
+		string model, kind, element, variable; // e.g. arterial, node, H, pressure or arterial, edge, A70, volume_flow_rate_start
+		double tolerance; // of the relative RMS of the last probe_cycles cycles from their mean per its amplitude
+		int moc_index=-1, index=-1; // set by set_probes
+		vector<double> *value = NULL; // the recorded variable, its last value is sampled
+		periodicity check;
+	};
+	vector<probe> probes;
+	int probe_cycles = 3; // compared cycles
+	int probe_bins = 100; // phase bins per cycle
+	int probe_period = -1; // period waiting for its check, -1: none
+	void add_probe(string model, string kind, string element, string variable, double tolerance); // main.csv: probe,model,edge|node,ID,variable,tolerance
+	void set_probes(); // finding the elements and clearing the buffers, called by initialization
+	void update_probes(int moc_idx, int e_idx, double t_act); // sampling the probes of the solved edge and its nodes
+	bool probes_periodic(); // checking probe_period once every probe closed it
+
 	// lum model id to index
 	int lum_id_to_index(string lum_id);
 
@@ -131,6 +184,8 @@ public:
 	string case_name;
 
 	int period=0; // saving which period the calculation is
+	int history_periods = 0; // 0: keeping the full history in memory, K>0: only the last K periods (use K>=2 for periodic runs)
+	void trim_history(double t_keep); // dropping every saved value before t_keep
 	double heart_rate = 75.6; // from Charlton2019
 	double time_period = 60./heart_rate;
 
@@ -146,6 +201,38 @@ public:
 	void save_time_average(double dt, string folder_name);
 
 private:
+	// event queue of lowest_new_time: (moc, edge) of every event, heap of event indices, heap position of every event
+	vector<int> event_moc, event_edge, event_heap, event_pos;
+	vector<int> event_first; // index of the first event of every moc
+	vector<double> event_time;
+	bool event_before(int a, int b);
+	void event_swap(int i, int j);
+	void event_sift_down(int i);
+
+	// batch of independent events of the parallel mode, from the lowest time on
+	vector<int> batch_moc, batch_edge;
+	vector<double> batch_time;
+	vector<char> batch_ok;
+	vector<int> event_node_first; // index of the first moc node of every moc in event_lock, lumped models after the nodes
+	vector<int> event_lock; // number of the batch using the moc node / lumped model
+	int batch_count = 0;
+	int collect_batch(); // filling the batch, its size
+	bool advance_batch(); // advancing the batch on the threads, then the probes and the queue in serial order
+
+	// worker threads, started at the first batch of more than one edge
+	// between the batches they spin for worker_spins checks, then sleep on batch_cv until the next batch
+	vector<thread> workers;
+	atomic<int> batch_next, batch_finished;
+	atomic<long> batch_id;
+	atomic<bool> workers_stop;
+	mutex batch_mutex;
+	condition_variable batch_cv;
+	int worker_spins = 20000;
+	void start_workers();
+	void stop_workers();
+	void worker_loop();
+	void advance_batch_items();
+
 	// data of boundary for forward, and backward simulation
 	class boundary
 	{
@@ -9,7 +9,10 @@ moc_edge::moc_edge(string a_ID)
 }
 
 //--------------------------------------------------------------
-moc_edge::~moc_edge(){}
+moc_edge::~moc_edge()
+{
+	close_stream();
+}
 
 //--------------------------------------------------------------
 void moc_edge::print_input()
@@ -35,6 +38,7 @@ void moc_edge::initialization(double pressure_initial, int mat_type)
    mass_flow_rate_end.clear();
    time.clear();
    time.push_back(0.);
+   stream_ts = 0.;
 
    // setting material properties
 	material_type = mat_type;
@@ -53,6 +57,7 @@ void moc_edge::initialization(double pressure_initial, int mat_type)
 	A.clear();     A.resize(nx);
 	Anew.clear();  Anew.resize(nx);
 	x.clear();     x.resize(nx);
+	Astar.resize(nx); vstar.resize(nx); Fstar_1.resize(nx); Fstar_2.resize(nx);
 
 	// calculating the space coordinates and dx
 	dx = l/(nx-1);
@@ -60,15 +65,15 @@ void moc_edge::initialization(double pressure_initial, int mat_type)
 	{
 		x[i] = i*dx;
 	}
+	set_grid_constants();
 
 	// giving initial conditions
 	p.assign(nx,pressure_initial);
 	v.assign(nx,0.);
 	for(int i=0; i<nx; i++)
 	{	
-		double d;
-		A[i] = nominal_area(x[i],d);
-		a[i] = wave_speed(x[i],A[i]);
+		A[i] = An_x[i];
+		a[i] = wave_speed_at(i,A[i]);
 	}
 
 	// setting the geodetic height distribution
@@ -78,11 +83,8 @@ void moc_edge::initialization(double pressure_initial, int mat_type)
 		h[i] = hs + x[i]/l * (he-hs);
 	}
 
-	// saving initial conditions
-	if(do_save_memory)
-	{
-		save_field_variables();
-	}
+	// saving initial conditions, only the last values if not saved in time
+	save_field_variables();
 }
 
 //--------------------------------------------------------------
@@ -135,32 +137,31 @@ bool moc_edge::new_timestep()
 //--------------------------------------------------------------
 void moc_edge::solve_maccormack()
 {
-	double dp_dA, dp_dx, dF_dx;
-	double As = A[0] - dt_act/dx*(A[1]*v[1]-A[0]*v[0]);
-	double vs = v[0] - dt_act/dx*(v[1]*v[1]*.5 + p[1]/rho - v[0]*v[0]*.5 - p[0]/rho) + dt_act*(-8.*pi*nu*nu_f/A[0]*v[0]); // TODO: add gravity
-	double ps = pressure(x[0],As,dp_dA,dp_dx,dF_dx);
+	// predictor step Us = U_i - dt/dx*(F_i+1 - F_i) + dt*S_i and its flux at every point but the last one
+	for(unsigned int i=0; i<nx-1; i++)
+	{
+		Astar[i] = A[i] - dt_act/dx*(A[i+1]*v[i+1]-A[i]*v[i]);
+		vstar[i] = v[i] - dt_act/dx*(v[i+1]*v[i+1]*.5 + p[i+1]/rho - v[i]*v[i]*.5 - p[i]/rho) + dt_act*(-8.*pi*nu*nu_f/A[i]*v[i]); // TODO: add gravity to source
+	}
+	for(unsigned int i=0; i<nx-1; i++)
+	{
+		double dp_dA;
+		double ps = pressure_at(i,Astar[i],dp_dA);
+		Fstar_1[i] = Astar[i]*vstar[i];
+		Fstar_2[i] = vstar[i]*vstar[i]*.5 + ps/rho;
+	}
 
-	double Fs_L_1 = As*vs;
-	double Fs_L_2 = vs*vs*.5 + ps/rho;
-	// McCormack scheme
+	// corrector step Un+1 = .5*(Us+U_n) + dt/(2dx)*(Fs_i - Fs_i-1) + dt/2*Ss_i
 	for(unsigned int i=1; i<nx-1; i++)
 	{
-		// predictor step Us = U_i - dt/dx*(F_i+1 - F_i) + dt*S_i
-		As = A[i] - dt_act/dx*(A[i+1]*v[i+1]-A[i]*v[i]);
-		vs = v[i] - dt_act/dx*(v[i+1]*v[i+1]*.5 + p[i+1]/rho - v[i]*v[i]*.5 - p[i]/rho) + dt_act*(-8.*pi*nu*nu_f/A[i]*v[i]); // TODO: add gravity to source
-		ps = pressure(x[i],As,dp_dA,dp_dx,dF_dx);
-
-		double Fs_i_1 = As*vs;
-		double Fs_i_2 = vs*vs*.5 + ps/rho;
-		// corrector step Un+1 = .5*(Us+U_n) + dt/(2dx)*(Fs_i - Fs_i-1) + dt/2*Ss_i
-		Anew[i] = .5*(As+A[i]) - dt_act/(2.*dx)*(Fs_i_1-Fs_L_1);
-		vnew[i] = .5*(vs+v[i]) - dt_act/(2.*dx)*(Fs_i_2-Fs_L_2) + dt_act*.5*(-8.*pi*nu*nu_f/As*vs);
-		pnew[i] = pressure(x[i],Anew[i],dp_dA,dp_dx,dF_dx);
-		anew[i] = wave_speed(x[i],Anew[i]);
-
-		// refreshing left star variables
-		Fs_L_1 = Fs_i_1;
-		Fs_L_2 = Fs_i_2;
+		Anew[i] = .5*(Astar[i]+A[i]) - dt_act/(2.*dx)*(Fstar_1[i]-Fstar_1[i-1]);
+		vnew[i] = .5*(vstar[i]+v[i]) - dt_act/(2.*dx)*(Fstar_2[i]-Fstar_2[i-1]) + dt_act*.5*(-8.*pi*nu*nu_f/Astar[i]*vstar[i]);
+	}
+	for(unsigned int i=1; i<nx-1; i++)
+	{
+		double dp_dA;
+		pnew[i] = pressure_at(i,Anew[i],dp_dA);
+		anew[i] = pow(Anew[i]/rho*dp_dA,.5);
 	}
 }
 
@@ -173,23 +174,20 @@ void moc_edge::solve_moc()
 		double W1_L = W1L(i, dt_act, J1_L);
 		double W2_R = W2R(i, dt_act, J2_R);
 
-		double sn_dx, An_dx, dp_dA, dp_dx, dF_dx;
-		double sn = nominal_wall_thickness(x[i],sn_dx);
-		double An = nominal_area(x[i],An_dx);
+		double dp_dA;
+		double An = An_x[i];
 
 		vnew[i] = -J1_L*dt_act + W1_L - J2_R*dt_act + W2_R;
 		if(material_type == 0)
 		{
-			Anew[i] = pow(.25*pow(2.*rho*An/(beta*sn),.5) * (-J1_L*dt_act + W1_L + J2_R*dt_act - W2_R) + pow(An,.25),4.);
+			Anew[i] = pow(.25*pow(2.*rho*An/beta_sn_x[i],.5) * (-J1_L*dt_act + W1_L + J2_R*dt_act - W2_R) + pow(An,.25),4.);
 		}
 		else if(material_type == 1)
 		{
-			double dn = pow(An/pi,.5)*2.;
-			double F = (k1*exp(k2*dn*.5)+k3)/(1.-nu_p*nu_p);
-			Anew[i] = pow(.5*pow(rho/(2.*pow(An,.5)*F),.5) * (-W1_L + dt_act*J1_L + W2_R - dt_act*J2_R) + pow(An,-.25) ,-4);
+			Anew[i] = pow(.5*pow(rho/(2.*sqrt_An_x[i]*K_x[i]),.5) * (-W1_L + dt_act*J1_L + W2_R - dt_act*J2_R) + pow(An,-.25) ,-4);
 		}
-		pnew[i] = pressure(x[i],Anew[i],dp_dA,dp_dx,dF_dx);
-		anew[i] = wave_speed(x[i],Anew[i]);
+		pnew[i] = pressure_at(i,Anew[i],dp_dA);
+		anew[i] = pow(Anew[i]/rho*dp_dA,.5);
 	}
 }
 
@@ -357,6 +355,79 @@ double moc_edge::area(double x, double p)
 	}
 }
 
+//--------------------------------------------------------------
+void moc_edge::set_grid_constants()
+{
+	An_x.resize(nx);
+	sqrt_An_x.resize(nx);
+	beta_sn_x.resize(nx);
+	K_x.resize(nx);
+	for(int i=0; i<nx; i++)
+	{
+		double d;
+		double sn = nominal_wall_thickness(x[i],d);
+		An_x[i] = nominal_area(x[i],d);
+		sqrt_An_x[i] = pow(An_x[i],.5);
+		beta_sn_x[i] = beta*sn;
+		if(material_type == 1) // olufsen
+		{
+			double rn = pow(An_x[i]/pi,.5);
+			K_x[i] = (k1*exp(k2*rn)+k3)/(1.-nu_p*nu_p);
+		}
+		else // linear
+		{
+			K_x[i] = beta*sn/An_x[i];
+		}
+	}
+}
+
+//--------------------------------------------------------------
+double moc_edge::wave_speed_at(int i, double A)
+{
+	double dp_dA;
+	pressure_at(i,A,dp_dA);
+	return pow(A/rho*dp_dA,.5);
+}
+
+//--------------------------------------------------------------
+double moc_edge::pressure_at(int i, double A, double &dp_dA)
+{
+	double sqrt_A = pow(A,.5);
+	if(material_type == 0) // linear
+	{
+		dp_dA = beta_sn_x[i]/(An_x[i]*2.*sqrt_A);
+		return K_x[i]*(sqrt_A-sqrt_An_x[i]) + p0;
+	}
+	else if(material_type == 1) // Olufsen
+	{
+		dp_dA = K_x[i]/2.*pow(A,-1.5)*sqrt_An_x[i];
+		return K_x[i]*(1.-sqrt_An_x[i]/sqrt_A) + p0;
+	}
+	else
+	{
+		cout << "Unknown material type = " << material_type << endl;
+		return -1.;
+	}
+}
+
+//--------------------------------------------------------------
+double moc_edge::area_at(int i, double p)
+{
+	if(material_type == 0) // linear
+	{
+		return pow((p-p0)*An_x[i]/beta_sn_x[i] + sqrt_An_x[i],2.);
+	}
+	else if(material_type == 1) // olufsen
+	{
+		return An_x[i]*pow(1.-(p-p0)/K_x[i],-2.);
+	}
+	else
+	{
+		cout << "Unknown material type = " << material_type << endl;
+		return -1.;
+	}
+}
+
 //--------------------------------------------------------------
 double moc_edge::W1L(int j, double dt, double &J_L)
 {
@@ -438,22 +509,43 @@ double moc_edge::left_position(int j, double dt)
 	return xL;
 }
 
+//--------------------------------------------------------------
+// saving a value in time, or only overwriting the last one if it is not saved
+static void record(vector<double> &x, double value, bool in_time)
+{
+	if(in_time || x.empty())
+	{
+		x.push_back(value);
+	}
+	else
+	{
+		x.back() = value;
+	}
+}
+
 //--------------------------------------------------------------
 void moc_edge::save_field_variables()
 {
-	velocity_start.push_back(v[0]);
-	velocity_end.push_back(v[nx-1]);
-	pressure_start.push_back(p[0]);
-	pressure_end.push_back(p[nx-1]);
-	wave_speed_start.push_back(a[0]);
-	wave_speed_end.push_back(a[nx-1]);
-	area_start.push_back(A[0]);
-	area_end.push_back(A[nx-1]);
+	// without do_save_memory only the last values are kept, the boundaries use them
+	vector<bool> in_time(save_variable.size());
+	for(int k=0; k<save_variable.size(); k++)
+	{
+		in_time[k] = do_save_memory && save_variable[k];
+	}
+
+	record(velocity_start, v[0], in_time[2]);
+	record(velocity_end, v[nx-1], in_time[3]);
+	record(pressure_start, p[0], in_time[0]);
+	record(pressure_end, p[nx-1], in_time[1]);
+	record(wave_speed_start, a[0], in_time[10]);
+	record(wave_speed_end, a[nx-1], in_time[11]);
+	record(area_start, A[0], in_time[8]);
+	record(area_end, A[nx-1], in_time[9]);
 
 	double vf_s = v[0] * A[0];
 	double vf_e = v[nx-1] * A[nx-1];
-	volume_flow_rate_start.push_back(vf_s);
-	volume_flow_rate_end.push_back(vf_e);
+	record(volume_flow_rate_start, vf_s, in_time[4]);
+	record(volume_flow_rate_end, vf_e, in_time[5]);
 
 	// debug TODO: del
 	/*if(time.back()>-1.)
@@ -466,18 +558,126 @@ void moc_edge::save_field_variables()
 
 	double mf_s = vf_s * rho;
 	double mf_e = vf_e * rho;
-	mass_flow_rate_start.push_back(mf_s);
-	mass_flow_rate_end.push_back(mf_e);
+	record(mass_flow_rate_start, mf_s, in_time[6]);
+	record(mass_flow_rate_end, mf_e, in_time[7]);
+
+	if(stream != NULL)
+	{
+		write_stream();
+	}
+}
+
+//--------------------------------------------------------------
+vector<vector<double>*> moc_edge::field_variables()
+{
+	return vector<vector<double>*>{&pressure_start, &pressure_end, &velocity_start, &velocity_end, &volume_flow_rate_start, &volume_flow_rate_end, &mass_flow_rate_start, &mass_flow_rate_end, &area_start, &area_end, &wave_speed_start, &wave_speed_end};
+}
+
+//--------------------------------------------------------------
+void moc_edge::trim_history(double t_keep)
+{
+	int n = trim_count(time,t_keep);
+	if(n==0)
+	{
+		return;
+	}
+
+	// field variables are only trimmed if they are saved together with time
+	vector<vector<double>*> x = field_variables();
+	for(int k=0; k<x.size(); k++)
+	{
+		if(x[k]->size() == time.size())
+		{
+			x[k]->erase(x[k]->begin(),x[k]->begin()+n);
+		}
+	}
+	time.erase(time.begin(),time.begin()+n);
+}
+
+//--------------------------------------------------------------
+void moc_edge::start_stream(string file_name, const vector<string> &names, double dt, int format, int bytes, int chunk_rows)
+{
+	close_stream();
+	stream = new column_stream(file_name, names, format, bytes, chunk_rows);
+	stream_dt = dt;
+	write_stream();
+}
+
+//--------------------------------------------------------------
+void moc_edge::write_stream()
+{
+	// selected variables only, same order as solver_moc::edge_columns
+	vector<vector<double>*> all = field_variables(), x;
+	for(int k=0; k<all.size(); k++)
+	{
+		if(save_variable[k])
+		{
+			x.push_back(all[k]);
+		}
+	}
+
+	int n = time.size();
+	for(int k=0; k<x.size(); k++)
+	{
+		n = min(n,(int)x[k]->size());
+	}
+
+	// same interpolation as resample_columns, every ts in [time[j], time[j+1]) is written when time[j+1] exists
+	vector<double> row(x.size()+1);
+	for(int j=0; j<n-1; j++)
+	{
+		while(time[j]<=stream_ts && stream_ts<time[j+1])
+		{
+			double a0 = (time[j+1]-stream_ts)/(time[j+1]-time[j]);
+			double a1 = (stream_ts-time[j])/(time[j+1]-time[j]);
+			row[0] = stream_ts;
+			for(int k=0; k<x.size(); k++)
+			{
+				row[k+1] = (*x[k])[j]*a0 + (*x[k])[j+1]*a1;
+			}
+			stream->push_row(row);
+			stream_ts += stream_dt;
+		}
+	}
+
+	// keeping only the last sample, .back() is still used by the boundaries
+	if(n>1)
+	{
+		time.erase(time.begin(),time.begin()+n-1);
+		for(int k=0; k<x.size(); k++)
+		{
+			x[k]->erase(x[k]->begin(),x[k]->begin()+n-1);
+		}
+	}
+}
+
+//--------------------------------------------------------------
+void moc_edge::close_stream()
+{
+	if(stream != NULL)
+	{
+		stream->close();
+		delete stream;
+		stream = NULL;
+	}
 }
 
 //--------------------------------------------------------------
 void moc_edge::update()
 {
-	p = pnew;
-	v = vnew;
-	a = anew;
-	A = Anew;
-	time.push_back(time.back() + dt_act);
+	// every point of the new vectors is written in each time step (inner points and both boundaries), no copy needed
+	p.swap(pnew);
+	v.swap(vnew);
+	a.swap(anew);
+	A.swap(Anew);
+
+	// time is kept in memory only if a field variable is saved with it, the last value otherwise
+	bool in_time = false;
+	for(int k=0; k<save_variable.size(); k++)
+	{
+		in_time = in_time || save_variable[k];
+	}
+	record(time, time.back() + dt_act, do_save_memory && in_time);
 
 	/*cout << "dt: " << dt_act << endl;
 	for(int i=0; i<nx; i++)
@@ -572,7 +772,19 @@ void moc_edge::save_initials(FILE* out_file)
    double as = a[0];
    double ae = a[nx-1];
 
-   fprintf(out_file, "%8s, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e\n",ID.c_str(),ps,pe,vs,ve,As,Ae,as,ae);
+   fprintf(out_file, "%8s, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e",ID.c_str(),ps,pe,vs,ve,As,Ae,as,ae);
+
+   // whole profiles: nx, p[0..nx-1], v[0..nx-1]
+   fprintf(out_file, ", %i",nx);
+   for(int i=0; i<nx; i++)
+   {
+      fprintf(out_file, ", %9.7e",p[i]);
+   }
+   for(int i=0; i<nx; i++)
+   {
+      fprintf(out_file, ", %9.7e",v[i]);
+   }
+   fprintf(out_file, "\n");
 }
 
 //--------------------------------------------------------------
@@ -596,22 +808,40 @@ void moc_edge::set_initials(vector<double> ic)
 	a.clear();      a.resize(nx);
 	A.clear();      A.resize(nx);
 
-	for(int i=0; i<nx; i++)
-	{	
-		double a0 = 1. - (double)i/((double)nx-1.);
-		double a1 = (double)i / ((double)nx - 1.);
-
-		p[i] = a0*ic[0] + a1*ic[1];
-		v[i] = a0*ic[2] + a1*ic[3];
-		A[i] = a0*ic[4] + a1*ic[5];
-		a[i] = a0*ic[6] + a1*ic[7];
+	int n = ic.size()>8 ? (int)ic[8] : 0;
+	if(n>1 && ic.size() >= 9+2*n) // whole profiles of n points
+	{
+		// interpolating the profiles if the division points changed, A and a from the
+		// pressure with the current geometry and material, these may differ from the saved ones
+		for(int i=0; i<nx; i++)
+		{
+			double xi = (double)i/((double)nx-1.)*(n-1.);
+			int j = min((int)xi, n-2);
+			double a1 = xi - j;
+			double a0 = 1. - a1;
+
+			p[i] = a0*ic[9+j] + a1*ic[10+j];
+			v[i] = a0*ic[9+n+j] + a1*ic[10+n+j];
+			A[i] = area_at(i,p[i]);
+			a[i] = wave_speed_at(i,A[i]);
+		}
 	}
-
-	// saving initial conditions
-	if(do_save_memory)
+	else // start and end values only
 	{
-		save_field_variables();
+		for(int i=0; i<nx; i++)
+		{	
+			double a0 = 1. - (double)i/((double)nx-1.);
+			double a1 = (double)i / ((double)nx - 1.);
+
+			p[i] = a0*ic[0] + a1*ic[1];
+			v[i] = a0*ic[2] + a1*ic[3];
+			A[i] = a0*ic[4] + a1*ic[5];
+			a[i] = a0*ic[6] + a1*ic[7];
+		}
 	}
+
+	// saving initial conditions, only the last values if not saved in time
+	save_field_variables();
 }
 
 //----------------------------------------------------------------\\
@@ -640,8 +870,8 @@ double moc_edge::boundary_end_position(double dt)
 void moc_edge::boundary_substitute_start(double t_act, double p, double q)
 {
 	pnew[0] = p - Rs*q;
-	Anew[0] = area(x[0],pnew[0]);
-	anew[0] = wave_speed(x[0],Anew[0]);
+	Anew[0] = area_at(0,pnew[0]);
+	anew[0] = wave_speed_at(0,Anew[0]);
 	vnew[0] = q/Anew[0];
 }
 
@@ -649,8 +879,8 @@ void moc_edge::boundary_substitute_start(double t_act, double p, double q)
 void moc_edge::boundary_substitute_end(double t_act, double p, double q)
 {
 	pnew[nx-1] = p + Re*q;
-	Anew[nx-1] = area(x[nx-1],pnew[nx-1]);
-	anew[nx-1] = wave_speed(x[nx-1],Anew[nx-1]);
+	Anew[nx-1] = area_at(nx-1,pnew[nx-1]);
+	anew[nx-1] = wave_speed_at(nx-1,Anew[nx-1]);
 	vnew[nx-1] = q/Anew[nx-1];
 }
 
@@ -663,9 +893,9 @@ vector<double> moc_edge::boundary_junction_start(double pp, double t_act)
 	double J2_R;
 	double W2_R = W2R(0, dt, J2_R);
 
-	double Ap = area(x[0],pp);
+	double Ap = area_at(0,pp);
 	double dp = pp*0.001;
-	double Ap2 = area(x[0],pp+dp);
+	double Ap2 = area_at(0,pp+dp);
 
 	double q,q2;
 	if(material_type == 0)
@@ -695,9 +925,9 @@ vector<double> moc_edge::boundary_junction_end(double pp, double t_act)
 	double J1_L;
 	double W1_L = W1L(nx-1, dt, J1_L);
 
-	double Ap = area(x[nx-1],pp);
+	double Ap = area_at(nx-1,pp);
 	double dp = pp*0.001;
-	double Ap2 = area(x[nx-1],pp+dp);
+	double Ap2 = area_at(nx-1,pp+dp);
 
 	double q,q2;
 	if(material_type == 0)
@@ -727,9 +957,9 @@ vector<double> moc_edge::boundary_newton_start(double qp, double pp, double t_ac
 	double J2_R;
 	double W2_R = W2R(0, dt, J2_R);
 
-	double Ap = area(x[0],pp);
+	double Ap = area_at(0,pp);
 	double dp = pp*0.001;
-	double Ap2 = area(x[0],pp+dp);
+	double Ap2 = area_at(0,pp+dp);
 
 	// characteristic equation
 	double f_char,f_char2;
@@ -764,9 +994,9 @@ vector<double> moc_edge::boundary_newton_end(double qp, double pp, double t_act)
 	double J1_L;
 	double W1_L = W1L(nx-1, dt, J1_L);
 
-	double Ap = area(x[nx-1],pp);
+	double Ap = area_at(nx-1,pp);
 	double dp = pp*0.001;
-	double Ap2 = area(x[nx-1],pp+dp);
+	double Ap2 = area_at(nx-1,pp+dp);
 
 	// characteristic equation
 	double f_char,f_char2;
@@ -820,8 +1050,8 @@ double moc_edge::boundary_pressure_start(double dt, double p_in)
 	pnew[0] = p_s;
 	f_pressure_start(p_s, p_in, dt, v_s);
 	vnew[0] = v_s;
-	Anew[0] = area(x[0],pnew[0]);
-	anew[0] = wave_speed(x[0],Anew[0]);
+	Anew[0] = area_at(0,pnew[0]);
+	anew[0] = wave_speed_at(0,Anew[0]);
 
 	double q_in = vnew[0]*Anew[0];
 
@@ -834,7 +1064,7 @@ double moc_edge::f_pressure_start(double pp, double p_in, double dt, double &v_s
 	double J2_R;
 	double W2_R = W2R(0, dt, J2_R);
 
-	double Ap = area(x[0],pp);
+	double Ap = area_at(0,pp);
 
 	if(material_type == 0)
 	{
@@ -878,8 +1108,8 @@ double moc_edge::boundary_pressure_end(double dt, double p_in)
 	pnew[nx-1] = p_e;
 	f_pressure_end(p_e, p_in, dt, v_e);
 	vnew[nx-1] = v_e;
-	Anew[nx-1] = area(x[nx-1],pnew[nx-1]);
-	anew[nx-1] = wave_speed(x[nx-1],Anew[nx-1]);
+	Anew[nx-1] = area_at(nx-1,pnew[nx-1]);
+	anew[nx-1] = wave_speed_at(nx-1,Anew[nx-1]);
 
 	double q_in = vnew[nx-1]*Anew[nx-1];
 
@@ -892,7 +1122,7 @@ double moc_edge::f_pressure_end(double pp, double p_in, double dt, double &v_e)
 	double J1_L;
 	double W1_L = W1L(nx-1, dt, J1_L);
 
-	double Ap = area(x[nx-1],pp);
+	double Ap = area_at(nx-1,pp);
 
 	if(material_type == 0)
 	{
@@ -936,8 +1166,8 @@ double moc_edge::boundary_flowrate_start(double dt, double q_in)
 	pnew[0] = p_s;
 	f_flowrate_start(p_s, q_in, dt, v_s);
 	vnew[0] = v_s;
-	Anew[0] = area(x[0],pnew[0]);
-	anew[0] = wave_speed(x[0],Anew[0]);
+	Anew[0] = area_at(0,pnew[0]);
+	anew[0] = wave_speed_at(0,Anew[0]);
 
 	return pnew[0];
 }
@@ -948,7 +1178,7 @@ double moc_edge::f_flowrate_start(double pp, double q_in, double dt, double &v_s
 	double J2_R;
 	double W2_R = W2R(0, dt, J2_R);
 
-	double Ap = area(x[0],pp);
+	double Ap = area_at(0,pp);
 
 	v_s = q_in/Ap;
 
@@ -993,8 +1223,8 @@ double moc_edge::boundary_flowrate_end(double dt, double q_in)
 	pnew[nx-1] = p_e;
 	f_flowrate_end(p_e, q_in, dt, v_e);
 	vnew[nx-1] = v_e;
-	Anew[nx-1] = area(x[nx-1],pnew[nx-1]);
-	anew[nx-1] = wave_speed(x[nx-1],Anew[nx-1]);
+	Anew[nx-1] = area_at(nx-1,pnew[nx-1]);
+	anew[nx-1] = wave_speed_at(nx-1,Anew[nx-1]);
 
 	return pnew[nx-1];
 }
@@ -1005,7 +1235,7 @@ double moc_edge::f_flowrate_end(double pp, double q_in, double dt, double &v_e)
 	double J1_L;
 	double W1_L = W1L(nx-1, dt, J1_L);
 
-	double Ap = area(x[nx-1],pp);
+	double Ap = area_at(nx-1,pp);
 
 	v_e = q_in/Ap;
 
@@ -1040,9 +1270,9 @@ double moc_edge::boundary_velocity_start(double dt, double v_in, double &q_in)
 		Anew[0] = pow(pow(rho/(2.*pow(Ans,.5)*F),.5)*(-dt*J2_R + W2_R - .5*vnew[0]) + pow(Ans,-.25),-4.);
 	}
 	q_in = Anew[0]*vnew[0];
-	double dp_dA, dp_dx, dF_dx;
-	pnew[0] = pressure(x[0],Anew[0],dp_dA,dp_dx,dF_dx);
-	anew[0] = wave_speed(x[0],Anew[0]);
+	double dp_dA;
+	pnew[0] = pressure_at(0,Anew[0],dp_dA);
+	anew[0] = wave_speed_at(0,Anew[0]);
 
 	double p_in = Rs*q_in + pnew[0];
 
@@ -1066,9 +1296,9 @@ double moc_edge::boundary_velocity_end(double dt, double v_in, double &q_in)
 		Anew[nx-1] = pow(pow(rho/(2.*pow(Ane,.5)*F),.5)*(dt*J1_L - W1_L + .5*vnew[nx-1]) + pow(Ane,-.25),-4.);
 	}
 	q_in = Anew[nx-1]*vnew[nx-1];
-	double dp_dA, dp_dx, dF_dx;
-	pnew[nx-1] = pressure(x[nx-1],Anew[nx-1],dp_dA,dp_dx,dF_dx);
-	anew[nx-1] = wave_speed(x[nx-1],Anew[nx-1]);
+	double dp_dA;
+	pnew[nx-1] = pressure_at(nx-1,Anew[nx-1],dp_dA);
+	anew[nx-1] = wave_speed_at(nx-1,Anew[nx-1]);
 
 	double p_in = -Re*q_in + pnew[nx-1];
 
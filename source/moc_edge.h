@@ -23,6 +23,9 @@
 #include <iostream>
 #include <fstream>
 
+#include "file_io.h"
+#include "statistics.h"
+
 #include "/usr/include/eigen3/Eigen/Eigen"
 
 using namespace std;
@@ -65,6 +68,10 @@ public:
 
 	// saving field variables
 	bool do_save_memory = true;
+	// which field variables are saved in time, same order as field_variables() and solver_moc::edge_columns without time
+	// the others only keep their last value
+	vector<bool> save_variable = vector<bool>(12,true);
+	vector<vector<double>*> field_variables();
 
 	// time step for inner iterations mainly
 	double dt_act; // s
@@ -78,6 +85,15 @@ public:
 	vector<double> volume_flow_rate_start,  volume_flow_rate_end; // m3/s
 	vector<double> mass_flow_rate_start,    mass_flow_rate_end; // kg/s
 
+	// streaming the field variables to file during the run, resampled to stream_dt like save_results(dt)
+	// only the last sample is kept in the vectors above
+	column_stream *stream = NULL;
+	double stream_dt; // s
+	double stream_ts = 0.; // next resampled time, s
+	void start_stream(string file_name, const vector<string> &names, double dt, int format, int bytes, int chunk_rows);
+	void write_stream(); // resampling the finished time steps and dropping them from memory
+	void close_stream();
+
 	// printing input parameters to console
 	void print_input();
 	void print_vars();
@@ -105,6 +121,8 @@ public:
 
 	// saving start and end field variables to vectors in time
 	void save_field_variables();
+	// dropping the time steps before t_keep, the capacity of the vectors is kept for the next periods
+	void trim_history(double t_keep);
 	// updatin every field variable (a,d,epsz, ...) from v and p at every point
 	void update_variables();
 	void save_initials(FILE* out_file);
@@ -163,7 +181,23 @@ private:
 	double pressure(double x, double A, double &dp_dA, double &dp_dx, double &dF_dx);
 	double area(double x, double p);
 
-	// variables for calculations of new field variables
+	// the same at the grid point x[i] from the precomputed geometry, used by the inner loops and the boundaries
+	double wave_speed_at(int i, double A);
+	double pressure_at(int i, double A, double &dp_dA);
+	double area_at(int i, double p);
+
+	// nominal geometry and material at every grid point, set by set_grid_constants in initialization
+	vector<double> An_x; // nominal area, m2
+	vector<double> sqrt_An_x; // its square root
+	vector<double> beta_sn_x; // linear: beta*sn, Pa*m
+	vector<double> K_x; // linear: beta*sn/An, olufsen: F, Pa
+	void set_grid_constants();
+
+	// predictor step of maccormack at every point, the corrector uses the neighbouring flux
+	vector<double> Astar, vstar, Fstar_1, Fstar_2;
+
+	// variables for calculations of new field variables, contiguous per variable
+	// the new time level is written to the *new vectors, update() swaps them with the old ones
 	vector<double> dt; // time step for each point
 	vector<double> x; // coordinates for field variables
 	vector<double> p, pnew; // pressure, Pa
@@ -84,18 +84,54 @@ void moc_node::boundary_variables(double p, double tact)
 {
 	double q = (p-p0)/R * Ri;
 
-	if(do_save_memory)
+	save_field_variables(tact, p, q);
+}
+
+//--------------------------------------------------------------
+void moc_node::save_field_variables(double t, double p, double q)
+{
+	// without do_save_memory only the last values are kept, the junctions use them
+	if(do_save_memory || time.empty())
+	{
+		time.push_back(t);
+	}
+	else
+	{
+		time.back() = t;
+	}
+	if((do_save_memory && save_variable[0]) || pressure.empty())
 	{
-		time.push_back(tact);
 		pressure.push_back(p);
+	}
+	else
+	{
+		pressure.back() = p;
+	}
+	if((do_save_memory && save_variable[1]) || volume_flow_rate.empty())
+	{
 		volume_flow_rate.push_back(q);
 	}
+	else
+	{
+		volume_flow_rate.back() = q;
+	}
 }
 
 //--------------------------------------------------------------
-void moc_node::save_field_variables(double t, double p, double q)
+void moc_node::trim_history(double t_keep)
 {
-	time.push_back(t);
-	pressure.push_back(p);
-	volume_flow_rate.push_back(q);
+	int n = trim_count(time,t_keep);
+	if(n==0)
+	{
+		return;
+	}
+	if(pressure.size() == time.size())
+	{
+		pressure.erase(pressure.begin(),pressure.begin()+n);
+	}
+	if(volume_flow_rate.size() == time.size())
+	{
+		volume_flow_rate.erase(volume_flow_rate.begin(),volume_flow_rate.begin()+n);
+	}
+	time.erase(time.begin(),time.begin()+n);
 }
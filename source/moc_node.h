@@ -17,6 +17,8 @@
 #include <iostream>
 #include <cmath>
 
+#include "statistics.h"
+
 using namespace std;
 
 class moc_node
@@ -39,6 +41,8 @@ public:
 
 	// saving field variables
 	bool do_save_memory = true;
+	// pressure, volume_flow_rate: saved in time or only the last value
+	vector<bool> save_variable = vector<bool>(2,true);
 
 	// time vector
 	vector<double> time;
@@ -63,6 +67,8 @@ public:
 
 	// saving stuff to memory
 	void save_field_variables(double t, double p, double q);
+	// dropping the saved values before t_keep
+	void trim_history(double t_keep);
 
 	// printing input parameters to console
 	void print_input();
@@ -20,6 +20,9 @@ void solver_lumped::initialization(double hr)
 	// clearing master boundary indices
 	boundary_indices.clear();
 
+	// building model, the node indices of the edges are used below
+	build_system();
+
 	// heart rate
 	heart_rate = hr; // from Charlton2019
 
@@ -60,9 +63,6 @@ void solver_lumped::initialization(double hr)
 	int nm = number_of_edges + number_of_nodes + number_of_master + 2*number_of_elastance;
 	A = MatrixXd::Zero(nm,nm);
 	b = VectorXd::Zero(nm);
-
-	// building model
-	build_system();
 }
 
 //--------------------------------------------------------------
@@ -75,6 +75,239 @@ void solver_lumped::set_newton_size()
 	Jac = MatrixXd::Zero(N,N);
 	x = VectorXd::Zero(N);
 	f = VectorXd::Zero(N);
+
+	build_jacobian_pattern();
+
+	// Jac of a model without diode and valve is constant in x, it only moves with dt and t on the diagonal
+	is_linear = number_of_moc == 1;
+	law_moving.clear();
+	int i_elas=0;
+	for(int i=0; i<number_of_edges; i++)
+	{
+		int type = edges[i]->type_code;
+		if(type == 5 || type == 6)
+		{
+			is_linear = false;
+		}
+		if(type == 1 || type == 2 || type == 3 || type == 7 || type == 8)
+		{
+			law_moving.push_back(i);
+		}
+		if(type == 2)
+		{
+			law_moving.push_back(number_of_edges+number_of_nodes+i_elas);
+			law_moving.push_back(number_of_edges+number_of_nodes+i_elas+1);
+			i_elas+=2;
+		}
+	}
+	jac_inverse.resize(0,0);
+}
+
+//--------------------------------------------------------------
+void solver_lumped::reduce_linear()
+{
+	int N = x.size()-1, r = law_moving.size();
+	int k = number_of_edges + boundary_indices[0][3];
+	jac_inverse = Jac.topLeftCorner(N,N).partialPivLu().inverse();
+	law_diagonal.resize(r);
+	law_columns.resize(N,r);
+	law_block.resize(r,r);
+	law_row_k.resize(r);
+	for(int j=0; j<r; j++)
+	{
+		law_diagonal(j) = Jac(law_moving[j],law_moving[j]);
+		law_columns.col(j) = jac_inverse.col(law_moving[j]);
+		law_row_k(j) = jac_inverse(k,law_moving[j]);
+		for(int i=0; i<r; i++)
+		{
+			law_block(i,j) = jac_inverse(law_moving[i],law_moving[j]);
+		}
+	}
+	law_delta = VectorXd::Zero(r);
+	law_m.resize(r,r);
+	law_y.resize(r,2);
+}
+
+//--------------------------------------------------------------
+void solver_lumped::boundary_law(double coupling, double &p0, double &dp_dq)
+{
+	// Jac*d + f + coupling*q*e_k = 0 in the lumped rows, only row k of Jac^-1 is needed for p(q)
+	int N = x.size()-1, r = law_moving.size();
+	int k = number_of_edges + boundary_indices[0][3];
+
+	// the reduction is kept while the moving entries stay within a factor of two
+	bool is_reduced = jac_inverse.rows() == N;
+	for(int j=0; j<r && is_reduced; j++)
+	{
+		law_delta(j) = Jac(law_moving[j],law_moving[j]) - law_diagonal(j);
+		is_reduced = fabs(law_delta(j)) <= fabs(law_diagonal(j));
+	}
+	if(!is_reduced)
+	{
+		reduce_linear();
+	}
+
+	// Jac^-1*v = jac_inverse*v - law_columns*diag(law_delta)*M^-1*(jac_inverse*v)(law_moving),
+	// M = I + law_block*diag(law_delta), a rank r correction of the reduction
+	law_jf.noalias() = jac_inverse*f.head(N);
+	double d0 = -law_jf(k), dk = jac_inverse(k,k);
+	if(r>0)
+	{
+		for(int j=0; j<r; j++)
+		{
+			law_m.col(j) = law_block.col(j)*law_delta(j);
+			law_m(j,j) += 1.;
+			law_y(j,0) = law_jf(law_moving[j]);
+			law_y(j,1) = jac_inverse(law_moving[j],k);
+		}
+		law_lu.compute(law_m);
+		law_y = law_lu.solve(law_y);
+		d0 += law_row_k.dot(law_delta.cwiseProduct(law_y.col(0)));
+		dk -= law_row_k.dot(law_delta.cwiseProduct(law_y.col(1)));
+	}
+	p0 = x(k) + d0;
+	dp_dq = -coupling*dk;
+}
+
+//--------------------------------------------------------------
+void solver_lumped::linear_update(double coupling, double q)
+{
+	// law_y: M^-1 of the f and of the boundary column parts, linear in q as well
+	int N = x.size()-1, r = law_moving.size();
+	int k = number_of_edges + boundary_indices[0][3];
+
+	law_jf += coupling*q*jac_inverse.col(k);
+	if(r>0)
+	{
+		law_jf.noalias() -= law_columns*law_delta.cwiseProduct(law_y.col(0) + coupling*q*law_y.col(1));
+	}
+	x.head(N) -= law_jf;
+}
+
+//--------------------------------------------------------------
+void solver_lumped::build_jacobian_pattern()
+{
+	int n=number_of_nodes, m=number_of_edges, l=number_of_elastance;
+	int N = m + n + 2*l + number_of_moc;
+
+	// same positions as coefficients_newton and the moc coupling in first_blood::solve_lum_newton
+	vector<Triplet<double> > t;
+	int i_elas=0;
+	for(int i=0; i<number_of_edges; i++)
+	{
+		int i1 = edges[i]->node_index_start;
+		int i2 = edges[i]->node_index_end;
+		int tc = edges[i]->type_code;
+		if(tc == 2) // elastance with its two virtual nodes
+		{
+			t.push_back(Triplet<double>(i,m+n+i_elas+1,1.));
+			t.push_back(Triplet<double>(i,m+n+i_elas,1.));
+			t.push_back(Triplet<double>(i,i,1.));
+			t.push_back(Triplet<double>(n+m+i_elas,m+i1,1.));
+			t.push_back(Triplet<double>(n+m+i_elas+1,m+i2,1.));
+			t.push_back(Triplet<double>(n+m+i_elas,n+m+i_elas,1.));
+			t.push_back(Triplet<double>(n+m+i_elas+1,n+m+i_elas+1,1.));
+			i_elas+=2;
+		}
+		else if(tc == 9) // current source
+		{
+			t.push_back(Triplet<double>(i,i,1.));
+		}
+		else
+		{
+			t.push_back(Triplet<double>(i,m+i2,1.));
+			t.push_back(Triplet<double>(i,m+i1,1.));
+			if(tc != 4) // voltage source has no flow rate term
+			{
+				t.push_back(Triplet<double>(i,i,1.));
+			}
+		}
+	}
+	for(int i=0; i<number_of_nodes; i++)
+	{
+		if(nodes[i]->is_ground == false)
+		{
+			for(int j=0; j<nodes[i]->edge_in.size(); j++)
+			{
+				t.push_back(Triplet<double>(m+i,nodes[i]->edge_in[j],1.));
+			}
+			for(int j=0; j<nodes[i]->edge_out.size(); j++)
+			{
+				t.push_back(Triplet<double>(m+i,nodes[i]->edge_out[j],1.));
+			}
+		}
+		else
+		{
+			t.push_back(Triplet<double>(m+i,m+i,1.));
+		}
+	}
+	for(int j=0; j<number_of_moc; j++)
+	{
+		int node_index = boundary_indices[j][3];
+		t.push_back(Triplet<double>(m+node_index,m+n+2*l+j,1.));
+		t.push_back(Triplet<double>(m+n+2*l+j,m+node_index,1.));
+		t.push_back(Triplet<double>(m+n+2*l+j,m+n+2*l+j,1.));
+	}
+
+	// duplicates are summed, the values are overwritten anyway
+	Jac_sparse.resize(N,N);
+	Jac_sparse.setFromTriplets(t.begin(),t.end());
+	Jac_sparse.makeCompressed();
+	lu.analyzePattern(Jac_sparse);
+
+	jac_factorised = VectorXd::Zero(Jac_sparse.nonZeros());
+	is_factorised = false;
+	is_pattern_ok = true;
+	number_of_factorisations = 0;
+	number_of_solves = 0;
+}
+
+//--------------------------------------------------------------
+VectorXd solver_lumped::newton_step(bool refactor, double jac_tolerance)
+{
+	number_of_solves++;
+	if(is_pattern_ok)
+	{
+		// copying the actual values of Jac into the pattern
+		for(int k=0; k<Jac_sparse.outerSize(); k++)
+		{
+			for(SparseMatrix<double>::InnerIterator it(Jac_sparse,k); it; ++it)
+			{
+				it.valueRef() = Jac(it.row(),it.col());
+			}
+		}
+		Map<VectorXd> values(Jac_sparse.valuePtr(),Jac_sparse.nonZeros());
+
+		// e.g. a diode switching changes its entry by 1e10, elastance and valves slowly
+		if(!refactor && is_factorised)
+		{
+			refactor = ((values-jac_factorised).array().abs() > jac_tolerance*jac_factorised.array().abs()).any();
+		}
+
+		if(refactor || !is_factorised)
+		{
+			// every nonzero of Jac must be in the pattern (Jac_sparse holds Jac there), dense QR from now on otherwise
+			if(!(Jac - MatrixXd(Jac_sparse)).isZero(0.))
+			{
+				cout << " ! Jacobian of lumped model " << name << " has entries out of the sparse pattern, using dense QR" << endl;
+				is_pattern_ok = false;
+				is_factorised = false;
+				return Jac.colPivHouseholderQr().solve(-f);
+			}
+			lu.factorize(Jac_sparse);
+			number_of_factorisations++;
+			is_factorised = lu.info() == Success;
+			jac_factorised = values;
+		}
+
+		if(is_factorised)
+		{
+			return lu.solve(-f);
+		}
+	}
+
+	// singular at the actual Jac (e.g. valve at zero flow rate) or out of the pattern
+	return Jac.colPivHouseholderQr().solve(-f);
 }
 
 //--------------------------------------------------------------
@@ -305,6 +538,7 @@ void solver_lumped::set_non_SI_parameters()
 	for(int i=0; i<number_of_edges; i++)
 	{
 		edges[i]->vfr_ini_non_SI = edges[i]->volume_flow_rate_initial*1.e-6;
+		edges[i]->par_non_SI.clear(); // called again at every initialization, parameters may have changed since
 		if(edges[i]->type_code == 0) // resistance
 		{
 			edges[i]->par_non_SI.push_back(edges[i]->parameter[0]/mmHg_to_Pa*1.e-6);
@@ -510,3 +744,29 @@ void solver_lumped::set_save_memory(vector<string> edge_list, vector<string> nod
 	}
 }
 
+
+//--------------------------------------------------------------
+void solver_lumped::trim_history(double t_keep)
+{
+	int n = trim_count(time,t_keep);
+	if(n==0)
+	{
+		return;
+	}
+
+	for(int i=0; i<number_of_nodes; i++)
+	{
+		if(nodes[i]->pressure.size() == time.size())
+		{
+			nodes[i]->pressure.erase(nodes[i]->pressure.begin(),nodes[i]->pressure.begin()+n);
+		}
+	}
+	for(int i=0; i<number_of_edges; i++)
+	{
+		if(edges[i]->volume_flow_rate.size() == time.size())
+		{
+			edges[i]->volume_flow_rate.erase(edges[i]->volume_flow_rate.begin(),edges[i]->volume_flow_rate.begin()+n);
+		}
+	}
+	time.erase(time.begin(),time.begin()+n);
+}
@@ -12,6 +12,7 @@
 #define SOLVER_LUMPED_H
 
 #include	"file_io.h"
+#include "statistics.h"
 
 #include "/usr/include/eigen3/Eigen/Eigen"
 #include <iostream>
@@ -43,6 +44,21 @@ public:
 	MatrixXd Jac;
 	VectorXd x, f;
 
+	// Newton step dx solving Jac*dx = -f with a sparse LU of the fixed pattern of Jac
+	// the factorisation of an earlier Jac is reused (chord step) while no entry changed more than jac_tolerance (relative)
+	// refactor: factorising the actual Jac anyway, e.g. if the last step did not reduce |f|
+	VectorXd newton_step(bool refactor, double jac_tolerance);
+	// number of factorisations and solves since set_newton_size
+	int number_of_factorisations = 0, number_of_solves = 0;
+
+	// no diode or valve and one moc boundary, e.g. RC(R) Windkessels, solved by first_blood::solve_lum_linear
+	bool is_linear = false;
+	// after coefficients_newton: the pressure of the boundary node solving every lumped equation
+	// is p0 + dp_dq*q [mmHg] for the flow rate q at the moc boundary, coupling: its coefficient in the node equation
+	void boundary_law(double coupling, double &p0, double &dp_dq);
+	// the lumped unknowns for the q solved against the characteristic, after boundary_law of the same step
+	void linear_update(double coupling, double q);
+
 	// OLD solving the linear equations
 	vector<vector<double> > solve_one_step(double dt, vector<vector<double> > coefs);
 	
@@ -50,6 +66,24 @@ public:
 	void clear_save_memory();
 	void set_save_memory(vector<string> edge_list, vector<string> node_list);
 
+	// dropping the saved values before t_keep
+	void trim_history(double t_keep);
+
+	// format of the result files, 0: text (.txt), 1: binary (.bin), 2: archive
+	int save_format = 0;
+	// archive of the run, set by first_blood if save_format == 2
+	result_archive *archive = NULL;
+	// size of one value in binary result files, 8: float64, 4: float32
+	int save_bytes = 8;
+	// column names of the result files
+	vector<string> node_columns{"time","pressure"};
+	vector<string> edge_columns{"time","volume_flow_rate"};
+	// files written by the last save_results call, listed in the results manifest
+	vector<string> saved_elements; // ID of the element
+	vector<string> saved_types; // "edge" or "node"
+	vector<vector<string> > saved_columns; // column names of the file
+	vector<int> saved_rows; // number of samples in the file
+
 	// saving output vars to file
 	void save_results();
 	void save_results(string folder_name);
@@ -105,6 +139,28 @@ private:
 	MatrixXd A;
 	VectorXd b;
 
+	// sparse Newton solver, pattern from the edge types and the moc couplings, analysed once in set_newton_size
+	void build_jacobian_pattern();
+	SparseMatrix<double> Jac_sparse;
+	SparseLU<SparseMatrix<double>, COLAMDOrdering<int> > lu;
+	VectorXd jac_factorised; // values of Jac_sparse at the last factorisation
+	bool is_factorised = false;
+	bool is_pattern_ok = true; // false if Jac had an entry out of the pattern, then dense QR is used
+
+	// boundary_law: only the diagonal entries in law_moving change with dt and t, Jac^-1 is the inverse of
+	// the Jac at the reduction corrected by their change (rank law_moving.size()), reduced again if one doubles
+	void reduce_linear();
+	vector<int> law_moving; // edges with dt, E or R(t) on the diagonal and the elastance virtual nodes
+	MatrixXd jac_inverse; // of the lumped part of Jac at the reduction
+	VectorXd law_diagonal; // of Jac at the reduction, law_moving entries
+	MatrixXd law_columns; // jac_inverse columns of law_moving
+	MatrixXd law_block; // jac_inverse rows and columns of law_moving
+	VectorXd law_row_k; // jac_inverse row of the boundary node at law_moving
+	// per step: change of the law_moving diagonal, jac_inverse*f, M = I + law_block*diag(law_delta), M^-1*(...)
+	VectorXd law_delta, law_jf;
+	MatrixXd law_m, law_y;
+	PartialPivLU<MatrixXd> law_lu;
+
 	class node
 	{
 	public:
@@ -162,6 +218,9 @@ private:
 	// building the network, finding indicies
 	void build_system();
 
+	// writing columns to file_name + .txt or .bin based on save_format
+	void save_columns(string file_name, string element, string type, const vector<string> &names, const vector<const vector<double>*> &columns);
+
 	// general elastance function
 	double elastance(double t);
 	double elastance(double t, vector<double> par);
@@ -3,20 +3,15 @@
 //--------------------------------------------------------------
 void solver_lumped::load_model()
 {
-	ifstream file_in;
+	// lines composed with the base models, unnecessary characters already cleaned
 	string file_name = input_folder_path + '/' + name + ".csv";
-	file_in.open(file_name);
-	string line;
-	if(file_in.is_open())
+	vector<string> lines;
+	if(read_model_lines(input_folder_path, name + ".csv", lines))
 	{
 		int nn=0,ne=0; // ne for edges, nn for nodes
-		while(getline(file_in,line))
+		for(unsigned int l=0; l<lines.size(); l++)
 		{	
-			// cleaning unnecessary characters
-			line.erase(remove(line.begin(), line.end(), ' '), line.end());
-			line.erase(remove(line.begin(), line.end(), '\n'), line.end());
-			line.erase(remove(line.begin(), line.end(), '\r'), line.end());
-			vector<string> sv = separate_line(line);
+			vector<string> sv = separate_line(lines[l]);
 
 			if(sv[0] == "resistor" || sv[0] == "capacitor" || sv[0] == "inductor" || sv[0] == "voltage" || sv[0] == "diode" || sv[0] == "resistor2" || sv[0] == "valve" || sv[0] == "resistor_coronary" || sv[0] == "capacitor_coronary" || sv[0] == "current") // edges with one parameter
 			{
@@ -123,8 +118,6 @@ void solver_lumped::load_model()
 	// setting size of elements
 	number_of_nodes = nodes.size();
 	number_of_edges = edges.size();
-
-	file_in.close();
 }
 
 //--------------------------------------------------------------
@@ -151,29 +144,26 @@ void solver_lumped::save_results(string folder_name)
 //--------------------------------------------------------------
 void solver_lumped::save_results(string folder_name, vector<string> edge_list, vector<string> node_list)
 {
+	saved_elements.clear();
+	saved_types.clear();
+	saved_columns.clear();
+	saved_rows.clear();
+
    // LINUX
    mkdir("results",0777);
-   mkdir(("results/" + folder_name).c_str(),0777);
+   if(save_format != 2) mkdir(("results/" + folder_name).c_str(),0777);
 
    string fn = "results/" + folder_name + "/" + name;
 
-   FILE *out_file;
-
    for(unsigned int i=0; i<node_list.size(); i++)
    {
    	int idx = node_id_to_index(node_list[i]);
    	if(nodes[idx]->do_save_memory)
    	{		
-	   	mkdir(fn.c_str(),0777);
-		   string file_name = fn + "/" + nodes[idx]->name + ".txt";
-	      out_file = fopen(file_name.c_str(),"w");
-	      for(unsigned int j=0; j<nodes[idx]->pressure.size(); j++)
-	      {
-	      	double t = time[j];
-	      	double p = nodes[idx]->pressure[j];
-	         fprintf(out_file, "%9.7e, %9.7e\n", t, p);
-	      }
-	      fclose(out_file);
+	   	if(save_format != 2) mkdir(fn.c_str(),0777);
+		   string file_name = fn + "/" + nodes[idx]->name;
+		   vector<const vector<double>*> c{&time, &nodes[idx]->pressure};
+		   save_columns(file_name, nodes[idx]->name, "node", node_columns, c);
    	}
    }
 
@@ -182,16 +172,10 @@ void solver_lumped::save_results(string folder_name, vector<string> edge_list, v
    	int idx = edge_id_to_index(edge_list[i]);
    	if(edges[idx]->do_save_memory)
    	{
-	   	mkdir(fn.c_str(),0777);
-		   string file_name = fn + "/" + edges[idx]->name + ".txt";
-		   out_file = fopen(file_name.c_str(),"w");
-		   for(unsigned int j=0; j<edges[idx]->volume_flow_rate.size(); j++)
-		   {
-		      double t = time[j];
-		      double vfr = edges[idx]->volume_flow_rate[j];
-		      fprintf(out_file, "%9.7e, %9.7e\n",t,vfr);
-		   }
-		   fclose(out_file);
+	   	if(save_format != 2) mkdir(fn.c_str(),0777);
+		   string file_name = fn + "/" + edges[idx]->name;
+		   vector<const vector<double>*> c{&time, &edges[idx]->volume_flow_rate};
+		   save_columns(file_name, edges[idx]->name, "edge", edge_columns, c);
    	}
    }
 }
@@ -214,43 +198,28 @@ void solver_lumped::save_results(double dt, string folder_name)
 //--------------------------------------------------------------
 void solver_lumped::save_results(double dt, string folder_name, vector<string> edge_list, vector<string> node_list)
 {
+	saved_elements.clear();
+	saved_types.clear();
+	saved_columns.clear();
+	saved_rows.clear();
+
    // LINUX
    mkdir("results",0777);
-   mkdir(("results/" + folder_name).c_str(),0777);
+   if(save_format != 2) mkdir(("results/" + folder_name).c_str(),0777);
    
    string fn = "results/" + folder_name + "/" + name;
 
-   FILE *out_file;
-
    for(unsigned int i=0; i<node_list.size(); i++)
    {
    	int idx = node_id_to_index(node_list[i]);
    	if(nodes[idx]->do_save_memory)
    	{
-   		mkdir(fn.c_str(),0777);
-	      string file_name = fn + "/" + nodes[idx]->name + ".txt";
-	      out_file = fopen(file_name.c_str(),"w");
-
-	      int j=0;
-			double ts=0.;
-			double t_end=time.back();
-			while(ts<t_end && j<time.size()-1)
-			{
-				if(time[j]<=ts && ts<time[j+1])
-				{	
-					double a0 = (time[j+1]-ts)/(time[j+1]-time[j]);
-					double a1 = (ts-time[j])/(time[j+1]-time[j]);
-
-			   	double p = nodes[idx]->pressure[j]*a0 + nodes[idx]->pressure[j+1]*a1;
-			      fprintf(out_file, "%9.7e, %9.7e\n", ts, p);
-	         	ts += dt;
-				}
-				else
-				{
-					j++;
-				}
-			}
-	      fclose(out_file);
+   		if(save_format != 2) mkdir(fn.c_str(),0777);
+	      string file_name = fn + "/" + nodes[idx]->name;
+	      vector<const vector<double>*> x{&nodes[idx]->pressure};
+	      vector<vector<double> > r = resample_columns(time, x, dt);
+	      vector<const vector<double>*> c{&r[0], &r[1]};
+	      save_columns(file_name, nodes[idx]->name, "node", node_columns, c);
    	}
    }
 
@@ -259,35 +228,43 @@ void solver_lumped::save_results(double dt, string folder_name, vector<string> e
    	int idx = edge_id_to_index(edge_list[i]);
    	if(edges[idx]->do_save_memory)
    	{
-   		mkdir(fn.c_str(),0777);
-	      string file_name = fn + "/" + edges[idx]->name + ".txt";
-	      out_file = fopen(file_name.c_str(),"w");
-
-	      int j=0;
-			double ts=0.;
-			double t_end=time.back();
-			while(ts<t_end && j<time.size()-1)
-			{
-				if(time[j]<=ts && ts<time[j+1])
-				{
-		         double a0 = (time[j+1]-ts)/(time[j+1]-time[j]);
-					double a1 = (ts-time[j])/(time[j+1]-time[j]);
-
-		         double vfr = edges[idx]->volume_flow_rate[j]*a0 + edges[idx]->volume_flow_rate[j+1]*a1;
-		         fprintf(out_file, "%9.7e, %9.7e\n",ts,vfr);
-	         	ts += dt;
-				}
-				else
-				{
-					j++;
-				}
-			}
-
-	      fclose(out_file);
+   		if(save_format != 2) mkdir(fn.c_str(),0777);
+	      string file_name = fn + "/" + edges[idx]->name;
+	      vector<const vector<double>*> x{&edges[idx]->volume_flow_rate};
+	      vector<vector<double> > r = resample_columns(time, x, dt);
+	      vector<const vector<double>*> c{&r[0], &r[1]};
+	      save_columns(file_name, edges[idx]->name, "edge", edge_columns, c);
    	}
    }
 }
 
+//--------------------------------------------------------------
+void solver_lumped::save_columns(string file_name, string element, string type, const vector<string> &names, const vector<const vector<double>*> &columns)
+{
+	int rows = columns.size()>0 ? columns[0]->size() : 0;
+	for(unsigned int k=1; k<columns.size(); k++)
+	{
+		rows = min(rows, (int)columns[k]->size());
+	}
+	saved_elements.push_back(element);
+	saved_types.push_back(type);
+	saved_columns.push_back(names);
+	saved_rows.push_back(rows);
+
+	if(save_format == 2 && archive != NULL)
+	{
+		archive->write_columns(name, element, type, names, columns, save_bytes);
+	}
+	else if(save_format == 1)
+	{
+		save_columns_bin(file_name + ".bin", names, columns, save_bytes);
+	}
+	else
+	{
+		save_columns_txt(file_name + ".txt", columns);
+	}
+}
+
 //--------------------------------------------------------------
 void solver_lumped::save_model(string model_name, string folder_name)
 {
@@ -368,6 +345,7 @@ void solver_lumped::load_initials()
 				if(sv[0] == "edge")
 				{
 					int idx = edge_id_to_index(sv[1]);
+					if(idx<0) continue;
 					double vfr = stod(sv[2],0); // m3/s
 					edges[idx]->volume_flow_rate.clear();
 					edges[idx]->volume_flow_rate.push_back(vfr);
@@ -376,6 +354,7 @@ void solver_lumped::load_initials()
 				else if(sv[0] == "node")
 				{
 					int idx = node_id_to_index(sv[1]);
+					if(idx<0) continue;
 					double p = stod(sv[2],0); // Pa
 					nodes[idx]->pressure.clear();
 					nodes[idx]->pressure.push_back(p);
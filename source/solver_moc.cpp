@@ -235,10 +235,7 @@ void solver_moc::boundaries(int e_idx, double t_act)
 					}
 				}
 
-				if(nodes[node_idx[i]]->do_save_memory)
-				{
-					nodes[node_idx[i]]->save_field_variables(t_act,p_in,q_in);
-				}
+				nodes[node_idx[i]]->save_field_variables(t_act,p_in,q_in);
 			}
 			else if(nodes[node_idx[i]]->type_code == 1) // perifera
 			{
@@ -260,10 +257,7 @@ void solver_moc::boundaries(int e_idx, double t_act)
 					q_out = edges[edge_index]->boundary_pressure_end(dt,p_out);
 				}
 
-				if(nodes[node_idx[i]]->do_save_memory)
-				{
-					nodes[node_idx[i]]->save_field_variables(t_act,p_out,q_out);
-				}
+				nodes[node_idx[i]]->save_field_variables(t_act,p_out,q_out);
 			}
 			else if(nodes[node_idx[i]]->type_code == 0) // junctions
 			{
@@ -104,6 +104,21 @@ public:
 	void clear_save_memory();
 	void set_save_memory(vector<string> edge_list, vector<string> node_list);
 
+	// format of the result files, 0: text (.txt), 1: binary (.bin), 2: archive
+	int save_format = 0;
+	// archive of the run, set by first_blood if save_format == 2
+	result_archive *archive = NULL;
+	// size of one value in binary result files, 8: float64, 4: float32
+	int save_bytes = 8;
+	// column names of the result files
+	vector<string> edge_columns{"time","pressure_start","pressure_end","velocity_start","velocity_end","volume_flow_rate_start","volume_flow_rate_end","mass_flow_rate_start","mass_flow_rate_end","area_start","area_end","wave_speed_start","wave_speed_end"};
+	vector<string> node_columns{"time","pressure","volume_flow_rate"};
+	// files written by the last save_results call, listed in the results manifest
+	vector<string> saved_elements; // ID of the element
+	vector<string> saved_types; // "edge" or "node"
+	vector<vector<string> > saved_columns; // column names of the file
+	vector<int> saved_rows; // number of samples in the file
+
 	// saving output vars
 	void save_results();
 	void save_results(string folder_name);
@@ -111,6 +126,12 @@ public:
 	void save_results(double dt, string folder_name);
 	void save_results(double dt, string folder_name, vector<string> edge_list, vector<string> node_list);
 
+	// streaming the edges with do_save_memory to results/folder_name/name/ during the run, resampled to dt
+	// save_results closes the streams instead of writing the edges again
+	int stream_chunk_rows = 4096; // rows kept in memory per edge before writing
+	void start_stream(double dt, string folder_name);
+	void close_stream();
+
 	// saving the model
 	void save_model(string model_name, string folder_name);
 	void save_pt_series(string model_name, string folder_name);
@@ -140,6 +161,14 @@ private:
 
 	// heart p-t diagram
 	vector<string> pt_file_name;
+
+	// writing columns to file_name + .txt or .bin based on save_format
+	void save_columns(string file_name, string element, string type, const vector<string> &names, const vector<const vector<double>*> &columns);
+	// adding a written file to saved_elements, saved_types, saved_columns, saved_rows
+	void add_saved(string element, string type, const vector<string> &names, int rows);
+	// time and the selected variables (save_variable) of an edge or node with their column names
+	void edge_saved_columns(int idx, vector<string> &names, vector<const vector<double>*> &columns);
+	void node_saved_columns(int idx, vector<string> &names, vector<const vector<double>*> &columns);
 	
 };
 
@@ -6,22 +6,16 @@ void solver_moc::load_model()
 	// to counting prescribed boundaries
 	int up_counter=0;
 
-	ifstream file_in;
+	// lines composed with the base models, spaces and \n already cleared
 	string file_name = input_folder_path + '/' + name + ".csv";
-	file_in.open(file_name);
-	string line;
-	if(file_in.is_open())
+	vector<string> lines;
+	if(read_model_lines(input_folder_path, name + ".csv", lines))
 	{
 		int i=0,j=0; // i for edges, j for nodes
-		while(getline(file_in,line))
+		for(unsigned int l=0; l<lines.size(); l++)
 		{
-			// clearing spaces and \n
-			line.erase(remove(line.begin(), line.end(), ' '), line.end());
-			line.erase(remove(line.begin(), line.end(), '\n'), line.end());
-			line.erase(remove(line.begin(), line.end(), '\r'), line.end());
-
 			// seperating the strings by comma
-			vector<string> sv = separate_line(line);
+			vector<string> sv = separate_line(lines[l]);
 
 			if(sv[0] == "vis" || sv[0] == "visM" || sv[0] == "vis_f") // edges
 			{
@@ -164,8 +158,6 @@ void solver_moc::load_model()
 	// setting size of elements
 	number_of_nodes = nodes.size();
 	number_of_edges = edges.size();
-
-	file_in.close();
 }
 
 //--------------------------------------------------------------
@@ -173,7 +165,7 @@ void solver_moc::load_time_series(string file_name)
 {
 	vector<double> tu,vu;
 	ifstream pt_file_in;
-	file_name = input_folder_path + '/' + file_name + ".csv";
+	file_name = model_file_path(input_folder_path, file_name + ".csv");
 	pt_file_in.open(file_name);
 	if(pt_file_in.is_open())
 	{
@@ -225,17 +217,20 @@ void solver_moc::save_results(string folder_name)
 //--------------------------------------------------------------
 void solver_moc::save_results(string folder_name, vector<string> edge_list, vector<string> node_list)
 {	
+	saved_elements.clear();
+	saved_types.clear();
+	saved_columns.clear();
+	saved_rows.clear();
+
    // LINUX
    mkdir("results",0777);
-   mkdir(("results/" + folder_name).c_str(),0777);
+   if(save_format != 2) mkdir(("results/" + folder_name).c_str(),0777);
    
 	folder_name = folder_name + "/" + name;
-   mkdir(("results/" + folder_name).c_str(),0777);
+   if(save_format != 2) mkdir(("results/" + folder_name).c_str(),0777);
    
    folder_name = "results/" + folder_name + "/";
 
-   FILE *out_file;
-
    for(unsigned int i=0; i<node_list.size(); i++)
    {
    	int idx = node_id_to_index(node_list[i]);
@@ -243,13 +238,11 @@ void solver_moc::save_results(string folder_name, vector<string> edge_list, vect
    	{
    		if(nodes[idx]->do_save_memory)
 			{
-		      string file_name = folder_name + nodes[idx]->name + ".txt";
-		      out_file = fopen(file_name.c_str(),"w");
-		      for(unsigned int j=0; j<nodes[idx]->time.size(); j++)
-		      {
-		         fprintf(out_file, "%9.7e, %9.7e, %9.7e\n", nodes[idx]->time[j], nodes[idx]->pressure[j],nodes[idx]->volume_flow_rate[j]);
-		      }
-		      fclose(out_file);
+		      string file_name = folder_name + nodes[idx]->name;
+		      vector<string> names;
+		      vector<const vector<double>*> c;
+		      node_saved_columns(idx, names, c);
+		      save_columns(file_name, nodes[idx]->name, "node", names, c);
 			}
    	}
    }
@@ -259,29 +252,19 @@ void solver_moc::save_results(string folder_name, vector<string> edge_list, vect
    	int idx = edge_id_to_index(edge_list[i]);
    	if(idx>-1)
    	{
-   		if(edges[idx]->do_save_memory)
+   		if(edges[idx]->stream != NULL)
    		{
-	      	string file_name = folder_name + edges[idx]->ID + ".txt";
-		      out_file = fopen(file_name.c_str(),"w");\
-		      for(unsigned int j=0; j<edges[idx]->pressure_start.size(); j++)
-		      {
-		         double t = edges[idx]->time[j];
-		         double ps = edges[idx]->pressure_start[j];
-		         double pe = edges[idx]->pressure_end[j];
-		         double vs = edges[idx]->velocity_start[j];
-		         double ve = edges[idx]->velocity_end[j];
-		         double vfrs = edges[idx]->volume_flow_rate_start[j];
-		         double vfre = edges[idx]->volume_flow_rate_end[j];
-		         double mfrs = edges[idx]->mass_flow_rate_start[j];
-		         double mfre = edges[idx]->mass_flow_rate_end[j];
-		         double As = edges[idx]->area_start[j];
-		         double Ae = edges[idx]->area_end[j];
-		         double as = edges[idx]->wave_speed_start[j];
-		         double ae = edges[idx]->wave_speed_end[j];
-
-		         fprintf(out_file, "%9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e\n",t,ps,pe,vs,ve,vfrs,vfre,mfrs,mfre,As,Ae,as,ae);
-		      }
-		      fclose(out_file);
+   			// already written during the run
+   			add_saved(edges[idx]->ID, "edge", edges[idx]->stream->names, edges[idx]->stream->rows);
+   			edges[idx]->close_stream();
+   		}
+   		else if(edges[idx]->do_save_memory)
+   		{
+	      	string file_name = folder_name + edges[idx]->ID;
+	      	vector<string> names;
+	      	vector<const vector<double>*> c;
+	      	edge_saved_columns(idx, names, c);
+	      	save_columns(file_name, edges[idx]->ID, "edge", names, c);
    		}
    	}
    }
@@ -305,16 +288,19 @@ void solver_moc::save_results(double dt, string folder_name)
 //--------------------------------------------------------------
 void solver_moc::save_results(double dt, string folder_name, vector<string> edge_list, vector<string> node_list)
 {
+	saved_elements.clear();
+	saved_types.clear();
+	saved_columns.clear();
+	saved_rows.clear();
+
    // LINUX
    mkdir("results",0777);
-   mkdir(("results/" + folder_name).c_str(),0777);
+   if(save_format != 2) mkdir(("results/" + folder_name).c_str(),0777);
    
 	folder_name = folder_name + "/" + name;
-   mkdir(("results/" + folder_name).c_str(),0777);
+   if(save_format != 2) mkdir(("results/" + folder_name).c_str(),0777);
    folder_name = "results/" + folder_name + "/";
 
-   FILE *out_file;
-
    for(unsigned int i=0; i<node_list.size(); i++)
    {
    	int idx = node_id_to_index(node_list[i]);
@@ -322,29 +308,18 @@ void solver_moc::save_results(double dt, string folder_name, vector<string> edge
    	{
 	   	if(nodes[idx]->do_save_memory)
 	   	{
-		      string file_name = folder_name + nodes[idx]->name + ".txt";
-		      out_file = fopen(file_name.c_str(),"w");
-				
-				int j=0;
-				double ts=0.;
-				double t_end=nodes[idx]->time.back();
-				while(ts<t_end && j<nodes[idx]->time.size()-1)
-				{
-					if(nodes[idx]->time[j]<=ts && ts<nodes[idx]->time[j+1])
-					{	
-						double a0 = (nodes[idx]->time[j+1]-ts)/(nodes[idx]->time[j+1]-nodes[idx]->time[j]);
-						double a1 = (ts-nodes[idx]->time[j])/(nodes[idx]->time[j+1]-nodes[idx]->time[j]);
-						double pp = nodes[idx]->pressure[j]*a0 + nodes[idx]->pressure[j+1]*a1;
-						double qp = nodes[idx]->volume_flow_rate[j]*a0 + nodes[idx]->volume_flow_rate[j+1]*a1;
-		         	fprintf(out_file, "%9.7e, %9.7e, %9.7e\n", ts, pp, qp);
-		         	ts += dt;
-					}
-					else
-					{
-						j++;
-					}
-				}
-		      fclose(out_file);
+		      string file_name = folder_name + nodes[idx]->name;
+		      vector<string> names;
+		      vector<const vector<double>*> x;
+		      node_saved_columns(idx, names, x);
+		      x.erase(x.begin()); // time
+		      vector<vector<double> > r = resample_columns(nodes[idx]->time, x, dt);
+		      vector<const vector<double>*> c;
+		      for(int k=0; k<r.size(); k++)
+		      {
+		      	c.push_back(&r[k]);
+		      }
+		      save_columns(file_name, nodes[idx]->name, "node", names, c);
 	   	}
    	}
    }
@@ -354,48 +329,134 @@ void solver_moc::save_results(double dt, string folder_name, vector<string> edge
    	int idx = edge_id_to_index(edge_list[i]);
    	if(idx>-1)
    	{
-	   	if(edges[idx]->do_save_memory)
+	   	if(edges[idx]->stream != NULL)
 	   	{
-		      string file_name = folder_name + edges[idx]->ID + ".txt";
-		      out_file = fopen(file_name.c_str(),"w");
-
-		   	int j=0;
-		   	double ts=0.;
-		   	double t_end=edges[idx]->time.back();
-		   	while(ts<t_end && j<edges[idx]->time.size()-1)
-		   	{
-					if(edges[idx]->time[j]<=ts && ts<edges[idx]->time[j+1])
-					{
-						double a0 = (edges[idx]->time[j+1]-ts)/(edges[idx]->time[j+1]-edges[idx]->time[j]);
-						double a1 = (ts-edges[idx]->time[j])/(edges[idx]->time[j+1]-edges[idx]->time[j]);
-
-			         double ps = edges[idx]->pressure_start[j]*a0 + edges[idx]->pressure_start[j+1]*a1;
-			         double pe = edges[idx]->pressure_end[j]*a0 + edges[idx]->pressure_end[j+1]*a1;
-			         double vs = edges[idx]->velocity_start[j]*a0 + edges[idx]->velocity_start[j+1]*a1;
-			         double ve = edges[idx]->velocity_end[j]*a0 + edges[idx]->velocity_end[j+1]*a1;
-			         double vfrs = edges[idx]->volume_flow_rate_start[j]*a0 + edges[idx]->volume_flow_rate_start[j+1]*a1;
-			         double vfre = edges[idx]->volume_flow_rate_end[j]*a0 + edges[idx]->volume_flow_rate_end[j+1]*a1;
-			         double mfrs = edges[idx]->mass_flow_rate_start[j]*a0 + edges[idx]->mass_flow_rate_start[j+1]*a1;
-			         double mfre = edges[idx]->mass_flow_rate_end[j]*a0 + edges[idx]->mass_flow_rate_end[j+1]*a1;
-			         double As = edges[idx]->area_start[j]*a0 + edges[idx]->area_start[j+1]*a1;
-			         double Ae = edges[idx]->area_end[j]*a0 + edges[idx]->area_end[j+1]*a1;
-			         double as = edges[idx]->wave_speed_start[j]*a0 + edges[idx]->wave_speed_start[j+1]*a1;
-			         double ae = edges[idx]->wave_speed_end[j]*a0 + edges[idx]->wave_speed_end[j+1]*a1;
-
-		         	fprintf(out_file, "%9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e, %9.7e\n",ts,ps,pe,vs,ve,vfrs,vfre,mfrs,mfre,As,Ae,as,ae);
-		         	ts += dt;
-					}
-					else
-					{
-						j++;
-					}
-		   	}
-		      fclose(out_file);
+	   		// already written during the run, resampled to the dt of start_stream
+	   		add_saved(edges[idx]->ID, "edge", edges[idx]->stream->names, edges[idx]->stream->rows);
+	   		edges[idx]->close_stream();
+	   	}
+	   	else if(edges[idx]->do_save_memory)
+	   	{
+		      string file_name = folder_name + edges[idx]->ID;
+		      vector<string> names;
+		      vector<const vector<double>*> x;
+		      edge_saved_columns(idx, names, x);
+		      x.erase(x.begin()); // time
+		      vector<vector<double> > r = resample_columns(edges[idx]->time, x, dt);
+		      vector<const vector<double>*> c;
+		      for(int k=0; k<r.size(); k++)
+		      {
+		      	c.push_back(&r[k]);
+		      }
+		      save_columns(file_name, edges[idx]->ID, "edge", names, c);
 	   	}
    	}
    }
 }
 
+//--------------------------------------------------------------
+void solver_moc::save_columns(string file_name, string element, string type, const vector<string> &names, const vector<const vector<double>*> &columns)
+{
+	int rows = columns.size()>0 ? columns[0]->size() : 0;
+	for(unsigned int k=1; k<columns.size(); k++)
+	{
+		rows = min(rows, (int)columns[k]->size());
+	}
+	add_saved(element, type, names, rows);
+
+	if(save_format == 2 && archive != NULL)
+	{
+		archive->write_columns(name, element, type, names, columns, save_bytes);
+	}
+	else if(save_format == 1)
+	{
+		save_columns_bin(file_name + ".bin", names, columns, save_bytes);
+	}
+	else
+	{
+		save_columns_txt(file_name + ".txt", columns);
+	}
+}
+
+//--------------------------------------------------------------
+void solver_moc::add_saved(string element, string type, const vector<string> &names, int rows)
+{
+	saved_elements.push_back(element);
+	saved_types.push_back(type);
+	saved_columns.push_back(names);
+	saved_rows.push_back(rows);
+}
+
+//--------------------------------------------------------------
+void solver_moc::edge_saved_columns(int idx, vector<string> &names, vector<const vector<double>*> &columns)
+{
+	moc_edge *e = edges[idx];
+	vector<vector<double>*> x = e->field_variables();
+	names.push_back(edge_columns[0]);
+	columns.push_back(&e->time);
+	for(int k=0; k<x.size(); k++)
+	{
+		if(e->save_variable[k])
+		{
+			names.push_back(edge_columns[k+1]);
+			columns.push_back(x[k]);
+		}
+	}
+}
+
+//--------------------------------------------------------------
+void solver_moc::node_saved_columns(int idx, vector<string> &names, vector<const vector<double>*> &columns)
+{
+	moc_node *n = nodes[idx];
+	vector<vector<double>*> x{&n->pressure, &n->volume_flow_rate};
+	names.push_back(node_columns[0]);
+	columns.push_back(&n->time);
+	for(int k=0; k<x.size(); k++)
+	{
+		if(n->save_variable[k])
+		{
+			names.push_back(node_columns[k+1]);
+			columns.push_back(x[k]);
+		}
+	}
+}
+
+//--------------------------------------------------------------
+void solver_moc::start_stream(double dt, string folder_name)
+{
+	if(save_format == 2)
+	{
+		cout << "\n Streaming is not available for the archive format, model " << name << " is kept in memory." << endl;
+		return;
+	}
+
+   // LINUX
+   mkdir("results",0777);
+   mkdir(("results/" + folder_name).c_str(),0777);
+	folder_name = "results/" + folder_name + "/" + name;
+   mkdir(folder_name.c_str(),0777);
+
+	for(int i=0; i<number_of_edges; i++)
+	{
+		if(edges[i]->do_save_memory)
+		{
+			vector<string> names;
+			vector<const vector<double>*> c;
+			edge_saved_columns(i, names, c);
+			edges[i]->start_stream(folder_name + "/" + edges[i]->ID, names, dt, save_format, save_bytes, stream_chunk_rows);
+		}
+	}
+}
+
+//--------------------------------------------------------------
+void solver_moc::close_stream()
+{
+	for(int i=0; i<number_of_edges; i++)
+	{
+		edges[i]->close_stream();
+	}
+}
+
 //--------------------------------------------------------------
 void solver_moc::save_model(string model_name, string folder_name)
 {
@@ -509,6 +570,7 @@ void solver_moc::load_initials()
 			{
 				string id = sv[0];
 				int idx = edge_id_to_index(id);
+				if(idx<0) continue; // edge not in this model, e.g. a state of an other variant
 				vector<double> ic(sv.size()-1);
 				for(int i=0; i<ic.size(); i++)
 				{
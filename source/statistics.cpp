@@ -88,6 +88,48 @@ vector<double> resample(const vector<double> &x, const vector<double> &t, double
 	return out;
 }
 
+//--------------------------------------------------
+// resampling every x column with dt from ts=0, output: [ts, x1, x2, ...]
+// if the history was trimmed (t[0]>0), ts is stepped to t[0] the same way, so the samples match the full history
+vector<vector<double> > resample_columns(const vector<double> &t, const vector<const vector<double>*> &x, double dt)
+{
+	vector<vector<double> > out(x.size()+1);
+	int j=0;
+	double ts=0.;
+	double t_end=t.back();
+	while(ts<t[0])
+	{
+		ts += dt;
+	}
+	while(ts<t_end && j<t.size()-1)
+	{
+		if(t[j]<=ts && ts<t[j+1])
+		{
+			double a0 = (t[j+1]-ts)/(t[j+1]-t[j]);
+			double a1 = (ts-t[j])/(t[j+1]-t[j]);
+			out[0].push_back(ts);
+			for(int k=0; k<x.size(); k++)
+			{
+				out[k+1].push_back((*x[k])[j]*a0 + (*x[k])[j+1]*a1);
+			}
+			ts += dt;
+		}
+		else
+		{
+			j++;
+		}
+	}
+	return out;
+}
+
+//--------------------------------------------------
+// number of samples before t_keep that can be dropped, the last one not later than t_keep is kept for interpolation
+int trim_count(const vector<double> &t, double t_keep)
+{
+	int i = upper_bound(t.begin(),t.end(),t_keep) - t.begin() - 1;
+	return i>0 ? i : 0;
+}
+
 //--------------------------------------------------
 int crop_after_T(const vector<double> &x, const vector<double> &t, double T)
 {
@@ -294,4 +336,82 @@ void time_average::save_results(double dt, string file_name)
 		t += dt;
    }
 	fclose(out_file);
-}
\ No newline at end of file
+}
+
+//--------------------------------------------------
+periodicity::periodicity(double a_T, int a_n_cycles, int a_n_bins)
+{
+	T = a_T;
+	n_cycles = a_n_cycles;
+	n_bins = a_n_bins;
+	sum.assign(n_bins,0.);
+	count.assign(n_bins,0.);
+}
+
+//--------------------------------------------------
+void periodicity::update(double t, double value)
+{
+	int n = floor(t/T);
+	if(n != period)
+	{
+		// closing the previous cycle, only complete ones
+		if(period>=0 && count[0]>0. && count[n_bins-1]>0.)
+		{
+			vector<double> w(n_bins);
+			for(int i=0; i<n_bins; i++)
+			{
+				// bins without sample: value of the previous one
+				w[i] = count[i]>0. ? sum[i]/count[i] : w[max(i-1,0)];
+			}
+			cycles.push_back(w);
+			if(cycles.size()>n_cycles)
+			{
+				cycles.erase(cycles.begin());
+			}
+		}
+		period = n;
+		sum.assign(n_bins,0.);
+		count.assign(n_bins,0.);
+	}
+	int k = min((int)((t/T-n)*n_bins), n_bins-1);
+	sum[k] += value;
+	count[k] += 1.;
+}
+
+//--------------------------------------------------
+double periodicity::relative_rms()
+{
+	if(cycles.size()<n_cycles)
+	{
+		rel_rms = -1.;
+		return rel_rms;
+	}
+
+	vector<double> mean(n_bins,0.);
+	for(int j=0; j<n_cycles; j++)
+	{
+		for(int i=0; i<n_bins; i++)
+		{
+			mean[i] += cycles[j][i]/n_cycles;
+		}
+	}
+
+	double ss = 0.;
+	for(int j=0; j<n_cycles; j++)
+	{
+		for(int i=0; i<n_bins; i++)
+		{
+			ss += (cycles[j][i]-mean[i])*(cycles[j][i]-mean[i]);
+		}
+	}
+	double rms = sqrt(ss/(n_cycles*n_bins));
+
+	// relative to the amplitude, e.g. the pulse pressure, to the mean level for flat signals
+	double amplitude = *max_element(mean.begin(),mean.end()) - *min_element(mean.begin(),mean.end());
+	if(amplitude<=0.)
+	{
+		amplitude = abs(mean[0]);
+	}
+	rel_rms = amplitude>0. ? rms/amplitude : 0.;
+	return rel_rms;
+}
@@ -13,6 +13,7 @@
 #include <vector>
 #include <cmath>
 #include <string>
+#include <algorithm>
 
 using namespace std;
 
@@ -21,6 +22,8 @@ double maximum(const vector<double> &x, int &idx);
 int find_index(const vector<double> &x, double x0);
 double average(const vector<double> &x, const vector<double> &t);
 vector<double> resample(const vector<double> &x, const vector<double> &t, double dt);
+vector<vector<double> > resample_columns(const vector<double> &t, const vector<const vector<double>*> &x, double dt);
+int trim_count(const vector<double> &t, double t_keep);
 int crop_index(const vector<double> &x, const vector<double> &t, double T);
 double systole(const vector<double> &x, const vector<double> &t, double T);
 double diastole(const vector<double> &x, const vector<double> &t, double T);
@@ -43,4 +46,21 @@ public:
 	void save_results(double dt, string file_name);
 };
 
+// periodicity of a signal from a running buffer: the samples of the current
+// period are averaged into phase bins, the last cycles binned waveforms are kept
+class periodicity
+{
+public:
+	periodicity(double T=1., int n_cycles=3, int n_bins=100);
+	double T; // period time
+	int n_cycles; // number of compared cycles
+	int n_bins; // phase bins per cycle
+	int period=-1; // period of the current samples
+	vector<double> sum, count; // current cycle
+	vector<vector<double> > cycles; // binned waveforms of the last n_cycles closed periods
+	double rel_rms=-1.; // of the last check, -1: not enough cycles
+	void update(double t, double value); // adding a sample, closing the cycle at a new period
+	double relative_rms(); // RMS of the last n_cycles waveforms from their mean per the mean's amplitude, -1: not enough cycles
+};
+
 #endif
\ No newline at end of file
@@ -0,0 +1,25 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from ensemble_runner import EnsembleRunner, read_ledger
+
+
+def test_links_keep_logs_and_ledger_per_item(tmp_path):
+    launch = tmp_path / "launch"
+    launch.mkdir()
+    (launch / "VPD.csv").write_text("idx\n")
+    driver = "import sys; print('item', sys.argv[1], open('VPD.csv').read().strip())"
+    runner = EnsembleRunner([sys.executable, "-c", driver, "{i}"], root=str(tmp_path / "ens"), workers=2,
+                            links=["VPD.csv"], launch_dir=str(launch))
+    counts = runner.run(["3", "4"], verbose=False)
+    assert counts == {"ok": 2}
+
+    ledger = read_ledger(runner.root)
+    assert sorted(ledger) == ["3", "4"]
+    for item in ("3", "4"):
+        assert ledger[item]["log"] == os.path.join("logs", item + ".log")
+        with open(os.path.join(runner.root, "logs", item + ".log")) as f:
+            assert f.read().strip() == f"item {item} idx"
+    assert not os.path.exists(os.path.join(runner.root, "logs", "VPD.csv.log"))
+    assert runner.pending(["3", "4"]) == []
@@ -0,0 +1,132 @@
+import os
+import json
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "projects", "python"))
+import first_blood
+
+MODEL = os.path.join(ROOT, "models", "Abel_ref2")
+
+pytestmark = pytest.mark.skipif(not os.path.exists(first_blood.LIB_PATH),
+                                reason="libfirst_blood.so not built (make -f make_first_blood_capi.mk)")
+
+
+def _run(fb):
+    fb.time_end = 0.5
+    fb.is_periodic_run = False
+    assert fb.run()
+    return np.array(fb.history("p10", "n1", "pressure"))
+
+
+def test_lumped_parameter_change_changes_the_result():
+    with first_blood.FirstBlood(MODEL) as fb:
+        p_ref = _run(fb)
+        assert np.array_equal(_run(fb), p_ref)  # a repeated run starts from the same state
+
+        fb.scale("p10", "R0", "parameter", 10.)
+        p_high = _run(fb)
+        assert abs(p_high[-1] - p_ref[-1]) > 50.  # Pa
+
+
+def test_output_selection_keeps_time_only_for_recorded_edges(tmp_path):
+    with first_blood.FirstBlood(MODEL) as fb:
+        _run(fb)
+        p_full = np.array(fb.history("arterial", "A1", "pressure_start"))
+
+    selection = tmp_path / "output.csv"
+    selection.write_text("moc,arterial,edge,A1,pressure_start\n")
+    with first_blood.FirstBlood(MODEL) as fb:
+        fb.load_output_csv(str(selection))
+        _run(fb)
+        assert np.array_equal(fb.history("arterial", "A1", "pressure_start"), p_full)
+        assert len(fb.history("arterial", "A1", "time")) == len(p_full)
+        assert len(fb.history("arterial", "A2", "time")) == 1  # nothing selected, only the last value
+
+        cwd = os.getcwd()
+        os.chdir(tmp_path)
+        try:
+            os.mkdir("results")
+            fb.save_results(folder="sel")
+        finally:
+            os.chdir(cwd)
+    with open(tmp_path / "results" / "sel" / "manifest.json") as f:
+        manifest = json.load(f)
+    assert manifest["output"] == str(selection)
+    assert list(manifest["models"]["arterial"]["elements"]["A1"]["columns"]) == ["time", "pressure_start"]
+
+
+def test_history_copies_survive_a_rerun_and_views_hold_the_model():
+    fb = first_blood.FirstBlood(MODEL)
+    p_copy = _run(fb)
+    p_keep = p_copy.copy()
+    view = fb.history("p10", "n1", "pressure", view=True)
+    assert not view.flags.writeable
+    assert np.array_equal(view, p_copy)
+
+    fb.time_end = 0.1
+    assert fb.run()
+    assert np.array_equal(p_copy, p_keep)  # the default copy is not touched by the solver
+    assert len(fb.history("p10", "n1", "pressure")) < len(p_copy)
+
+    view = fb.history("p10", "n1", "pressure", view=True)
+    del fb
+    assert view.base.owner._fb  # the view keeps the model alive
+    view.base.owner.close()
+
+
+def test_linear_lumped_outlets_match_the_newton_path():
+    with first_blood.FirstBlood(MODEL) as fb:
+        fb.time_end = 0.3
+        fb.is_periodic_run = False
+        out = {}
+        for linear in (True, False):
+            fb.do_linear_lumped = linear
+            assert fb.run()
+            out[linear] = [fb.history(m, e, v) for m, e, v in
+                           [("p10", "n1", "pressure"), ("p47", "n1", "pressure"), ("arterial", "A1", "pressure_start")]]
+    for a, b in zip(out[True], out[False]):
+        assert len(a) == len(b)
+        assert np.abs(a - b).max() < 1.e-3  # Pa, the Newton path stops at |f| < 1e-5
+
+
+def test_history_periods_keep_the_last_periods_of_the_full_run():
+    signals = [("arterial", "A1", "pressure_start"), ("arterial", "H", "pressure"), ("p10", "n1", "pressure")]
+    out = {}
+    for k in (0, 1):
+        with first_blood.FirstBlood(MODEL) as fb:
+            T = fb.time_period
+            fb.time_end = 2. * T + 0.1
+            fb.is_periodic_run = False
+            fb.history_periods = k
+            assert fb.run()
+            out[k] = [(fb.history(m, e, "time"), fb.history(m, e, v)) for m, e, v in signals]
+    for (t_full, x_full), (t, x) in zip(out[0], out[1]):
+        # the third period started at 2T, everything before 2T - T was dropped
+        # but the last sample not later than T, kept for the resampling
+        assert t[0] <= T < t[1]
+        keep = t_full >= t[0]
+        assert np.array_equal(t, t_full[keep])
+        assert np.array_equal(x, x_full[keep])
+
+
+def test_probes_end_the_run_at_the_first_periodic_period():
+    with first_blood.FirstBlood(MODEL) as fb:
+        T = fb.time_period
+        fb.is_periodic_run = True
+        fb.time_end_min = 0.
+        fb.time_end_max = 2.6
+        fb.probe_cycles = 2
+        fb.add_probe("arterial", "H", "pressure", 0.05)
+        assert fb.run()
+        t = fb.history("arterial", "A1", "time")
+        # the last two of the first three periods differ by a relative RMS of about 0.04, the run stops at 3T
+        assert fb.period == 3 and t[-1] == pytest.approx(3. * T, abs=1.e-3)
+
+        # every probe has to be periodic, a flow rate that is never as periodic keeps it running to time_end_max
+        fb.add_probe("arterial", "A1", "volume_flow_rate_start", 1.e-12)
+        assert fb.run()
+        assert fb.history("arterial", "A1", "time")[-1] == pytest.approx(2.6, abs=1.e-3)
@@ -0,0 +1,46 @@
+import os
+import shutil
+import sys
+
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+from generate_cohort import discover, generate_cohort
+
+
+def _cohort(tmp_path):
+    """025 with its MR data, 026 without the variant file, 027 with a broken feature file."""
+    data = tmp_path / "data"
+    for pid in ("025", "026", "027"):
+        shutil.copytree(os.path.join(ROOT, "data_patient025"), data / f"data_patient{pid}")
+        for f in os.listdir(data / f"data_patient{pid}"):
+            os.rename(data / f"data_patient{pid}" / f, data / f"data_patient{pid}" / f.replace("025", pid))
+    os.remove(data / "data_patient026" / "variant_mr_026.json")
+    (data / "data_patient027" / "feature_mr_027.json").write_text("{")
+    return str(data)
+
+
+def test_failed_patients_do_not_stop_the_cohort(tmp_path):
+    data = _cohort(tmp_path)
+    assert list(discover(data)) == ["025", "026", "027"]
+    out = str(tmp_path / "models")
+    report = generate_cohort("V23", data, out, workers=2, verbose=False)
+
+    assert list(report["patient"]) == ["025", "026", "027"]
+    assert list(report["status"]) == ["ok", "failed", "failed"]
+    errors = report.set_index("patient")["error"]
+    assert errors["026"].startswith("FileNotFoundError: missing variant_mr_026.json")
+    assert errors["027"].startswith("JSONDecodeError")
+
+    # the model of the good patient is complete, the failed ones are removed
+    model = os.path.join(out, "cow_runV23_025")
+    assert sorted(os.listdir(model)) == sorted(os.listdir(os.path.join(ROOT, "models", "Abel_ref2")))
+    assert not os.path.exists(os.path.join(out, "cow_runV23_026"))
+    assert not os.path.exists(os.path.join(out, "cow_runV23_027"))
+
+    saved = pd.read_csv(os.path.join(out, "generation_cow_runV23.csv"), dtype={"patient": str})
+    assert list(saved["status"]) == ["ok", "failed", "failed"] and "traceback" not in saved
+    with open(os.path.join(out, "generation_cow_runV23.log")) as f:
+        log = f.read()
+    assert "--- 026" in log and "--- 027" in log and "Traceback" in log
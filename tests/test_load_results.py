@@ -0,0 +1,98 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "analysis"))
+from load_results import EDGE_COLUMNS, ResultsDataset, SimulationResults
+
+T = np.round(np.arange(0., 5., 0.01), 10)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savetxt(path, data, fmt="%9.7e", delimiter=", ")
+
+
+def _case(tmp_path):
+    """A case with a moc edge, a moc node, a lumped node and an empty probe file, k-th column = k*100 + t."""
+    case = tmp_path / "case"
+    _write(str(case / "arterial" / "A1.txt"), np.column_stack([T] + [k * 100. + T for k in range(1, 13)]))
+    _write(str(case / "arterial" / "N1.txt"), np.column_stack([T, 100. + T, 200. + T]))
+    _write(str(case / "p1" / "n1.txt"), np.column_stack([T, 100. + T]))
+    (case / "p2").mkdir()
+    (case / "p2" / "n1.txt").write_text("")
+    return str(case)
+
+
+def test_columns_are_labelled_by_the_column_count(tmp_path):
+    ds = ResultsDataset(_case(tmp_path))
+    assert ds.models() == ["arterial", "p1", "p2"]
+    assert ds.elements("arterial") == ["A1", "N1"]
+    assert ds.variables("arterial", "A1") == EDGE_COLUMNS
+    assert ds.variables("arterial", "N1") == ["time", "pressure", "volume_flow_rate"]
+    assert np.allclose(ds["arterial", "A1", "pressure_end"], 200. + T)
+    assert np.allclose(ds["arterial", "N1", "volume_flow_rate"], 200. + T)
+    # lumped files: the saved variable and "value" are the second column
+    assert np.allclose(ds["p1", "n1", "pressure"], ds["p1", "n1", "value"])
+    assert len(ds["p2", "n1", "pressure"]) == 0
+    with pytest.raises(KeyError):
+        ds["arterial", "A1", "pressure"]
+    with pytest.raises(KeyError):
+        ds["arterial", "A2", "pressure_start"]
+
+
+def test_only_the_requested_columns_are_decoded_and_cached(tmp_path):
+    ds = ResultsDataset(_case(tmp_path), cache_size=3)
+    ds.columns("arterial", "A1", ["pressure_start", "area_end"])
+    assert list(ds._cache) == [("arterial", "A1", "pressure_start"), ("arterial", "A1", "area_end")]
+    t, p = ds.get("arterial", "A1", "pressure_start")
+    assert np.array_equal(t, T) and np.allclose(p, 100. + T)
+    # pressure_start came from the cache, only time was decoded
+    assert list(ds._cache) == [("arterial", "A1", "area_end"), ("arterial", "A1", "pressure_start"),
+                               ("arterial", "A1", "time")]
+    ds.column("arterial", "N1", "pressure")
+    # the least recently used column makes room
+    assert list(ds._cache) == [("arterial", "A1", "pressure_start"), ("arterial", "A1", "time"),
+                               ("arterial", "N1", "pressure")]
+    ds.clear_cache()
+    assert len(ds._cache) == 0
+
+
+def test_last_periods_and_time_windows(tmp_path):
+    ds = ResultsDataset(_case(tmp_path), time_period=1.)
+    t, x = ds.get("arterial", "A1", "velocity_start", last_periods=2)
+    assert t[0] == pytest.approx(2.99) and t[-1] == pytest.approx(4.99)
+    assert np.allclose(x, 300. + t)
+    t, _ = ds.get("arterial", "A1", "velocity_start", last_periods=1, period=0.5)
+    assert t[0] == pytest.approx(4.49)
+    t, _ = ds.get("arterial", "A1", "velocity_start", t_start=1., t_end=2.)
+    assert t[0] == pytest.approx(1.) and t[-1] == pytest.approx(1.99) and len(t) == 100
+    df = ds.frame("arterial", "N1", last_periods=1)
+    assert list(df.columns) == ["pressure", "volume_flow_rate"]
+    assert df.index[0] == pytest.approx(3.99) and len(df) == 101
+
+
+def test_manifest_names_the_columns(tmp_path):
+    case = _case(tmp_path)
+    manifest = {
+        "time_period": 0.5,
+        "models": {"p1": {"elements": {"n1": {"file": "p1/n1.txt", "columns": {"time": 0, "flow": 1}}}}},
+    }
+    with open(os.path.join(case, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    ds = ResultsDataset(case)
+    assert ds.time_period == 0.5
+    assert ds.models() == ["p1"]
+    assert ds.variables("p1", "n1") == ["time", "flow"]
+    t, x = ds.get("p1", "n1", "flow", last_periods=1)
+    assert t[0] == pytest.approx(4.49) and np.allclose(x, 100. + t)
+
+
+def test_simulation_results_skip_empty_probes(tmp_path):
+    res = SimulationResults(_case(tmp_path))
+    assert res.list_probes() == ["p1"]
+    df = res.get("p1", last_periods=1, period=1.)
+    assert list(df.columns) == [0, 1] and len(df) == 101
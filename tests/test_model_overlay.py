@@ -0,0 +1,112 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "analysis"))
+sys.path.insert(0, os.path.join(ROOT, "projects", "python"))
+from model_overlay import _clean, base_of, compose, make_delta, model_folders, read_lines
+import first_blood
+
+MODELS = os.path.join(ROOT, "models")
+
+needs_lib = pytest.mark.skipif(not os.path.exists(first_blood.LIB_PATH),
+                               reason="libfirst_blood.so not built (make -f make_first_blood_capi.mk)")
+
+
+def _folder(path, files):
+    os.makedirs(path, exist_ok=True)
+    for name, text in files.items():
+        with open(os.path.join(path, name), "w") as f:
+            f.write(text)
+    return str(path)
+
+
+def _file(path):
+    with open(path) as f:
+        return [_clean(l) for l in f]
+
+
+def test_rows_are_replaced_removed_and_added_along_the_chain(tmp_path):
+    _folder(tmp_path / "a", {
+        "main.csv": "run,forward\ntime,10\nmoc,arterial\nlumped,p1,arterial,N1\n",
+        "p1.csv": "data of edges\ntype,name,start,end,init,parameter\nresistor,R0,n1,g,0,1\nresistor,R1,n1,g,0,2\n",
+        "arterial.csv": "type,ID,name\nvis_f,A1,aorta\n",
+        "inlet.csv": "0,1\n",
+    })
+    _folder(tmp_path / "b", {
+        "main.csv": "base,../a\ntime,20\nremove,lumped,p1\n",
+        "inlet.csv": "0,2\n",
+    })
+    c = _folder(tmp_path / "c", {
+        "main.csv": "base , ../b\nlumped,p1,arterial,N2\n",
+        "p1.csv": "header of c\nresistor, R1, n1, g, 0, 5\nremove,resistor,R0\ncapacitor,C1,n1,g,0,3\n",
+    })
+    assert [os.path.basename(d) for d in model_folders(c)] == ["c", "b", "a"]
+    assert os.path.basename(base_of(c)) == "b"
+    # p1 removed in b comes back in c, after the rows of a; settings keep their place
+    assert read_lines(c, "main.csv") == ["run,forward", "time,20", "moc,arterial", "lumped,p1,arterial,N2"]
+    # rows without a key only from the first file of the chain
+    assert read_lines(c, "p1.csv") == ["dataofedges", "type,name,start,end,init,parameter",
+                                       "resistor,R1,n1,g,0,5", "capacitor,C1,n1,g,0,3"]
+    with pytest.raises(FileNotFoundError):
+        read_lines(c, "p2.csv")
+
+    written = compose(c, str(tmp_path / "full"))
+    assert sorted(written) == ["arterial.csv", "inlet.csv", "main.csv", "p1.csv"]
+    assert _file(tmp_path / "full" / "inlet.csv") == ["0,2"]  # whole files from the nearest folder
+
+
+def test_a_base_loop_is_an_error(tmp_path):
+    _folder(tmp_path / "a", {"main.csv": "base,../b\n"})
+    _folder(tmp_path / "b", {"main.csv": "base,../a\n"})
+    with pytest.raises(RuntimeError):
+        model_folders(str(tmp_path / "a"))
+
+
+def test_delta_then_compose_reproduces_the_model(tmp_path):
+    model, base = os.path.join(MODELS, "cow_runV23"), os.path.join(MODELS, "Abel_ref2")
+    delta = str(tmp_path / "delta")
+    written = make_delta(model, base, delta)
+    assert written == ["main.csv", "arterial.csv"]  # only the Circle of Willis rows differ
+    assert base_of(delta) is not None
+
+    full = str(tmp_path / "full")
+    compose(delta, full)
+    names = sorted(os.listdir(model))
+    assert sorted(os.listdir(full)) == names and len(names) == 50
+    for name in names:
+        assert _file(os.path.join(full, name)) == _file(os.path.join(model, name)), name
+
+
+def _signals(model_dir):
+    with first_blood.FirstBlood(model_dir) as fb:
+        fb.time_end = 0.2
+        fb.is_periodic_run = False
+        assert fb.run()
+        return [fb.history(m, e, v) for m, e, v in [("arterial", "A60", "pressure_start"),
+                                                     ("arterial", "A1", "volume_flow_rate_start"),
+                                                     ("p10", "n1", "pressure")]]
+
+
+@needs_lib
+def test_solver_loads_overlays_like_the_python_composition(tmp_path):
+    delta = str(tmp_path / "delta")
+    make_delta(os.path.join(MODELS, "cow_runV23"), os.path.join(MODELS, "Abel_ref2"), delta)
+    for a, b in zip(_signals(delta), _signals(os.path.join(MODELS, "cow_runV23"))):
+        assert np.array_equal(a, b)
+
+    # an overlay of the overlay replacing and removing lumped rows
+    top = _folder(tmp_path / "top", {
+        "main.csv": "base,../delta\n",
+        "p10.csv": "resistor, R0, n1, P1, 0.000e+00, 2.534e+09\nremove,capacitor,C4\n",
+    })
+    full = str(tmp_path / "full")
+    compose(top, full)
+    for a, b in zip(_signals(top), _signals(full)):
+        assert np.array_equal(a, b)
+    with first_blood.FirstBlood(top) as fb:
+        assert fb.get("p10", "R0", "parameter") == 2.534e9
+        assert "C4" not in fb.edges("p10")
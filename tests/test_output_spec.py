@@ -0,0 +1,84 @@
+import json
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "analysis"))
+sys.path.insert(0, os.path.join(ROOT, "projects", "python"))
+from output_spec import build, load_spec, write
+import first_blood
+
+MODEL = os.path.join(ROOT, "models", "Abel_ref2")
+SPEC = os.path.join(ROOT, "analysis", "output_spec.yaml")
+
+
+def _lines(spec, model=MODEL):
+    return {tuple(l.split(",")[:4]): l.split(",")[4:] for l in build(spec, model)}
+
+
+def test_build_of_the_example_spec():
+    lines = _lines(load_spec(SPEC))
+    # the aorta region overrides the defaults, the circle of willis keeps them
+    assert lines["moc", "arterial", "edge", "A1"] == ["pressure_start"]
+    cow = [k for k, cols in lines.items() if cols == ["pressure_start", "pressure_end",
+                                                       "volume_flow_rate_start", "volume_flow_rate_end"]]
+    assert len(cow) == len(lines) - 12  # 10 aorta edges, H and p_LV1
+    assert lines["moc", "arterial", "node", "H"] == ["pressure"]
+    assert lines["lum", "heart_kim_lit", "node", "p_LV1"] == []
+
+
+def test_selections_of_the_same_element_are_merged():
+    spec = {"select": [
+        {"model": "arterial", "edges": ["A1"], "variables": ["pressure"], "ends": ["start"]},
+        {"model": "arterial", "edges": ["A1"], "variables": ["volume_flow_rate_end", "pressure_start"]},
+        {"model": "p10"},
+    ]}
+    lines = _lines(spec)
+    assert lines["moc", "arterial", "edge", "A1"] == ["pressure_start", "volume_flow_rate_end"]
+    # a bare model selects every element of it
+    assert ("lum", "p10", "node", "n1") in lines and ("lum", "p10", "edge", "R0") in lines
+
+
+@pytest.mark.parametrize("sel, error", [
+    ({"region": "brain"}, KeyError),
+    ({"model": "venous"}, KeyError),
+    ({"model": "arterial", "edges": ["A1000"]}, KeyError),
+    ({"model": "arterial", "edges": ["A1"], "variables": ["temperature"]}, ValueError),
+    ({"model": "arterial", "nodes": ["H"], "variables": ["velocity"]}, ValueError),
+])
+def test_build_rejects_unknown_names(sel, error):
+    with pytest.raises(error):
+        build({"select": [sel]}, MODEL)
+
+
+@pytest.mark.skipif(not os.path.exists(first_blood.LIB_PATH),
+                    reason="libfirst_blood.so not built (make -f make_first_blood_capi.mk)")
+def test_written_selection_is_saved_by_the_solver(tmp_path):
+    model = str(tmp_path / "Abel_ref2")
+    shutil.copytree(MODEL, model)
+    spec = {"name": "sel", "select": [{"model": "arterial", "edges": ["A1"], "variables": ["pressure"]},
+                                      {"model": "p10", "nodes": ["n1"]}]}
+    write(spec, model, main=True)
+    write(spec, model, main=True)  # the output line is replaced, not repeated
+    with open(os.path.join(model, "main.csv")) as f:
+        assert [l for l in f.read().splitlines() if l.startswith("output")] == ["output,sel"]
+
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        os.mkdir("results")
+        with first_blood.FirstBlood(model) as fb:
+            fb.time_end = 0.1
+            fb.is_periodic_run = False
+            assert fb.run()
+            fb.save_results()
+    finally:
+        os.chdir(cwd)
+    with open(tmp_path / "results" / "Abel_ref2" / "manifest.json") as f:
+        models = json.load(f)["models"]
+    assert models["arterial"]["elements"]["A1"]["columns"] == {"time": 0, "pressure_start": 1, "pressure_end": 2}
+    assert list(models["p10"]["elements"]) == ["n1"]
+    assert "A2" not in models["arterial"]["elements"]
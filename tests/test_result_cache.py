@@ -0,0 +1,43 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+from result_cache import ResultCache, cached_run
+
+DRIVER = """#!/bin/sh
+mkdir -p results/model
+echo "$1 $(cat VPD.csv)" > results/model/out.txt
+"""
+
+
+def _setup(tmp_path):
+    model = tmp_path / "model"
+    model.mkdir()
+    (model / "main.csv").write_text("run,forward\ntime,1\n")
+    cwd = tmp_path / "run"
+    cwd.mkdir()
+    (cwd / "drv.sh").write_text(DRIVER)
+    os.chmod(cwd / "drv.sh", 0o755)
+    (cwd / "VPD.csv").write_text("a\n")
+    return str(model), str(cwd), ResultCache(str(tmp_path / "cache"))
+
+
+def _out(path):
+    with open(os.path.join(path, "out.txt")) as f:
+        return f.read().strip()
+
+
+def test_arguments_and_inputs_are_part_of_the_key(tmp_path):
+    model, cwd, cache = _setup(tmp_path)
+    p3, hit = cached_run(model, ["./drv.sh", "3"], cwd=cwd, cache=cache)
+    assert not hit and _out(p3) == "3 a"
+    p3b, hit = cached_run(model, ["./drv.sh", "3"], cwd=cwd, cache=cache)
+    assert hit and p3b == p3
+
+    p4, hit = cached_run(model, ["./drv.sh", "4"], cwd=cwd, cache=cache)
+    assert not hit and _out(p4) == "4 a"
+
+    with open(os.path.join(cwd, "VPD.csv"), "w") as f:
+        f.write("b\n")
+    p3c, hit = cached_run(model, ["./drv.sh", "3"], cwd=cwd, cache=cache)
+    assert not hit and _out(p3c) == "3 b"
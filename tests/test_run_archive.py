@@ -0,0 +1,98 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "analysis"))
+sys.path.insert(0, os.path.join(ROOT, "projects", "python"))
+from load_results import ResultsDataset
+from run_archive import RunArchive, ensemble_sources, main, pack
+import first_blood
+
+MODEL = os.path.join(ROOT, "models", "Abel_ref2")
+
+
+def _case(folder, n, shift):
+    """An edge and a lumped node of n rows, k-th column = k*100 + t + shift."""
+    t = np.arange(n) * 1.e-3
+    for model, element, ncols in (("arterial", "A1", 13), ("p1", "n1", 2)):
+        os.makedirs(os.path.join(folder, model), exist_ok=True)
+        data = np.column_stack([t] + [k * 100. + t + shift for k in range(1, ncols)])
+        np.savetxt(os.path.join(folder, model, element + ".txt"), data, fmt="%9.7e", delimiter=", ")
+    return folder
+
+
+def _same(ar, run, ds):
+    for model in ds.models():
+        assert sorted(ar.elements(run, model)) == ds.elements(model)
+        for element in ds.elements(model):
+            expected = ds.columns(model, element)
+            got = ar.columns(run, model, element)
+            assert list(got) == list(expected)
+            for v in expected:
+                assert np.array_equal(got[v], expected[v])
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_pack_and_read_back(tmp_path, compress):
+    results = tmp_path / "results"
+    a = _case(str(results / "run_a"), 1000, 0.)
+    b = _case(str(results / "run_b"), 10, 1.)
+    out = str(tmp_path / "ensemble.fba")
+    # zlib columns are split into chunks, raw ones stay one memory-mappable block
+    pack(ensemble_sources(str(results)), out, compress=compress, chunk_rows=300)
+
+    ar = RunArchive(out)
+    assert ar.runs() == ["run_a", "run_b"]
+    assert ar.manifest("run_a") is None
+    assert ar._entry("run_a", "arterial", "A1")["type"] == "edge"
+    _same(ar, "run_a", ResultsDataset(a))
+    _same(ar, "run_b", ResultsDataset(b))
+    x = ar["run_a", "arterial", "A1", "pressure_end"]
+    assert isinstance(x, np.memmap) != compress
+    with pytest.raises(KeyError):
+        ar["run_a", "arterial", "A1", "pressure"]
+    with pytest.raises(KeyError):
+        ar["run_c", "arterial", "A1", "time"]
+
+
+def test_repacking_archives_keeps_the_runs(tmp_path):
+    a = _case(str(tmp_path / "run_a"), 100, 0.)
+    first = str(tmp_path / "first.fba")
+    pack([a], first)
+    both = str(tmp_path / "both.fba")
+    assert main(["pack", both, first, _case(str(tmp_path / "run_b"), 50, 1.), "--float32"]) is None
+
+    ar = RunArchive(both)
+    assert ar.runs() == ["run_a", "run_b"]
+    ds = ResultsDataset(a)
+    x = ar["run_a", "p1", "n1", "value"]
+    assert x.dtype == np.float32
+    assert np.array_equal(x, ds["p1", "n1", "value"].astype(np.float32))
+
+
+@pytest.mark.skipif(not os.path.exists(first_blood.LIB_PATH),
+                    reason="libfirst_blood.so not built (make -f make_first_blood_capi.mk)")
+def test_solver_archive_matches_the_binary_files(tmp_path):
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        os.mkdir("results")
+        with first_blood.FirstBlood(MODEL) as fb:
+            fb.time_end = 0.1
+            fb.is_periodic_run = False
+            assert fb.run()
+            fb.save_format = 1
+            fb.save_results(folder="bin")
+            fb.save_format = 2
+            fb.save_results(folder="fba")
+    finally:
+        os.chdir(cwd)
+
+    ar = RunArchive(str(tmp_path / "results" / "fba.fba"))
+    ds = ResultsDataset(str(tmp_path / "results" / "bin"))
+    assert ar.runs() == ["fba"]
+    assert ar.manifest("fba")["models"].keys() == ds.manifest["models"].keys()
+    _same(ar, "fba", ds)
@@ -0,0 +1,116 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "analysis"))
+sys.path.insert(0, os.path.join(ROOT, "projects", "python"))
+from binary_results import read_binary, read_header
+from load_results import ResultsDataset
+import first_blood
+
+MODEL = os.path.join(ROOT, "models", "Abel_ref2")
+ELEMENTS = [("arterial", "A1"), ("arterial", "H"), ("p10", "n1"), ("heart_kim_lit", "aorta")]
+
+pytestmark = pytest.mark.skipif(not os.path.exists(first_blood.LIB_PATH),
+                                reason="libfirst_blood.so not built (make -f make_first_blood_capi.mk)")
+
+
+def save(fb, tmp_path, folder, dt=0., **settings):
+    """fb.save_results into tmp_path/results/<folder> with the given settings, the folder path."""
+    for name, value in settings.items():
+        setattr(fb, name, value)
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        os.makedirs("results", exist_ok=True)
+        fb.save_results(dt, folder)
+    finally:
+        os.chdir(cwd)
+    return str(tmp_path / "results" / folder)
+
+
+@pytest.fixture(scope="module")
+def abel():
+    with first_blood.FirstBlood(MODEL) as fb:
+        fb.time_end = 0.1
+        fb.is_periodic_run = False
+        assert fb.run()
+        yield fb
+
+
+def test_binary_files_hold_the_recorded_values(abel, tmp_path):
+    f64 = save(abel, tmp_path, "f64", save_format=1, save_bytes=8)
+    f32 = save(abel, tmp_path, "f32", save_format=1, save_bytes=4)
+    txt = save(abel, tmp_path, "txt", save_format=0)
+    for model, element in ELEMENTS:
+        path = os.path.join(f64, model, element + ".bin")
+        h = read_header(path)
+        assert h["dtype"] == np.float64 and h["ncols"] == len(h["names"]) and h["names"][0] == "time"
+        cols = read_binary(path)
+        cols32 = read_binary(os.path.join(f32, model, element + ".bin"))
+        text = ResultsDataset(txt)
+        for name, x in cols.items():
+            recorded = abel.history(model, element, name)
+            assert h["nrows"] == len(recorded)
+            assert np.array_equal(x, recorded)
+            assert cols32[name].dtype == np.float32 and np.array_equal(cols32[name], recorded.astype(np.float32))
+            # the text files round to 8 significant digits
+            assert np.allclose(text[model, element, name], recorded, rtol=1.e-7, atol=0.)
+
+
+def test_manifest_lists_every_saved_file(abel, tmp_path):
+    folder = save(abel, tmp_path, "bin", dt=1.e-3, save_format=1, save_bytes=8)
+    ds = ResultsDataset(folder)
+    m = ds.manifest
+    assert set(m) == {"case", "format", "bytes", "save_dt", "time_end", "time_period", "periods",
+                      "solver_type", "material_type", "output", "units", "models"}
+    assert (m["case"], m["format"], m["bytes"], m["output"]) == ("Abel_ref2", "binary", 8, "")
+    assert m["save_dt"] == pytest.approx(1.e-3) and m["time_end"] == pytest.approx(0.1)
+    assert m["periods"] == int(m["time_end"] // m["time_period"])
+    assert m["models"]["arterial"]["type"] == "moc" and m["models"]["p10"]["type"] == "lumped"
+
+    # every file saved is listed, with its rows and column layout
+    listed = {os.path.normpath(e["file"]) for mod in m["models"].values() for e in mod["elements"].values()}
+    on_disk = {os.path.relpath(os.path.join(d, f), folder) for d, _, fs in os.walk(folder) for f in fs if f.endswith(".bin")}
+    assert listed == on_disk
+    for model, element in ELEMENTS:
+        entry = m["models"][model]["elements"][element]
+        h = read_header(os.path.join(folder, entry["file"]))
+        assert entry["rows"] == h["nrows"]
+        assert sorted(entry["columns"], key=entry["columns"].get) == h["names"]
+        assert all(name in m["units"] for name in h["names"])
+    assert m["units"]["pressure_start"] == "Pa" and m["units"]["time"] == "s"
+
+
+@pytest.mark.parametrize("save_format", [0, 1])
+def test_streamed_edges_match_the_in_memory_files(tmp_path, save_format):
+    dt = 1.e-3
+    folders = {}
+    for stream in (False, True):
+        with first_blood.FirstBlood(MODEL) as fb:
+            fb.time_end = 0.2
+            fb.is_periodic_run = False
+            fb.save_format = save_format
+            cwd = os.getcwd()
+            os.chdir(tmp_path)
+            try:
+                os.makedirs("results", exist_ok=True)
+                if stream:
+                    fb.start_stream(dt, "stream")
+                assert fb.run()
+                if stream:
+                    assert len(fb.history("arterial", "A1", "pressure_start")) == 1  # only the last step in memory
+            finally:
+                os.chdir(cwd)
+            folders[stream] = save(fb, tmp_path, "stream" if stream else "memory", dt=dt)
+
+    names = sorted(os.path.relpath(os.path.join(d, f), folders[False])
+                   for d, _, fs in os.walk(folders[False]) for f in fs if f != "manifest.json")
+    assert len(names) > 100
+    for name in names:
+        with open(os.path.join(folders[False], name), "rb") as a, open(os.path.join(folders[True], name), "rb") as b:
+            assert a.read() == b.read(), name
+    assert ResultsDataset(folders[True]).manifest["models"] == ResultsDataset(folders[False]).manifest["models"]
@@ -0,0 +1,78 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "projects", "python"))
+import first_blood
+
+MODEL = os.path.join(ROOT, "models", "Abel_ref2")
+# SIGNALS of run_abel() from the build before the edge heap (708286b), serial and dense,
+# with the linear material of the model and with material_type = 1 (Olufsen)
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+REFERENCE = {0: os.path.join(DATA, "abel_ref2_0.2s.npz"), 1: os.path.join(DATA, "abel_ref2_olufsen_0.2s.npz")}
+# a moc edge next to the heart, a peripheral outlet and the heart model
+SIGNALS = [
+    ("arterial", "A1", "time"),
+    ("arterial", "A1", "pressure_start"),
+    ("arterial", "A1", "volume_flow_rate_end"),
+    ("p10", "n1", "pressure"),
+    ("heart_kim_lit", "aorta", "pressure"),
+]
+
+pytestmark = pytest.mark.skipif(not os.path.exists(first_blood.LIB_PATH),
+                                reason="libfirst_blood.so not built (make -f make_first_blood_capi.mk)")
+
+
+def run_abel(time_end=0.2, **settings):
+    """The SIGNALS of a short Abel_ref2 run with the given FirstBlood settings."""
+    with first_blood.FirstBlood(MODEL) as fb:
+        fb.time_end = time_end
+        fb.is_periodic_run = False
+        for name, value in settings.items():
+            setattr(fb, name, value)
+        assert fb.run()
+        return [fb.history(*s) for s in SIGNALS]
+
+
+def reference(material_type=0):
+    with np.load(REFERENCE[material_type]) as ref:
+        return [ref["/".join(s)] for s in SIGNALS]
+
+
+def test_edge_heap_keeps_the_event_order_of_the_scan():
+    ref = reference()
+    out = run_abel(number_of_threads=1, newton_solver=0, do_linear_lumped=False)
+    assert np.all(np.diff(out[0]) > 0.)
+    # the same edge advances at the same time, so every step is taken as before
+    assert np.array_equal(out[0], ref[0])
+    assert np.array_equal(out[1], ref[1])
+
+
+@pytest.mark.parametrize("material_type", [0, 1])
+def test_grid_constants_match_the_material_law(material_type):
+    ref = reference(material_type)
+    out = run_abel(number_of_threads=1, newton_solver=0, do_linear_lumped=False, material_type=material_type)
+    for a, b in zip(ref, out):
+        assert len(a) == len(b)
+        # bit-identical with g++ -O3, the tolerance leaves room for contracted or reordered arithmetic
+        assert np.abs(a - b).max() <= 1.e-10 * np.abs(a).max()
+
+
+def test_threads_are_bit_identical_to_the_serial_run():
+    serial = run_abel(number_of_threads=1)
+    for a, b in zip(serial, run_abel(number_of_threads=4)):
+        assert np.array_equal(a, b)
+
+
+@pytest.mark.parametrize("jac_tolerance", [0.01, 0.])
+def test_sparse_newton_matches_the_dense_solver(jac_tolerance):
+    # every lumped model through Newton's method, the linear outlets too
+    dense = run_abel(newton_solver=0, do_linear_lumped=False)
+    sparse = run_abel(newton_solver=1, jac_tolerance=jac_tolerance, do_linear_lumped=False)
+    for a, b in zip(dense, sparse):
+        assert len(a) == len(b)
+        # both stop at |f| < 1e-5, e.g. ~1e-5 Pa of 1e5 Pa
+        assert np.abs(a - b).max() <= 1.e-8 * np.abs(a).max()